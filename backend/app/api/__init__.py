@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import auth, courses, quizzes, payments, dashboards, uploads
+from app.api.endpoints import auth, courses, quizzes, payments, dashboards, uploads, progress, analytics
 
 api_router = APIRouter()
 
@@ -9,3 +9,5 @@ api_router.include_router(quizzes.router)
 api_router.include_router(payments.router)
 api_router.include_router(dashboards.router)
 api_router.include_router(uploads.router)
+api_router.include_router(progress.router)
+api_router.include_router(analytics.router)
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.core.config import settings
+from app.models.models import User, Course
+from app.schemas.schemas import EventCountResponse, EventHistogramResponse, CourseFunnelResponse, CourseRetentionResponse
+from app.services.event_log import event_log, EVENT_TYPES
+from app.services.course_analytics import CourseAnalyticsService, analytics_cache
+from app.api.endpoints.auth import get_current_user_id
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+MAX_HISTOGRAM_BUCKETS = 5000
+
+def require_admin(
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> int:
+    user = db.query(User).filter(User.id == current_user_id).first()
+    
+    if not user or user.role.value != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view this"
+        )
+    
+    return current_user_id
+
+def resolve_range(start: Optional[datetime], end: Optional[datetime], event_type: Optional[str]) -> tuple:
+    if event_type is not None and event_type not in EVENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown event type. Use one of: {', '.join(EVENT_TYPES)}"
+        )
+    
+    # Compare everything as naive UTC
+    start, end = [
+        value.astimezone(timezone.utc).replace(tzinfo=None) if value and value.tzinfo else value
+        for value in (start, end)
+    ]
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    
+    return start, end
+
+@router.get("/events/count", response_model=EventCountResponse)
+def count_events(
+    event_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    course_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    _: int = Depends(require_admin)
+):
+    """Count learning events in a time range (defaults to the last 7 days)"""
+    start, end = resolve_range(start, end, event_type)
+    
+    return EventCountResponse(
+        event_type=event_type,
+        start=start,
+        end=end,
+        count=event_log.count(start, end, event_type=event_type, course_id=course_id, user_id=user_id)
+    )
+
+@router.get("/events/histogram", response_model=EventHistogramResponse)
+def event_histogram(
+    event_type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = Query("hour", pattern="^(minute|hour|day)$"),
+    course_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    _: int = Depends(require_admin)
+):
+    """Learning events per minute, hour or day in a time range"""
+    start, end = resolve_range(start, end, event_type)
+    bucket_seconds = BUCKET_SECONDS[bucket]
+    
+    if (end - start).total_seconds() / bucket_seconds > MAX_HISTOGRAM_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Time range too large for this bucket size"
+        )
+    
+    return EventHistogramResponse(
+        event_type=event_type,
+        bucket=bucket,
+        buckets=event_log.histogram(
+            start, end, bucket_seconds=bucket_seconds,
+            event_type=event_type, course_id=course_id, user_id=user_id
+        )
+    )
+
+
+def get_owned_course(
+    course_id: int,
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> Course:
+    course = db.query(Course).filter(Course.id == course_id).first()
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    
+    # Check if user is the instructor or an admin
+    user = db.query(User).filter(User.id == current_user_id).first()
+    if course.instructor_id != current_user_id and (not user or user.role.value != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the course instructor or admin can view course analytics"
+        )
+    
+    return course
+
+@router.get("/courses/{course_id}/funnel", response_model=CourseFunnelResponse)
+def course_funnel(
+    course: Course = Depends(get_owned_course),
+    db: Session = Depends(get_db)
+):
+    """Per-lesson drop-off funnel for a course"""
+    course_id = course.id
+    return analytics_cache.get(
+        "funnel", course_id,
+        lambda session: CourseAnalyticsService.lesson_funnel(session, course_id), db
+    )
+
+@router.get("/courses/{course_id}/retention", response_model=CourseRetentionResponse)
+def course_retention(
+    weeks: int = Query(12, ge=1, le=settings.ANALYTICS_RETENTION_WEEKS),
+    course: Course = Depends(get_owned_course),
+    db: Session = Depends(get_db)
+):
+    """Weekly cohort retention by enrollment date for a course"""
+    course_id = course.id
+    # The cache holds the full window; narrower requests are sliced from it
+    retention = analytics_cache.get(
+        "retention", course_id,
+        lambda session: CourseAnalyticsService.cohort_retention(session, course_id), db
+    )
+    return CourseAnalyticsService.narrow_retention(retention, weeks)
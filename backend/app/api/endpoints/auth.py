@@ -7,6 +7,8 @@ from app.models.models import User, RoleEnum
 from app.schemas.schemas import UserRegister, UserLogin, UserResponse, UserUpdate, TokenResponse, TokenRefresh
 from datetime import timedelta
 from app.core.config import settings
+from app.services.rollup_service import PlatformRollupService
+from app.services.stats_service import StudentStatsService
 from typing import Optional
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -84,6 +86,9 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
+    db.flush()
+    StudentStatsService.create(db, db_user.id)
+    PlatformRollupService.record(db, signups=1)
     db.commit()
     db.refresh(db_user)
     
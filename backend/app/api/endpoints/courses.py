@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.core.database import get_db
 from app.models.models import Course, Lesson, Quiz, Question, User
+from app.services.quiz_service import CompletionTracker, EnrollmentService
 from app.schemas.schemas import CourseCreate, CourseResponse, CourseUpdate, LessonCreate, LessonResponse, LessonUpdate
 from typing import List, Optional
 from app.api.endpoints.auth import get_current_user_id, get_current_user_id_optional
@@ -182,6 +183,11 @@ def create_lesson(
     )
     
     db.add(db_lesson)
+    db.flush()
+    
+    # A new lesson changes every enrolled student's progress and completion
+    CompletionTracker.course_structure_changed(db, course_id)
+    
     db.commit()
     db.refresh(db_lesson)
     
@@ -274,8 +280,7 @@ def enroll_in_course(
         )
     
     # Enroll the user
-    user.courses_enrolled.append(course)
-    db.commit()
+    EnrollmentService.enroll_student(db, current_user_id, course_id)
     
     return {
         "message": "Successfully enrolled in course",
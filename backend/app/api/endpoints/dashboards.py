@@ -1,18 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.models.models import User, Course, Certificate, Payment, Quiz, Lesson, QuizAttempt, LessonProgress, PaymentStatusEnum
-from app.schemas.schemas import CertificateResponse, StudentDashboardStats, InstructorDashboardStats, AdminDashboardStats
+from sqlalchemy import func
+from app.models.models import User, Course, Certificate, CertificateBatchJob, Payment, Quiz, Lesson, QuizAttempt, LessonProgress, PaymentStatusEnum, course_enrollment
+from app.schemas.schemas import CertificateResponse, CertificateBatchJobResponse, CertificateVerificationResponse, StudentDashboardStats, InstructorDashboardStats, AdminDashboardStats
 from app.services.quiz_service import CertificateService
-from app.services.certificate_service import CertificateGenerator
-from app.tasks.celery_app import send_certificate_email
+from app.services.stats_service import StudentStatsService
+from app.services.rollup_service import RevenueRollupService, PlatformRollupService
+from app.services.dashboard_cache import dashboard_cache, DashboardCacheService
+from app.services.event_log import event_log
+from app.services.certificate_batch_service import CertificateBatchService
+from app.services.certificate_service import CertificateIssuer
+from app.tasks.celery_app import render_certificate, issue_certificate_batch
 from app.api.endpoints.auth import get_current_user_id
-from datetime import datetime
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.rate_limit import TokenBucketLimiter
+from datetime import datetime, timedelta
 import uuid
 import os
+import re
 
 router = APIRouter(prefix="/certificates", tags=["certificates"])
 
+RECENT_ENROLLMENT_DAYS = 30
+ADMIN_REVENUE_MONTHS = 12
+ADMIN_TOP_COURSES = 5
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# A certificate's PDF never changes once it is ready, so clients and CDNs may keep it
+CERTIFICATE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CERTIFICATE_NUMBER_PATTERN = re.compile(r"^CERT-\d+-\d+-[0-9A-F]{8}$")
+
+# Public verification: cached projection (including unknown numbers) and per-IP throttling
+verification_cache = TTLCache(
+    ttl=settings.CERTIFICATE_VERIFY_CACHE_TTL_SECONDS,
+    negative_ttl=settings.CERTIFICATE_VERIFY_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.CERTIFICATE_VERIFY_CACHE_MAX_ENTRIES
+)
+verification_limiter = TokenBucketLimiter(
+    rate=settings.CERTIFICATE_VERIFY_RATE_PER_MINUTE / 60,
+    burst=settings.CERTIFICATE_VERIFY_BURST
+)
+
 @router.get("/student/{course_id}", response_model=CertificateResponse)
 def get_certificate(
     course_id: int,
@@ -33,13 +63,13 @@ def get_certificate(
     
     return certificate
 
-@router.post("/generate/{course_id}", response_model=CertificateResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/generate/{course_id}", response_model=CertificateResponse, status_code=status.HTTP_202_ACCEPTED)
 def generate_certificate(
     course_id: int,
     current_user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    """Generate certificate after course completion"""
+    """Issue a certificate after course completion; the PDF is rendered in the background"""
     user = db.query(User).filter(User.id == current_user_id).first()
     course = db.query(Course).filter(Course.id == course_id).first()
     
@@ -62,12 +92,20 @@ def generate_certificate(
         Certificate.course_id == course_id
     ).first()
     
-    if existing:
+    if existing and existing.status == "ready":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Certificate already generated"
         )
     
+    if existing:
+        # Still rendering, or a previous render failed and is retried
+        if existing.status == "failed":
+            existing.status = "pending"
+            db.commit()
+            render_certificate.delay(existing.id)
+        return existing
+    
     # Check if course is completed
     if not CertificateService.check_completion(db, current_user_id, course_id):
         raise HTTPException(
@@ -75,85 +113,309 @@ def generate_certificate(
             detail="Course not completed. All lessons and quizzes must be completed."
         )
     
-    # Generate certificate
+    # Create the certificate record; poll get_certificate until pdf_url is set
     certificate_number = f"CERT-{course_id}-{current_user_id}-{uuid.uuid4().hex[:8].upper()}"
-    instructor = db.query(User).filter(User.id == course.instructor_id).first()
-    
-    pdf_content = CertificateGenerator.generate_certificate(
-        student_name=user.full_name,
-        course_name=course.title,
-        certificate_number=certificate_number,
-        instructor_name=instructor.full_name if instructor else "Course Instructor"
-    )
-    
-    # Save PDF (in production, use cloud storage like S3)
-    os.makedirs("certificates", exist_ok=True)
-    pdf_filename = f"certificates/{certificate_number}.pdf"
-    with open(pdf_filename, "wb") as f:
-        f.write(pdf_content)
-    
-    # Create certificate record
     certificate = Certificate(
         user_id=current_user_id,
         course_id=course_id,
         certificate_number=certificate_number,
-        pdf_url=f"/api/v1/certificates/download/{certificate_number}"
+        status="pending"
     )
     
     db.add(certificate)
+    db.flush()
+    StudentStatsService.adjust(db, current_user_id, certificates=1)
+    event_log.record_after_commit(db, "certificate", current_user_id, course_id, subject_id=certificate.id)
+    DashboardCacheService.certificate_issued(db, current_user_id)
     db.commit()
-    db.refresh(certificate)
     
-    # Send email
-    send_certificate_email.delay(
-        user_email=user.email,
-        certificate_number=certificate_number,
-        course_name=course.title,
-        pdf_content=pdf_content
-    )
+    render_certificate.delay(certificate.id)
     
     return certificate
 
-# Dashboard endpoints
-@router.get("/dashboard/student")
-def student_dashboard(
-    current_user_id: int = Depends(get_current_user_id),
+def parse_byte_range(range_header: str, size: int):
+    """Parse a single 'bytes=' range into inclusive (start, end); None means serve the whole file"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # Multiple ranges are answered with the full body
+    
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start:
+            start, end = int(start), int(end) if end else size - 1
+        elif end:
+            start, end = max(0, size - int(end)), size - 1  # Suffix range: last N bytes
+        else:
+            return None
+    except ValueError:
+        return None
+    
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+def iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def load_verification(db: Session, certificate_number: str):
+    row = db.query(
+        Certificate.certificate_number, User.full_name, Course.title, Certificate.issue_date
+    ).join(User, User.id == Certificate.user_id).join(Course, Course.id == Certificate.course_id).filter(
+        Certificate.certificate_number == certificate_number
+    ).first()
+    
+    if not row:
+        return None
+    
+    return {
+        "certificate_number": row[0],
+        "student_name": row[1],
+        "course_title": row[2],
+        "issue_date": row[3],
+    }
+
+@router.get("/verify/{certificate_number}", response_model=CertificateVerificationResponse)
+def verify_certificate(
+    certificate_number: str,
+    request: Request,
     db: Session = Depends(get_db)
-) -> StudentDashboardStats:
-    """Get student dashboard statistics"""
-    user = db.query(User).filter(User.id == current_user_id).first()
+):
+    """Public certificate verification by certificate number"""
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = verification_limiter.acquire(client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many verification requests",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+    
+    certificate_number = certificate_number.strip().upper()
+    verification = None
+    # Malformed numbers never reach the cache or the database
+    if CERTIFICATE_NUMBER_PATTERN.match(certificate_number):
+        verification = verification_cache.get_or_load(
+            certificate_number,
+            lambda: load_verification(db, certificate_number)
+        )
     
-    if not user:
+    if not verification:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            detail="Certificate not found"
         )
     
-    total_courses = len(user.courses_enrolled)
-    total_certificates = db.query(Certificate).filter(Certificate.user_id == current_user_id).count()
+    return verification
+
+@router.api_route("/download/{certificate_number}", methods=["GET", "HEAD"])
+def download_certificate(
+    certificate_number: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Download a certificate PDF (supports Range and conditional requests)"""
+    certificate = db.query(Certificate).filter(Certificate.certificate_number == certificate_number).first()
     
-    # Calculate completed vs in progress
-    completed = 0
-    in_progress = 0
+    if not certificate or certificate.status != "ready" or not certificate.pdf_path or not os.path.exists(certificate.pdf_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Certificate not found"
+        )
     
-    for course in user.courses_enrolled:
-        if CertificateService.check_completion(db, current_user_id, course.id):
-            completed += 1
-        else:
-            in_progress += 1
+    if not certificate.content_hash:
+        certificate.content_hash = CertificateIssuer.file_hash(certificate.pdf_path)
+        db.commit()
+    
+    etag = f'"{certificate.content_hash}"'
+    size = os.path.getsize(certificate.pdf_path)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CERTIFICATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{certificate_number}.pdf"',
+        # Keep GZipMiddleware away so byte ranges and Content-Length refer to the file itself
+        "Content-Encoding": "identity",
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    byte_range = None
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range if the client's copy is still current
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_byte_range(range_header, size)
+    
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    status_code = status.HTTP_200_OK
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+    
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type="application/pdf")
+    
+    return StreamingResponse(
+        iter_file(certificate.pdf_path, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/pdf"
+    )
+
+@router.post("/batch/{course_id}", response_model=CertificateBatchJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def issue_certificate_batch_for_course(
+    course_id: int,
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Issue certificates to every student who completed the course"""
+    course = db.query(Course).filter(Course.id == course_id).first()
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    
+    # Check if user is the instructor or an admin
+    user = db.query(User).filter(User.id == current_user_id).first()
+    if course.instructor_id != current_user_id and (not user or user.role.value != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the course instructor or admin can issue certificates"
+        )
+    
+    # Resume an unfinished job instead of starting a second one for the course
+    job = db.query(CertificateBatchJob).filter(
+        CertificateBatchJob.course_id == course_id,
+        CertificateBatchJob.status.in_(["pending", "running", "failed"])
+    ).order_by(CertificateBatchJob.id.desc()).first()
+    
+    if job and not (job.status == "failed" or CertificateBatchService.is_stale(job)):
+        return job
     
-    # Calculate average grade
-    attempts = db.query(QuizAttempt).filter(QuizAttempt.user_id == current_user_id).all()
-    avg_grade = sum([a.score for a in attempts if a.score]) / len(attempts) if attempts else 0
+    if not job:
+        job = CertificateBatchJob(course_id=course_id, created_by=current_user_id, status="pending")
+        db.add(job)
+    job.heartbeat_at = datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+    
+    issue_certificate_batch.delay(job.id)
+    
+    return job
+
+@router.get("/batch/jobs/{job_id}", response_model=CertificateBatchJobResponse)
+def get_certificate_batch(
+    job_id: int,
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Get the progress of a certificate batch job"""
+    job = db.query(CertificateBatchJob).join(Course, Course.id == CertificateBatchJob.course_id).filter(
+        CertificateBatchJob.id == job_id,
+        (CertificateBatchJob.created_by == current_user_id) | (Course.instructor_id == current_user_id)
+    ).first()
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Certificate batch job not found"
+        )
+    
+    return job
+
+# Dashboard endpoints
+def build_student_dashboard(db: Session, user_id: int):
+    """Compute student dashboard statistics"""
+    stats = StudentStatsService.get(db, user_id)
+    
+    avg_grade = stats.quiz_score_total / stats.quiz_attempts if stats.quiz_attempts else 0
     
     return StudentDashboardStats(
-        total_courses_enrolled=total_courses,
-        completed_courses=completed,
-        in_progress_courses=in_progress,
-        total_certificates=total_certificates,
+        total_courses_enrolled=stats.enrolled_courses,
+        completed_courses=stats.completed_courses,
+        in_progress_courses=stats.enrolled_courses - stats.completed_courses,
+        total_certificates=stats.certificates,
         average_grade=round(avg_grade, 2)
     )
 
+def build_instructor_dashboard(db: Session, instructor_id: int):
+    """Compute instructor dashboard statistics"""
+    total_courses = db.query(func.count(Course.id)).filter(Course.instructor_id == instructor_id).scalar()
+    
+    enrollments = db.query(func.count()).select_from(course_enrollment).join(
+        Course, Course.id == course_enrollment.c.course_id
+    ).filter(Course.instructor_id == instructor_id)
+    total_students = enrollments.scalar()
+    recent_enrollments = enrollments.filter(
+        course_enrollment.c.enrolled_at >= datetime.utcnow() - timedelta(days=RECENT_ENROLLMENT_DAYS)
+    ).scalar()
+    
+    monthly_revenue = RevenueRollupService.monthly_series(db, instructor_id)
+    total_revenue = sum(month["revenue"] for month in monthly_revenue)
+    
+    return InstructorDashboardStats(
+        total_courses=total_courses,
+        total_students=total_students,
+        total_revenue=round(total_revenue, 2),
+        avg_course_rating=0.0,  # Placeholder
+        recent_enrollments=recent_enrollments,
+        monthly_revenue=monthly_revenue
+    )
+
+def build_admin_dashboard(db: Session):
+    """Compute platform-wide admin dashboard statistics"""
+    total_users = db.query(func.count(User.id)).scalar()
+    total_courses = db.query(func.count(Course.id)).scalar()
+    
+    totals = PlatformRollupService.totals(db)
+    
+    pending_payments = db.query(func.count(Payment.id)).filter(
+        Payment.status == PaymentStatusEnum.PENDING
+    ).scalar()
+    
+    return AdminDashboardStats(
+        total_users=total_users,
+        total_courses=total_courses,
+        total_revenue=round(totals["revenue"], 2),
+        pending_payments=pending_payments,
+        monthly_revenue=PlatformRollupService.monthly_series(db, ADMIN_REVENUE_MONTHS),
+        top_courses=PlatformRollupService.top_courses(db, ADMIN_TOP_COURSES)
+    )
+
+@router.get("/dashboard/student")
+def student_dashboard(
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+) -> StudentDashboardStats:
+    """Get student dashboard statistics"""
+    stats = dashboard_cache.get(
+        "student", current_user_id,
+        lambda session: build_student_dashboard(session, current_user_id), db
+    )
+    
+    if not stats:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    return stats
+
 @router.get("/dashboard/instructor")
 def instructor_dashboard(
     current_user_id: int = Depends(get_current_user_id),
@@ -168,26 +430,9 @@ def instructor_dashboard(
             detail="Only instructors can view this"
         )
     
-    courses = db.query(Course).filter(Course.instructor_id == current_user_id).all()
-    total_courses = len(courses)
-    
-    total_students = 0
-    total_revenue = 0.0
-    
-    for course in courses:
-        total_students += len(course.students)
-        payments = db.query(Payment).filter(
-            Payment.course_id == course.id,
-            Payment.status == PaymentStatusEnum.COMPLETED
-        ).all()
-        total_revenue += sum([p.amount for p in payments])
-    
-    return InstructorDashboardStats(
-        total_courses=total_courses,
-        total_students=total_students,
-        total_revenue=round(total_revenue, 2),
-        avg_course_rating=0.0,  # Placeholder
-        recent_enrollments=10  # Placeholder
+    return dashboard_cache.get(
+        "instructor", current_user_id,
+        lambda session: build_instructor_dashboard(session, current_user_id), db
     )
 
 @router.get("/dashboard/admin")
@@ -204,23 +449,5 @@ def admin_dashboard(
             detail="Only admins can view this"
         )
     
-    total_users = db.query(User).count()
-    total_courses = db.query(Course).count()
-    
-    completed_payments = db.query(Payment).filter(
-        Payment.status == PaymentStatusEnum.COMPLETED
-    ).all()
-    total_revenue = sum([p.amount for p in completed_payments])
-    
-    pending_payments = db.query(Payment).filter(
-        Payment.status == PaymentStatusEnum.PENDING
-    ).count()
-    
-    return AdminDashboardStats(
-        total_users=total_users,
-        total_courses=total_courses,
-        total_revenue=round(total_revenue, 2),
-        pending_payments=pending_payments,
-        monthly_revenue=[],  # Placeholder
-        top_courses=[]  # Placeholder
-    )
+    # Platform-wide figures are the same for every admin, so they share one entry
+    return dashboard_cache.get("admin", None, build_admin_dashboard, db)
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.models import Payment, Course, User, PaymentStatusEnum, Certificate
-from app.schemas.schemas import PaymentInitiate, PaymentResponse, PaymentWebhook
+from app.schemas.schemas import PaymentInitiate, PaymentResponse
 from app.services.payment_service import PaymentService
-from app.services.quiz_service import EnrollmentService, CertificateService
+from app.services.quiz_service import CertificateService
 from app.services.certificate_service import CertificateGenerator
-from app.tasks.celery_app import send_certificate_email, send_enrollment_notification
+from app.services.webhook_service import WebhookService
+from app.tasks.celery_app import send_certificate_email, process_webhook_event
 from app.api.endpoints.auth import get_current_user_id
-from datetime import datetime
+import json
 import uuid
 
 router = APIRouter(prefix="/payments", tags=["payments"])
@@ -64,87 +66,54 @@ def initiate_payment(
         "payment_method": payment.payment_method
     }
 
+async def receive_webhook(gateway: str, request: Request, db: Session):
+    """Authenticate a gateway webhook, store it once and queue it for processing"""
+    body = await request.body()
+    
+    if not WebhookService.verify_signature(gateway, body, request.headers):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook signature"
+        )
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid webhook payload"
+        )
+    
+    if not isinstance(payload, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid webhook payload"
+        )
+    
+    # Redeliveries of an event already in the inbox are acknowledged without requeueing
+    webhook_event_id = await run_in_threadpool(WebhookService.record, db, gateway, payload, body)
+    if webhook_event_id is None:
+        return {"status": "duplicate"}
+    
+    try:
+        # Publishing blocks on the broker, so keep it off the event loop; no publish
+        # retries either, as the reconciliation sweep requeues events left "received"
+        await run_in_threadpool(process_webhook_event.apply_async, args=[webhook_event_id], retry=False)
+    except Exception as e:
+        # The event is stored; it stays "received" and is picked up again later
+        print(f"Error queueing webhook event {webhook_event_id}: {e}")
+    
+    return {"status": "received"}
+
 @router.post("/webhook/paystack")
-def paystack_webhook(payload: PaymentWebhook, db: Session = Depends(get_db)):
+async def paystack_webhook(request: Request, db: Session = Depends(get_db)):
     """Handle Paystack webhook"""
-    if payload.event == "charge.success":
-        data = payload.data
-        reference = data.get("reference")
-        
-        payment = db.query(Payment).filter(Payment.reference == reference).first()
-        
-        if not payment:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Payment not found"
-            )
-        
-        # Verify with Paystack
-        verified_data = PaymentService.verify_paystack_payment(reference)
-        
-        if verified_data and verified_data.get("data", {}).get("status") == "success":
-            payment.status = PaymentStatusEnum.COMPLETED
-            payment.updated_at = datetime.utcnow()
-            
-            # Enroll user in course
-            EnrollmentService.enroll_student(db, payment.user_id, payment.course_id)
-            
-            # Send confirmation email
-            user = db.query(User).filter(User.id == payment.user_id).first()
-            course = db.query(Course).filter(Course.id == payment.course_id).first()
-            
-            send_enrollment_notification.delay(
-                user_email=user.email,
-                course_name=course.title,
-                access_url=f"http://localhost:3000/courses/{course.id}"
-            )
-            
-            db.commit()
-            
-            return {"status": "success"}
-    
-    return {"status": "processed"}
+    return await receive_webhook("paystack", request, db)
 
 @router.post("/webhook/flutterwave")
-def flutterwave_webhook(payload: PaymentWebhook, db: Session = Depends(get_db)):
+async def flutterwave_webhook(request: Request, db: Session = Depends(get_db)):
     """Handle Flutterwave webhook"""
-    if payload.event == "charge.completed":
-        data = payload.data
-        transaction_id = data.get("id")
-        
-        payment = db.query(Payment).filter(Payment.transaction_id == str(transaction_id)).first()
-        
-        if not payment:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Payment not found"
-            )
-        
-        # Verify with Flutterwave
-        verified_data = PaymentService.verify_flutterwave_payment(transaction_id)
-        
-        if verified_data and verified_data.get("data", {}).get("status") == "successful":
-            payment.status = PaymentStatusEnum.COMPLETED
-            payment.updated_at = datetime.utcnow()
-            
-            # Enroll user in course
-            EnrollmentService.enroll_student(db, payment.user_id, payment.course_id)
-            
-            # Send confirmation email
-            user = db.query(User).filter(User.id == payment.user_id).first()
-            course = db.query(Course).filter(Course.id == payment.course_id).first()
-            
-            send_enrollment_notification.delay(
-                user_email=user.email,
-                course_name=course.title,
-                access_url=f"http://localhost:3000/courses/{course.id}"
-            )
-            
-            db.commit()
-            
-            return {"status": "success"}
-    
-    return {"status": "processed"}
+    return await receive_webhook("flutterwave", request, db)
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
 def get_payment(
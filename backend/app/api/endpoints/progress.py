@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.models.models import Lesson, course_enrollment
+from app.schemas.schemas import LessonProgressUpdate, ProgressSyncRequest, ProgressSyncResponse
+from app.services.progress_buffer import progress_buffer
+from app.services.quiz_service import ProgressService
+from app.api.endpoints.auth import get_current_user_id
+
+router = APIRouter(prefix="/progress", tags=["progress"])
+
+@router.post("/lessons/{lesson_id}")
+def report_lesson_progress(
+    lesson_id: int,
+    progress_data: LessonProgressUpdate,
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Report lesson progress (buffered; completions are written immediately)"""
+    # Check that the lesson exists and the user is enrolled in its course
+    lesson = db.query(Lesson.id).join(
+        course_enrollment,
+        (course_enrollment.c.course_id == Lesson.course_id) & (course_enrollment.c.user_id == current_user_id)
+    ).filter(Lesson.id == lesson_id).first()
+
+    if not lesson:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lesson not found in your enrolled courses"
+        )
+
+    written = progress_buffer.record(
+        user_id=current_user_id,
+        lesson_id=lesson_id,
+        progress=progress_data.progress_percent,
+        completed=progress_data.completed
+    )
+
+    return {
+        "lesson_id": lesson_id,
+        "progress_percent": progress_data.progress_percent,
+        "completed": progress_data.completed,
+        "buffered": not written
+    }
+
+@router.post("/sync", response_model=ProgressSyncResponse)
+def sync_progress(
+    sync_data: ProgressSyncRequest,
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Apply a batch of offline progress events and return changes since the last sync"""
+    return ProgressService.sync_offline_events(
+        db=db,
+        user_id=current_user_id,
+        events=sync_data.events,
+        since=sync_data.since
+    )
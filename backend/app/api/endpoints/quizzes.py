@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, File, Form, UploadFile, status
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.models import Quiz, Question, QuizAttempt, Course, User
-from app.schemas.schemas import QuizCreate, QuizResponse, QuizUpdate, QuizSubmissionRequest, QuizAttemptResponse
-from app.services.quiz_service import QuizService
-from typing import List
+from app.models.models import Quiz, Question, Answer, QuizAttempt, QuizImportJob, Course, User
+from app.schemas.schemas import QuizCreate, QuizResponse, QuizUpdate, QuizSubmissionRequest, QuizAttemptResponse, QuizImportJobResponse
+from app.services.quiz_service import QuizService, CompletionTracker
+from app.services.quiz_import_service import QuizImportService
+from app.tasks.celery_app import import_question_bank
+from typing import List, Optional
 from app.api.endpoints.auth import get_current_user_id
+import os
+import uuid
+
+IMPORT_DIR = settings.QUIZ_IMPORT_DIR
+IMPORT_CHUNK_SIZE = 1024 * 1024
 
 router = APIRouter(prefix="/quizzes", tags=["quizzes"])
 
@@ -42,14 +50,119 @@ def create_quiz(
                 **q_data.dict(exclude={"answers"}),
                 quiz_id=None  # Will be set after quiz is created
             )
+            for a_data in q_data.answers or []:
+                question.answers.append(Answer(**a_data.dict()))
             db_quiz.questions.append(question)
     
     db.add(db_quiz)
+    db.flush()
+    
+    # A new quiz changes every enrolled student's completion
+    CompletionTracker.course_structure_changed(db, course_id)
+    
     db.commit()
     db.refresh(db_quiz)
     
     return db_quiz
 
+@router.post("/{course_id}/quizzes/import", response_model=QuizImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_quiz(
+    course_id: int,
+    title: str = Form(...),
+    description: Optional[str] = Form(None),
+    passing_score: float = Form(60.0),
+    format: Optional[str] = Form(None),
+    file: UploadFile = File(...),
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Import a GIFT or QTI question bank into a new quiz"""
+    course = db.query(Course).filter(Course.id == course_id).first()
+    
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    
+    if course.instructor_id != current_user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only create quizzes for your own courses"
+        )
+    
+    bank_format = (format or QuizImportService.detect_format(file.filename) or "").lower()
+    if bank_format not in QuizImportService.PARSERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported question bank format. Use GIFT (.gift, .txt) or QTI (.xml, .qti)"
+        )
+    
+    # Spool the upload to disk in chunks; the worker parses it incrementally
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    source_path = os.path.join(IMPORT_DIR, f"{uuid.uuid4()}{os.path.splitext(file.filename or '')[1]}")
+    size = 0
+    with open(source_path, "wb") as buffer:
+        while True:
+            chunk = file.file.read(IMPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.QUIZ_IMPORT_MAX_FILE_SIZE:
+                buffer.close()
+                os.remove(source_path)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"File size exceeds maximum limit of {settings.QUIZ_IMPORT_MAX_FILE_SIZE / (1024*1024):.0f}MB"
+                )
+            buffer.write(chunk)
+    
+    db_quiz = Quiz(
+        course_id=course_id,
+        title=title,
+        description=description,
+        passing_score=passing_score
+    )
+    db.add(db_quiz)
+    db.flush()
+    
+    job = QuizImportJob(
+        course_id=course_id,
+        quiz_id=db_quiz.id,
+        created_by=current_user_id,
+        format=bank_format,
+        source_path=source_path,
+        status="pending"
+    )
+    db.add(job)
+    CompletionTracker.course_structure_changed(db, course_id)
+    db.commit()
+    db.refresh(job)
+    
+    import_question_bank.delay(job_id=job.id)
+    
+    return job
+
+@router.get("/imports/{job_id}", response_model=QuizImportJobResponse)
+def get_import_status(
+    job_id: int,
+    current_user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Get the progress of a question bank import"""
+    job = db.query(QuizImportJob).filter(
+        QuizImportJob.id == job_id,
+        QuizImportJob.created_by == current_user_id
+    ).first()
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
+    
+    return job
+
 @router.get("/{course_id}/quizzes", response_model=List[QuizResponse])
 def list_quizzes(course_id: int, db: Session = Depends(get_db)):
     """List quizzes for a course"""
@@ -1,22 +1,22 @@
+import hashlib
 import os
-import shutil
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, status
+from fastapi import APIRouter, Depends, HTTPException, File, Request, UploadFile, status
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.models import Course, User
 from app.api.endpoints.auth import get_current_user_id
-from datetime import datetime
 import uuid
 
-router = APIRouter(prefix="/uploads", tags=["uploads"])
-
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = "uploads"
 VIDEOS_DIR = os.path.join(UPLOAD_DIR, "videos")
 THUMBNAILS_DIR = os.path.join(UPLOAD_DIR, "thumbnails")
 MATERIALS_DIR = os.path.join(UPLOAD_DIR, "materials")
 
-for directory in [VIDEOS_DIR, THUMBNAILS_DIR, MATERIALS_DIR]:
+for directory in [VIDEOS_DIR, THUMBNAILS_DIR, MATERIALS_DIR, settings.UPLOAD_PARTIAL_DIR]:
     os.makedirs(directory, exist_ok=True)
 
 # File size limits (in bytes)
@@ -24,29 +24,202 @@ MAX_VIDEO_SIZE = 500 * 1024 * 1024  # 500 MB
 MAX_IMAGE_SIZE = 5 * 1024 * 1024    # 5 MB
 MAX_MATERIAL_SIZE = 50 * 1024 * 1024  # 50 MB
 
+# File size limit by endpoint name, checked against Content-Length before the body is read
+MAX_UPLOAD_SIZES = {
+    "upload_video": MAX_VIDEO_SIZE,
+    "upload_thumbnail": MAX_IMAGE_SIZE,
+    "upload_material": MAX_MATERIAL_SIZE,
+}
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def size_exceeded(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File size exceeds maximum limit of {max_size / (1024*1024):.0f}MB"
+    )
+
+
+class UploadRoute(APIRoute):
+    """
+    Rejects a request whose declared Content-Length is over the endpoint's limit.
+    FastAPI parses (and spools) the whole multipart form before the endpoint runs, so
+    this is the only point where an oversized upload can be refused unread.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        max_size = MAX_UPLOAD_SIZES.get(self.name)
+        if max_size is None:
+            return handler
+
+        async def limited_handler(request: Request):
+            content_length = request.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+                raise size_exceeded(max_size)
+            return await handler(request)
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/uploads", tags=["uploads"], route_class=UploadRoute)
+
 # Allowed file types
 ALLOWED_VIDEO_TYPES = {"video/mp4", "video/quicktime", "video/x-msvideo", "video/x-matroska"}
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
 ALLOWED_MATERIAL_TYPES = {"application/pdf", "application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/vnd.ms-excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "text/plain"}
 
 
-def validate_file(file: UploadFile, max_size: int, allowed_types: set) -> None:
-    """Validate file size and type"""
-    if file.content_type not in allowed_types:
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Stored extension by detected type; the client's filename is not trusted
+TYPE_EXTENSIONS = {
+    "video/mp4": ".mp4",
+    "video/quicktime": ".mov",
+    "video/x-msvideo": ".avi",
+    "video/x-matroska": ".mkv",
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "application/pdf": ".pdf",
+    "application/msword": ".doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/vnd.ms-excel": ".xls",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+    "text/plain": ".txt",
+}
+
+# ISO base media major brands that are video; the same container also carries HEIC/AVIF images and M4A audio
+FTYP_VIDEO_BRANDS = {
+    b"qt  ": "video/quicktime",
+    b"isom": "video/mp4",
+    b"iso2": "video/mp4",
+    b"iso4": "video/mp4",
+    b"iso5": "video/mp4",
+    b"iso6": "video/mp4",
+    b"mp41": "video/mp4",
+    b"mp42": "video/mp4",
+    b"avc1": "video/mp4",
+    b"dash": "video/mp4",
+    b"mmp4": "video/mp4",
+    b"M4V ": "video/mp4",
+    b"M4VH": "video/mp4",
+    b"M4VP": "video/mp4",
+}
+
+
+def sniff_types(head: bytes) -> set:
+    """Content types the leading bytes of a file are consistent with"""
+    if head[4:8] == b"ftyp":
+        brand = FTYP_VIDEO_BRANDS.get(head[8:12])
+        return {brand} if brand else set()
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return {"video/x-msvideo"}
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return {"image/webp"}
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return {"video/x-matroska"}
+    if head.startswith(b"\xff\xd8\xff"):
+        return {"image/jpeg"}
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return {"image/png"}
+    if head.startswith(b"%PDF-"):
+        return {"application/pdf"}
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        # OLE2 compound file: legacy Office formats
+        return {"application/msword", "application/vnd.ms-excel"}
+    if head.startswith(b"PK\x03\x04"):
+        # ZIP container: Office Open XML formats
+        return {
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        }
+    if head and b"\x00" not in head:
+        try:
+            # The chunk may end inside a multi-byte character
+            head.decode("utf-8")
+            return {"text/plain"}
+        except UnicodeDecodeError as e:
+            if e.start >= len(head) - 3:
+                return {"text/plain"}
+    return set()
+
+
+def detect_type(head: bytes, declared_type: str, allowed_types: set) -> str:
+    """Resolve the upload's type from its content, using the declared type only to pick between candidates"""
+    candidates = sniff_types(head) & allowed_types
+    if not candidates:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File type not allowed. Allowed types: {allowed_types}"
         )
+    return declared_type if declared_type in candidates else sorted(candidates)[0]
+
+
+def write_chunk(buffer, digest, chunk: bytes) -> None:
+    """Hash and write one chunk; run off the event loop, as both are CPU/IO bound"""
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+def remove_partial(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(file: UploadFile, directory: str, max_size: int, allowed_types: set, label: str) -> dict:
+    """
+    Copy an upload to its directory in chunks: the type is checked from the first chunk,
+    the size limit as data is copied, and a SHA-256 is computed on the way.
+
+    By the time this runs Starlette has already spooled the request body, so the size
+    check here only bounds what is copied; oversized requests that declare their length
+    are refused earlier by UploadRoute, chunked ones are not. The copy is written to
+    UPLOAD_PARTIAL_DIR, which is not served, and renamed into place once complete.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = os.path.join(settings.UPLOAD_PARTIAL_DIR, f"{uuid.uuid4()}.part")
     
-    # Check file size by reading content
-    content = file.file.read()
-    file.file.seek(0)  # Reset file pointer
-    
-    if len(content) > max_size:
+    try:
+        buffer = await run_in_threadpool(open, partial_path, "wb")
+        try:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            content_type = detect_type(chunk, file.content_type, allowed_types)
+            
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise size_exceeded(max_size)
+                await run_in_threadpool(write_chunk, buffer, digest, chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        finally:
+            await run_in_threadpool(buffer.close)
+        
+        unique_filename = f"{uuid.uuid4()}{TYPE_EXTENSIONS[content_type]}"
+        file_path = os.path.join(directory, unique_filename)
+        await run_in_threadpool(os.replace, partial_path, file_path)
+    except HTTPException:
+        remove_partial(partial_path)
+        raise
+    except Exception as e:
+        remove_partial(partial_path)
+        print(f"Error saving {label} upload: {e}")
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size exceeds maximum limit of {max_size / (1024*1024):.0f}MB"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save {label} file"
         )
+    
+    return {
+        "filename": unique_filename,
+        "path": file_path,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "content_type": content_type,
+    }
 
 
 @router.post("/video/{course_id}")
@@ -73,29 +246,17 @@ async def upload_video(
             detail="Only the course instructor or admin can upload videos"
         )
     
-    # Validate file
-    validate_file(file, MAX_VIDEO_SIZE, ALLOWED_VIDEO_TYPES)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(VIDEOS_DIR, unique_filename)
-    
-    # Save file
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to save video file"
-        )
+    # Validate and save file
+    saved = await save_upload(file, VIDEOS_DIR, MAX_VIDEO_SIZE, ALLOWED_VIDEO_TYPES, "video")
+    unique_filename = saved["filename"]
     
     return {
         "filename": unique_filename,
         "url": f"/uploads/videos/{unique_filename}",
         "original_name": file.filename,
-        "size": os.path.getsize(file_path)
+        "size": saved["size"],
+        "sha256": saved["sha256"],
+        "content_type": saved["content_type"]
     }
 
 
@@ -123,23 +284,9 @@ async def upload_thumbnail(
             detail="Only the course instructor or admin can upload thumbnails"
         )
     
-    # Validate file
-    validate_file(file, MAX_IMAGE_SIZE, ALLOWED_IMAGE_TYPES)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(THUMBNAILS_DIR, unique_filename)
-    
-    # Save file
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to save thumbnail file"
-        )
+    # Validate and save file
+    saved = await save_upload(file, THUMBNAILS_DIR, MAX_IMAGE_SIZE, ALLOWED_IMAGE_TYPES, "thumbnail")
+    unique_filename = saved["filename"]
     
     # Update course thumbnail URL
     course.thumbnail_url = f"/uploads/thumbnails/{unique_filename}"
@@ -149,7 +296,9 @@ async def upload_thumbnail(
         "filename": unique_filename,
         "url": f"/uploads/thumbnails/{unique_filename}",
         "original_name": file.filename,
-        "size": os.path.getsize(file_path)
+        "size": saved["size"],
+        "sha256": saved["sha256"],
+        "content_type": saved["content_type"]
     }
 
 
@@ -177,27 +326,15 @@ async def upload_material(
             detail="Only the course instructor or admin can upload materials"
         )
     
-    # Validate file
-    validate_file(file, MAX_MATERIAL_SIZE, ALLOWED_MATERIAL_TYPES)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(MATERIALS_DIR, unique_filename)
-    
-    # Save file
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to save material file"
-        )
+    # Validate and save file
+    saved = await save_upload(file, MATERIALS_DIR, MAX_MATERIAL_SIZE, ALLOWED_MATERIAL_TYPES, "material")
+    unique_filename = saved["filename"]
     
     return {
         "filename": unique_filename,
         "url": f"/uploads/materials/{unique_filename}",
         "original_name": file.filename,
-        "size": os.path.getsize(file_path)
+        "size": saved["size"],
+        "sha256": saved["sha256"],
+        "content_type": saved["content_type"]
     }
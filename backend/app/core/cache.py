@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+
+_PENDING_KEY = "cache_invalidations"
+
+
+class _Entry:
+    __slots__ = ("value", "computed_at", "stale", "shared")
+
+    def __init__(self, value: Any, computed_at: float, stale: bool = False, shared: Optional[tuple] = None):
+        self.value = value
+        self.computed_at = computed_at
+        self.stale = stale
+        self.shared = shared  # Shared generation the value was computed at
+
+
+class SharedGenerations:
+    """
+    Invalidation counters kept in Redis, per namespace and per key, so an invalidation
+    in one process (any API or Celery worker) marks the entry stale in every process.
+    While Redis is unreachable lookups report nothing and only local invalidations apply.
+    """
+
+    def __init__(self, url: str, prefix: str, expire_after: int = 86400, retry_after: float = 5.0):
+        self.url = url
+        self.prefix = prefix
+        # Must outlive any cache entry, or a counter could restart at a value an entry already holds
+        self.expire_after = expire_after
+        self.retry_after = retry_after
+        self._client = None
+        self._down_until = 0.0
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        return self._client
+
+    def _names(self, namespace: str, key: Optional[Hashable]) -> Tuple[str, str]:
+        return f"{self.prefix}:{namespace}", f"{self.prefix}:{namespace}:{key}"
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _failed(self, e: Exception) -> None:
+        print(f"Error reaching shared cache generations: {e}")
+        self._down_until = time.monotonic() + self.retry_after
+
+    def get(self, namespace: str, key: Optional[Hashable]) -> Optional[tuple]:
+        """(namespace generation, key generation), or None if Redis is unavailable"""
+        if not self._available():
+            return None
+        try:
+            values = self._redis().mget(self._names(namespace, key))
+        except Exception as e:
+            self._failed(e)
+            return None
+        return tuple(int(value or 0) for value in values)
+
+    def bump(self, namespace: str, key: Optional[Hashable] = None) -> None:
+        """Invalidate one key, or the whole namespace when key is None"""
+        if not self._available():
+            return
+        namespace_name, key_name = self._names(namespace, key)
+        name = namespace_name if key is None else key_name
+        try:
+            pipe = self._redis().pipeline()
+            pipe.incr(name)
+            pipe.expire(name, self.expire_after)
+            pipe.execute()
+        except Exception as e:
+            self._failed(e)
+
+
+class StaleWhileRevalidateCache:
+    """
+    In-process response cache keyed by (namespace, key).
+    Fresh entries are served as-is. Entries past their namespace's freshness window (or
+    invalidated) are still served immediately while a single background refresh recomputes
+    them with its own database session. Entries older than max_stale are recomputed inline.
+    With shared generations, invalidations from other processes are seen too, at the cost
+    of one Redis round trip per lookup.
+    """
+
+    def __init__(
+        self,
+        fresh_for: Dict[str, float],
+        max_stale: float,
+        max_entries: int = 10000,
+        session_factory=SessionLocal,
+        default_fresh_for: float = 30.0,
+        generations: Optional[SharedGenerations] = None
+    ):
+        self.fresh_for = fresh_for
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self.default_fresh_for = default_fresh_for
+        self.generations = generations
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._generations: Dict[tuple, int] = {}
+        self._refreshing: set = set()
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _shared(self, cache_key: tuple) -> Optional[tuple]:
+        return self.generations.get(*cache_key) if self.generations else None
+
+    @staticmethod
+    def _current(entry: _Entry, shared: Optional[tuple]) -> bool:
+        """False once another process invalidated the entry (unknowable without Redis)"""
+        return shared is None or entry.shared == shared
+
+    def _store(self, cache_key: tuple, value: Any, generation: int, shared: Optional[tuple]) -> None:
+        with self._lock:
+            # An invalidation that arrived while this value was computed leaves it stale
+            stale = self._generations.get(cache_key, 0) != generation
+            self._entries[cache_key] = _Entry(value, time.monotonic(), stale, shared)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._generations.pop(evicted, None)
+                self._key_locks.pop(evicted, None)
+
+    def _refresh(self, cache_key: tuple, loader: Callable[[Session], Any], generation: int) -> None:
+        db = self.session_factory()
+        try:
+            # Read before loading: an invalidation during the load leaves the result stale
+            shared = self._shared(cache_key)
+            value = loader(db)
+            if value is not None:
+                self._store(cache_key, value, generation, shared)
+        except Exception as e:
+            print(f"Error refreshing cached {cache_key[0]} entry: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+    def get(self, namespace: str, key: Hashable, loader: Callable[[Session], Any], db: Session) -> Any:
+        """Return the cached value, computing it with loader(db) when missing or too old"""
+        cache_key = (namespace, key)
+        fresh_for = self.fresh_for.get(namespace, self.default_fresh_for)
+        shared = self._shared(cache_key)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if not self._current(entry, shared):
+                    entry.stale = True
+                self._entries.move_to_end(cache_key)
+                age = time.monotonic() - entry.computed_at
+                if not entry.stale and age < fresh_for:
+                    return entry.value
+                if age < self.max_stale:
+                    if cache_key not in self._refreshing:
+                        self._refreshing.add(cache_key)
+                        generation = self._generations.get(cache_key, 0)
+                        threading.Thread(
+                            target=self._refresh,
+                            args=(cache_key, loader, generation),
+                            name=f"cache-refresh-{namespace}",
+                            daemon=True
+                        ).start()
+                    return entry.value
+            key_lock = self._key_locks.setdefault(cache_key, threading.Lock())
+
+        # Missing or too old to serve: compute inline, one caller per key
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(cache_key)
+                if entry is not None and time.monotonic() - entry.computed_at < fresh_for and not entry.stale and self._current(entry, shared):
+                    return entry.value
+                generation = self._generations.get(cache_key, 0)
+
+            value = loader(db)
+            if value is not None:
+                self._store(cache_key, value, generation, shared)
+            else:
+                with self._lock:
+                    self._key_locks.pop(cache_key, None)
+                    self._generations.pop(cache_key, None)
+            return value
+
+    def invalidate(self, namespace: str, key: Optional[Hashable] = None) -> None:
+        """Mark one entry (or a whole namespace when key is None) stale, in every process when shared"""
+        if self.generations:
+            self.generations.bump(namespace, key)
+        with self._lock:
+            if key is None:
+                targets = [k for k in self._entries if k[0] == namespace]
+            else:
+                targets = [(namespace, key)]
+            for cache_key in targets:
+                if cache_key not in self._entries and cache_key not in self._key_locks:
+                    continue
+                self._generations[cache_key] = self._generations.get(cache_key, 0) + 1
+                entry = self._entries.get(cache_key)
+                if entry is not None:
+                    entry.stale = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._key_locks.clear()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with expiry. Misses can be cached too (store None) with
+    their own, usually shorter, TTL so repeated lookups of unknown keys stay off the database.
+    """
+
+    MISSING = object()
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value (None for a cached miss), or TTLCache.MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return self.MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return self.MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is self.MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def invalidate_after_commit(db: Session, cache: StaleWhileRevalidateCache, namespace: str, key: Optional[Hashable] = None) -> None:
+    """
+    Queue an invalidation on the session and apply it once the session commits,
+    so a refresh it triggers always sees the committed change
+    """
+    db.info.setdefault(_PENDING_KEY, set()).add((cache, namespace, key))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session: Session) -> None:
+    for cache, namespace, key in session.info.pop(_PENDING_KEY, ()):
+        cache.invalidate(namespace, key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
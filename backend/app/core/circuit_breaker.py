@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before (or while) calling the dependency"""
+
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker over a rolling window of one-second buckets. The circuit
+    opens when, over at least min_calls calls in the window, the share of failures or of
+    slow calls reaches its threshold. After open_seconds it lets up to half_open_calls
+    probes through: all succeeding closes it, any failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: int = 60,
+        min_calls: int = 20,
+        failure_ratio: float = 0.5,
+        slow_call_seconds: float = 3.0,
+        slow_call_ratio: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 3
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_ratio = slow_call_ratio
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._buckets = deque()  # [second, calls, failures, slow]
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _trim(self, now: float) -> None:
+        horizon = int(now) - self.window_seconds
+        while self._buckets and self._buckets[0][0] <= horizon:
+            self._buckets.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._buckets.clear()
+
+    def _refresh(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; every allowed call must end in record() or release()"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_calls:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back an allowed call that ended without a result (e.g. cancelled)"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, success: bool, duration: float) -> None:
+        now = time.monotonic()
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not success or slow:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._state = CLOSED
+                        self._buckets.clear()
+                return
+            if self._state == OPEN:
+                # A call that started before the circuit opened
+                return
+
+            second = int(now)
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append([second, 0, 0, 0])
+            bucket = self._buckets[-1]
+            bucket[1] += 1
+            bucket[2] += 0 if success else 1
+            bucket[3] += 1 if slow else 0
+
+            self._trim(now)
+            calls = sum(b[1] for b in self._buckets)
+            if calls < self.min_calls:
+                return
+            failures = sum(b[2] for b in self._buckets)
+            slow_calls = sum(b[3] for b in self._buckets)
+            if failures / calls >= self.failure_ratio or slow_calls / calls >= self.slow_call_ratio:
+                self._open(now)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            self._trim(now)
+            calls = sum(b[1] for b in self._buckets)
+            return {
+                "state": self._state,
+                "calls": calls,
+                "failures": sum(b[2] for b in self._buckets),
+                "slow_calls": sum(b[3] for b in self._buckets),
+            }
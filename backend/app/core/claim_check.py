@@ -0,0 +1,82 @@
+import os
+import time
+import uuid
+from typing import Any
+from app.core.config import settings
+
+CLAIM_CHECK_KEY = "__claim_check__"
+
+
+class ClaimCheckStore:
+    """
+    Keeps large task payloads out of the broker. Values above the size threshold are
+    written to shared storage and replaced by a small reference that the consuming
+    task resolves; the blob is released once the task succeeds, and anything left
+    behind (failed or lost tasks) is garbage-collected after a TTL.
+    """
+
+    def __init__(self, directory: str = None, threshold: int = None, ttl_seconds: int = None):
+        self.directory = directory or settings.CLAIM_CHECK_DIR
+        self.threshold = threshold if threshold is not None else settings.CLAIM_CHECK_THRESHOLD_BYTES
+        self.ttl_seconds = ttl_seconds or settings.CLAIM_CHECK_TTL_SECONDS
+
+    def _path(self, claim_id: str) -> str:
+        # Claim ids are generated here; never let a crafted reference escape the directory
+        if not claim_id or os.path.basename(claim_id) != claim_id:
+            raise ValueError("Invalid claim check reference")
+        return os.path.join(self.directory, claim_id)
+
+    @staticmethod
+    def is_reference(value: Any) -> bool:
+        return isinstance(value, dict) and CLAIM_CHECK_KEY in value
+
+    def put(self, value) -> dict:
+        """Store bytes or str and return a reference to them"""
+        data = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        os.makedirs(self.directory, exist_ok=True)
+        claim_id = uuid.uuid4().hex
+        path = self._path(claim_id)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+        return {CLAIM_CHECK_KEY: claim_id, "size": len(data), "type": "str" if isinstance(value, str) else "bytes"}
+
+    def get(self, reference: dict):
+        with open(self._path(reference[CLAIM_CHECK_KEY]), "rb") as f:
+            data = f.read()
+        return data.decode("utf-8") if reference.get("type") == "str" else data
+
+    def release(self, reference: dict) -> None:
+        try:
+            os.remove(self._path(reference[CLAIM_CHECK_KEY]))
+        except FileNotFoundError:
+            pass
+
+    def check_in(self, value: Any) -> Any:
+        """Replace a value with a reference if it is large enough to offload"""
+        if isinstance(value, (bytes, bytearray, str)) and len(value) > self.threshold:
+            return self.put(value)
+        return value
+
+    def check_out(self, value: Any) -> Any:
+        return self.get(value) if self.is_reference(value) else value
+
+    def collect_garbage(self, ttl_seconds: int = None) -> int:
+        """Delete blobs older than the TTL; returns how many were removed"""
+        if not os.path.isdir(self.directory):
+            return 0
+
+        cutoff = time.time() - (ttl_seconds or self.ttl_seconds)
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+claim_check_store = ClaimCheckStore()
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # Database - Use SQLite for local development
@@ -25,6 +25,29 @@ class Settings(BaseSettings):
     FLUTTERWAVE_PUBLIC_KEY: str = ""
     PAYSTACK_BASE_URL: str = "https://api.paystack.co"
     FLUTTERWAVE_BASE_URL: str = "https://api.flutterwave.com"
+    FLUTTERWAVE_WEBHOOK_HASH: str = ""  # The "secret hash" set on the Flutterwave dashboard
+    GATEWAY_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    GATEWAY_READ_TIMEOUT_SECONDS: float = 10.0
+    GATEWAY_POOL_TIMEOUT_SECONDS: float = 2.0
+    GATEWAY_MAX_CONNECTIONS: int = 20
+    GATEWAY_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GATEWAY_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    GATEWAY_REQUEST_BUDGET_SECONDS: float = 8.0  # Default deadline for one verification
+    GATEWAY_BREAKER_WINDOW_SECONDS: int = 60
+    GATEWAY_BREAKER_MIN_CALLS: int = 20
+    GATEWAY_BREAKER_FAILURE_RATIO: float = 0.5
+    GATEWAY_BREAKER_SLOW_CALL_SECONDS: float = 3.0
+    GATEWAY_BREAKER_SLOW_CALL_RATIO: float = 0.8
+    GATEWAY_BREAKER_OPEN_SECONDS: float = 30.0
+    GATEWAY_BREAKER_HALF_OPEN_CALLS: int = 3
+    PAYMENT_VERIFY_CACHE_TTL_SECONDS: float = 60  # Settled verification results only
+    PAYMENT_VERIFY_CACHE_MAX_ENTRIES: int = 10000
+    PAYMENT_RECONCILE_AFTER_MINUTES: int = 15
+    PAYMENT_EXPIRE_AFTER_HOURS: int = 24
+    PAYMENT_RECONCILE_PAGE_SIZE: int = 200
+    PAYMENT_RECONCILE_CONCURRENCY: int = 20
+    WEBHOOK_RETRY_AFTER_MINUTES: int = 10  # Received events not processed by then are requeued
+    WEBHOOK_RETRY_BATCH_SIZE: int = 500
     
     # Email
     EMAIL_FROM: str = "noreply@edulearn.com"
@@ -54,6 +77,23 @@ class Settings(BaseSettings):
     ALLOWED_VIDEO_EXTENSIONS: List[str] = [".mp4", ".avi", ".mov", ".mkv", ".webm"]
     ALLOWED_DOC_EXTENSIONS: List[str] = [".pdf", ".docx", ".pptx", ".txt", ".doc"]
     UPLOAD_DIR: str = "uploads"
+    UPLOAD_PARTIAL_DIR: str = "upload_partials"  # Not served; keep on UPLOAD_DIR's filesystem so finished files are renamed in
+    CERTIFICATE_DIR: str = "certificates"
+    CERTIFICATE_RENDERER: str = "platypus"  # platypus, or compiled: faster, but a different layout and file size
+    CERTIFICATE_BATCH_CHUNK_SIZE: int = 200
+    CERTIFICATE_BATCH_WORKERS: int = 0  # 0 = one per CPU
+    CERTIFICATE_BATCH_EMAIL_SIZE: int = 50
+    CERTIFICATE_BATCH_STALE_SECONDS: int = 600
+    CERTIFICATE_VERIFY_CACHE_TTL_SECONDS: float = 3600
+    CERTIFICATE_VERIFY_NEGATIVE_TTL_SECONDS: float = 300
+    CERTIFICATE_VERIFY_CACHE_MAX_ENTRIES: int = 50000
+    CERTIFICATE_VERIFY_RATE_PER_MINUTE: float = 30
+    CERTIFICATE_VERIFY_BURST: int = 10
+    
+    # Question bank import (uploads are spooled outside UPLOAD_DIR, which is served publicly)
+    QUIZ_IMPORT_DIR: str = "quiz_imports"
+    QUIZ_IMPORT_BATCH_SIZE: int = 500
+    QUIZ_IMPORT_MAX_FILE_SIZE: int = 209715200  # 200MB
     
     # AWS S3
     AWS_ACCESS_KEY_ID: str = ""
@@ -64,6 +104,40 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Lesson progress write-behind buffer
+    PROGRESS_FLUSH_INTERVAL_SECONDS: float = 5.0
+    PROGRESS_BUFFER_MAX_PENDING: int = 5000
+    
+    # Claim check for large Celery task payloads (directory must be shared with workers)
+    CLAIM_CHECK_DIR: str = "claim_checks"
+    CLAIM_CHECK_THRESHOLD_BYTES: int = 16384
+    CLAIM_CHECK_TTL_SECONDS: int = 604800  # 7 days
+    
+    # Reports (kept outside UPLOAD_DIR, which is served publicly)
+    REPORT_DIR: str = "reports"
+    REPORT_FETCH_SIZE: int = 1000
+    
+    # Dashboard cache: seconds a dashboard is served without a refresh, per dashboard
+    DASHBOARD_CACHE_FRESH_SECONDS: Dict[str, float] = {"student": 30, "instructor": 60, "admin": 30}
+    DASHBOARD_CACHE_MAX_STALE_SECONDS: float = 600
+    DASHBOARD_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Learning event log (columnar segment files)
+    EVENT_LOG_DIR: str = "event_log"
+    EVENT_LOG_FLUSH_INTERVAL_SECONDS: float = 10.0
+    EVENT_LOG_MAX_PENDING: int = 10000
+    
+    # Course analytics (funnels and cohort retention)
+    ANALYTICS_CHUNK_SIZE: int = 5000
+    ANALYTICS_RETENTION_WEEKS: int = 26
+    ANALYTICS_CACHE_FRESH_SECONDS: float = 300
+    ANALYTICS_CACHE_MAX_STALE_SECONDS: float = 3600
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 2000
+    
+    # Platform rollups
+    PLATFORM_ROLLUP_DAILY_RETENTION_DAYS: int = 90
+    PLATFORM_ROLLUP_SHARDS: int = 8  # Rows per day, so concurrent writes don't queue on one
+    
     # Pagination
     DEFAULT_PAGE_SIZE: int = 10
     MAX_PAGE_SIZE: int = 100
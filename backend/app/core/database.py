@@ -25,6 +25,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expi
 Base = declarative_base()
 
 
+def dialect_insert(table):
+    """Return an INSERT for the active dialect that supports ON CONFLICT upserts"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
 def get_db() -> Session:
     db = SessionLocal()
     try:
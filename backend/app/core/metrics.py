@@ -0,0 +1,104 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    rendered = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + rendered + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process counters, histograms and gauges, rendered in the Prometheus
+    text exposition format. Values are per process (each worker reports its own).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, list]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._gauges: Dict[str, Callable[[], List[Tuple[Dict[str, str], float]]]] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._help.setdefault(name, ("counter", help_text))
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self._help.setdefault(name, ("histogram", help_text))
+        self._histograms.setdefault(name, {})
+        self._buckets.setdefault(name, tuple(sorted(buckets)))
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], List[Tuple[Dict[str, str], float]]]) -> None:
+        """Register a gauge whose (labels, value) samples are collected at render time"""
+        self._help[name] = ("gauge", help_text)
+        self._gauges[name] = collect
+
+    def inc(self, name: str, labels: Dict[str, str] = None, value: float = 1.0) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        key = _label_key(labels)
+        buckets = self._buckets[name]
+        with self._lock:
+            series = self._histograms[name]
+            state = series.get(key)
+            if state is None:
+                # Per-bucket counts (+Inf last), sum, count
+                state = series[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, name: str, labels: Dict[str, str] = None) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (list(state[0]), state[1], state[2]) for key, state in series.items()}
+                for name, series in self._histograms.items()
+            }
+        gauges = {name: collect() for name, collect in list(self._gauges.items())}
+
+        for name in sorted(self._help):
+            kind, help_text = self._help[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for key, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            elif kind == "gauge":
+                for labels, value in gauges.get(name, []):
+                    lines.append(f"{name}{_format_labels(_label_key(labels))} {value:g}")
+            else:
+                bounds = self._buckets[name]
+                for key, (counts, total, count) in sorted(histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(bounds + (float("inf"),), counts):
+                        cumulative += bucket_count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {total:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,193 @@
+"""
+In-place upgrade of an existing database to the current models.
+
+create_all only creates missing tables. Columns, indexes and constraints added to
+tables that already exist have to be applied here. Every step checks the live schema
+first, so running the upgrade again is a no-op.
+"""
+from typing import List
+from sqlalchemy import Enum, UniqueConstraint, func, inspect, literal, select, text, update
+from sqlalchemy.engine import Engine
+from app.models.models import Base, Certificate, LessonProgress, PlatformRollup
+
+# Certificates rendered before certificate status tracking were written here
+LEGACY_CERTIFICATE_DIR = "certificates/"
+
+# Unique keys replaced on rebuildable projection tables, which are recreated when found
+RETIRED_PROJECTION_KEYS = {
+    PlatformRollup.__tablename__: "uq_platform_rollup_bucket",
+}
+
+
+def drop_retired_projections(engine: Engine) -> List[str]:
+    """
+    Drop projection tables still keyed by a retired unique constraint. SQLite can't drop
+    a constraint from an existing table, and the rows are recomputed by the rebuild
+    command anyway. Returns the dropped table names.
+    """
+    inspector = inspect(engine)
+    dropped = []
+    for table_name, key in RETIRED_PROJECTION_KEYS.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {constraint["name"] for constraint in inspector.get_unique_constraints(table_name)}
+        existing |= {index["name"] for index in inspector.get_indexes(table_name)}
+        if key in existing:
+            Base.metadata.tables[table_name].drop(bind=engine)
+            dropped.append(table_name)
+    return dropped
+
+
+def add_missing_columns(engine: Engine) -> List[str]:
+    """Add model columns missing from existing tables; returns them as "table.column" """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def add_missing_enum_values(engine: Engine) -> List[str]:
+    """
+    Add model enum members missing from existing PostgreSQL enum types (e.g.
+    paymentstatusenum EXPIRED); writing a missing value fails the whole transaction.
+    Returns them as "type.VALUE".
+    """
+    if engine.dialect.name != "postgresql":
+        # Other backends store enums as VARCHAR (with at most a CHECK on new tables)
+        return []
+
+    labels = {enum["name"]: set(enum["labels"]) for enum in inspect(engine).get_enums()}
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    # ALTER TYPE ... ADD VALUE cannot be used in the transaction that adds it
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in Base.metadata.sorted_tables:
+            for column in table.columns:
+                if not isinstance(column.type, Enum) or column.type.name not in labels:
+                    continue
+                for value in column.type.enums:
+                    if value in labels[column.type.name]:
+                        continue
+                    conn.execute(text(f"ALTER TYPE {quote(column.type.name)} ADD VALUE IF NOT EXISTS '{value}'"))
+                    labels[column.type.name].add(value)
+                    added.append(f"{column.type.name}.{value}")
+    return added
+
+
+def backfill_columns(engine: Engine, added: List[str]) -> None:
+    """Give rows that predate the added columns their values"""
+    with engine.begin() as conn:
+        if "certificate.status" in added:
+            # Legacy certificates were rendered synchronously, so any with a URL is ready
+            certificate = Certificate.__table__
+            conn.execute(update(certificate).where(
+                certificate.c.status.is_(None),
+                certificate.c.pdf_url.isnot(None)
+            ).values(
+                status="ready",
+                pdf_path=literal(LEGACY_CERTIFICATE_DIR) + certificate.c.certificate_number + ".pdf",
+                rendered_at=certificate.c.issue_date
+            ))
+        if "certificate.created_at" in added:
+            certificate = Certificate.__table__
+            conn.execute(update(certificate).where(certificate.c.created_at.is_(None)).values(created_at=certificate.c.issue_date))
+
+        for name in added:
+            table_name, column_name = name.split(".", 1)
+            column = Base.metadata.tables[table_name].c[column_name]
+            if column.default is not None and column.default.is_scalar:
+                conn.execute(update(column.table).where(column.is_(None)).values({column_name: column.default.arg}))
+
+
+def dedupe_lesson_progress(engine: Engine) -> int:
+    """
+    Merge duplicate (user, lesson) progress rows into the oldest one, keeping the
+    highest progress and a sticky completed flag. Returns the number of rows removed.
+    """
+    table = LessonProgress.__table__
+    removed = 0
+    with engine.begin() as conn:
+        duplicates = conn.execute(
+            select(table.c.user_id, table.c.lesson_id).group_by(table.c.user_id, table.c.lesson_id).having(func.count() > 1)
+        ).all()
+        for user_id, lesson_id in duplicates:
+            rows = conn.execute(
+                select(table).where(table.c.user_id == user_id, table.c.lesson_id == lesson_id).order_by(table.c.id)
+            ).all()
+            keep, extra = rows[0], rows[1:]
+            conn.execute(update(table).where(table.c.id == keep.id).values(
+                progress_percent=max(row.progress_percent or 0.0 for row in rows),
+                completed=any(row.completed for row in rows),
+                last_accessed=max((row.last_accessed for row in rows if row.last_accessed), default=keep.last_accessed)
+            ))
+            conn.execute(table.delete().where(table.c.id.in_([row.id for row in extra])))
+            removed += len(extra)
+    return removed
+
+
+def add_missing_unique_constraints(engine: Engine) -> List[str]:
+    """
+    Create named unique constraints missing from existing tables as unique indexes,
+    which ON CONFLICT accepts on both PostgreSQL and SQLite
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        existing |= {index["name"] for index in inspector.get_indexes(table.name)}
+        for constraint in table.constraints:
+            if not isinstance(constraint, UniqueConstraint) or constraint.name in existing:
+                continue
+            if table.name == LessonProgress.__tablename__:
+                # Rows written before the constraint may repeat a (user, lesson) pair
+                dedupe_lesson_progress(engine)
+            columns = ", ".join(quote(column.name) for column in constraint.columns)
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE UNIQUE INDEX {quote(constraint.name)} ON {quote(table.name)} ({columns})"))
+            created.append(constraint.name)
+    return created
+
+
+def add_missing_indexes(engine: Engine) -> List[str]:
+    """Create model indexes missing from existing tables"""
+    inspector = inspect(engine)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def upgrade_schema(engine: Engine) -> dict:
+    """Bring an existing database up to the current models"""
+    recreated = drop_retired_projections(engine)
+    Base.metadata.create_all(bind=engine)
+    enum_values = add_missing_enum_values(engine)
+    added = add_missing_columns(engine)
+    backfill_columns(engine, added)
+    return {
+        "recreated_tables": recreated,
+        "enum_values": enum_values,
+        "columns": added,
+        "unique_constraints": add_missing_unique_constraints(engine),
+        "indexes": add_missing_indexes(engine),
+    }
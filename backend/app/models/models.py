@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, DateTime, Enum, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, Date, DateTime, Enum, ForeignKey, Table, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -11,9 +11,12 @@ course_enrollment = Table(
     "course_enrollment",
     Base.metadata,
     Column("user_id", Integer, ForeignKey("user.id"), primary_key=True),
-    Column("course_id", Integer, ForeignKey("course.id"), primary_key=True),
+    Column("course_id", Integer, ForeignKey("course.id"), primary_key=True, index=True),
     Column("enrolled_at", DateTime, default=datetime.utcnow),
     Column("progress", Float, default=0.0),  # 0-100
+    Column("completed_lessons", Integer, default=0),
+    Column("passed_quizzes", Integer, default=0),
+    Column("completed_at", DateTime, nullable=True),
 )
 
 class RoleEnum(str, enum.Enum):
@@ -26,6 +29,7 @@ class PaymentStatusEnum(str, enum.Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     REFUNDED = "refunded"
+    EXPIRED = "expired"  # Abandoned: never settled at the gateway
 
 class QuestionTypeEnum(str, enum.Enum):
     MULTIPLE_CHOICE = "multiple_choice"
@@ -74,9 +78,11 @@ class Course(Base):
     level = Column(String(50), default="beginner")  # beginner, intermediate, advanced
     category = Column(String(100), index=True)
     is_published = Column(Boolean, default=False)
-    instructor_id = Column(Integer, ForeignKey("user.id"))
+    instructor_id = Column(Integer, ForeignKey("user.id"), index=True)
     learning_objectives = Column(Text, nullable=True)  # Store as JSON string
     requirements = Column(Text, nullable=True)  # Store as JSON string
+    lesson_count = Column(Integer, default=0)  # Maintained by CompletionTracker
+    quiz_count = Column(Integer, default=0)  # Maintained by CompletionTracker
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -89,7 +95,7 @@ class Lesson(Base):
     __tablename__ = "lesson"
     
     id = Column(Integer, primary_key=True, index=True)
-    course_id = Column(Integer, ForeignKey("course.id"))
+    course_id = Column(Integer, ForeignKey("course.id"), index=True)
     title = Column(String(255))
     description = Column(Text, nullable=True)
     order = Column(Integer)
@@ -105,6 +111,9 @@ class Lesson(Base):
 
 class LessonProgress(Base):
     __tablename__ = "lesson_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", "lesson_id", name="uq_lesson_progress_user_lesson"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("user.id"))
@@ -118,7 +127,7 @@ class Quiz(Base):
     __tablename__ = "quiz"
     
     id = Column(Integer, primary_key=True, index=True)
-    course_id = Column(Integer, ForeignKey("course.id"))
+    course_id = Column(Integer, ForeignKey("course.id"), index=True)
     title = Column(String(255))
     description = Column(Text, nullable=True)
     passing_score = Column(Float, default=60.0)
@@ -159,8 +168,8 @@ class QuizAttempt(Base):
     __tablename__ = "quiz_attempt"
     
     id = Column(Integer, primary_key=True, index=True)
-    quiz_id = Column(Integer, ForeignKey("quiz.id"))
-    user_id = Column(Integer, ForeignKey("user.id"))
+    quiz_id = Column(Integer, ForeignKey("quiz.id"), index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
     score = Column(Float, nullable=True)
     passed = Column(Boolean, nullable=True)
     started_at = Column(DateTime, default=datetime.utcnow)
@@ -190,10 +199,27 @@ class Payment(Base):
     payment_method = Column(String(50))  # paystack, flutterwave
     transaction_id = Column(String(255), unique=True, index=True)
     reference = Column(String(255), unique=True)
-    status = Column(Enum(PaymentStatusEnum), default=PaymentStatusEnum.PENDING)
+    status = Column(Enum(PaymentStatusEnum), default=PaymentStatusEnum.PENDING, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class WebhookEvent(Base):
+    __tablename__ = "webhook_event"
+    __table_args__ = (
+        UniqueConstraint("gateway", "event_id", name="uq_webhook_event_gateway_event"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    gateway = Column(String(50))  # paystack, flutterwave
+    event_id = Column(String(255))  # Gateway event identity; redeliveries share it
+    event_type = Column(String(100))
+    payload = Column(Text)  # Raw request body
+    status = Column(String(20), default="received", index=True)  # received, processed, ignored, deferred
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
 class Certificate(Base):
     __tablename__ = "certificate"
     
@@ -202,8 +228,112 @@ class Certificate(Base):
     course_id = Column(Integer, ForeignKey("course.id"))
     certificate_number = Column(String(100), unique=True, index=True)
     issue_date = Column(DateTime, default=datetime.utcnow)
-    pdf_url = Column(String(500))
+    status = Column(String(20), default="pending")  # pending, ready, failed
+    pdf_url = Column(String(500), nullable=True)  # set once the PDF is rendered
+    pdf_path = Column(String(500), nullable=True)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the PDF, used as its ETag
+    error = Column(Text, nullable=True)
+    rendered_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Revenue(Base):
+    __tablename__ = "revenue"
+    __table_args__ = (
+        UniqueConstraint("course_id", "year", "month", name="uq_revenue_course_month"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("course.id"), index=True)
+    instructor_id = Column(Integer, ForeignKey("user.id"), index=True)
+    total_revenue = Column(Float, default=0.0)
+    total_enrollments = Column(Integer, default=0)  # Paid enrollments
+    month = Column(Integer)
+    year = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PlatformRollup(Base):
+    __tablename__ = "platform_rollup"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket", "shard", name="uq_platform_rollup_shard"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10))  # day, month
+    bucket = Column(Date)  # The day, or the first day of the month
+    shard = Column(Integer, default=0)  # Daily writes are spread over shards; readers sum them
+    revenue = Column(Float, default=0.0)
+    payments = Column(Integer, default=0)
+    enrollments = Column(Integer, default=0)
+    signups = Column(Integer, default=0)
+    completions = Column(Integer, default=0)
+    compacted = Column(Boolean, default=False)  # Daily row already folded into its month
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StudentStats(Base):
+    __tablename__ = "student_stats"
+    
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    enrolled_courses = Column(Integer, default=0)
+    completed_courses = Column(Integer, default=0)
+    certificates = Column(Integer, default=0)
+    quiz_attempts = Column(Integer, default=0)
+    quiz_score_total = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReportRun(Base):
+    __tablename__ = "report_run"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    report_type = Column(String(50), index=True)  # monthly
+    period = Column(String(20))  # YYYY-MM
+    status = Column(String(20), default="running")  # running, completed, failed
+    payment_rows = Column(Integer, default=0)
+    enrollment_rows = Column(Integer, default=0)
+    completion_rows = Column(Integer, default=0)
+    revenue_by_currency = Column(Text, nullable=True)  # JSON: {currency: amount}; amounts in different currencies don't add up
+    csv_path = Column(String(500), nullable=True)
+    json_path = Column(String(500), nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class QuizImportJob(Base):
+    __tablename__ = "quiz_import_job"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("course.id"))
+    quiz_id = Column(Integer, ForeignKey("quiz.id"), nullable=True)
+    created_by = Column(Integer, ForeignKey("user.id"))
+    format = Column(String(20))  # gift, qti
+    source_path = Column(String(500))
+    status = Column(String(20), default="pending")  # pending, running, completed, failed
+    imported_questions = Column(Integer, default=0)
+    imported_answers = Column(Integer, default=0)
+    skipped_questions = Column(Integer, default=0)
+    processed_items = Column(Integer, default=0)  # Resume cursor: parsed items already imported or skipped
+    error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+class CertificateBatchJob(Base):
+    __tablename__ = "certificate_batch_job"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("course.id"), index=True)
+    created_by = Column(Integer, ForeignKey("user.id"))
+    status = Column(String(20), default="pending")  # pending, running, completed, failed
+    total_eligible = Column(Integer, nullable=True)
+    issued = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    last_user_id = Column(Integer, default=0)  # Resume cursor: students are processed in user_id order
+    error = Column(Text, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
 
 class Notification(Base):
     __tablename__ = "notification"
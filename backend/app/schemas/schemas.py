@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime, timezone
 from enum import Enum
 
 
@@ -400,6 +400,53 @@ class LessonProgressResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class LessonProgressUpdate(BaseModel):
+    progress_percent: float = Field(..., ge=0, le=100)
+    completed: bool = False
+
+class ProgressSyncEvent(BaseModel):
+    lesson_id: int
+    progress: float = Field(..., ge=0, le=100)
+    completed: bool = False
+    client_timestamp: datetime
+    
+    @validator('client_timestamp')
+    def to_naive_utc(cls, v):
+        # Stored timestamps are naive UTC; mixing in aware ones breaks comparisons
+        if v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+class ProgressSyncRequest(BaseModel):
+    events: List[ProgressSyncEvent] = Field(default_factory=list, max_length=1000)
+    since: Optional[datetime] = None  # Watermark returned by the previous sync
+    
+    @validator('since')
+    def to_naive_utc(cls, v):
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+class ProgressSyncResult(BaseModel):
+    index: int
+    lesson_id: int
+    status: str  # applied, superseded, rejected
+    detail: Optional[str] = None
+
+class LessonProgressState(BaseModel):
+    lesson_id: int
+    progress_percent: float
+    completed: bool
+    last_accessed: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ProgressSyncResponse(BaseModel):
+    results: List[ProgressSyncResult]
+    watermark: datetime
+    changes: List[LessonProgressState]
+
 # Quiz Schemas
 class AnswerCreate(BaseModel):
     answer_text: str
@@ -448,6 +495,22 @@ class QuizResponse(QuizBase):
     class Config:
         from_attributes = True
 
+class QuizImportJobResponse(BaseModel):
+    id: int
+    course_id: int
+    quiz_id: Optional[int]
+    format: str
+    status: str
+    imported_questions: int
+    imported_answers: int
+    skipped_questions: int
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class QuestionResponseSubmit(BaseModel):
     question_id: int
     student_answer: str
@@ -497,7 +560,30 @@ class CertificateResponse(BaseModel):
     course_id: int
     certificate_number: str
     issue_date: datetime
-    pdf_url: str
+    status: str
+    pdf_url: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class CertificateVerificationResponse(BaseModel):
+    certificate_number: str
+    student_name: str
+    course_title: str
+    issue_date: datetime
+    valid: bool = True
+
+class CertificateBatchJobResponse(BaseModel):
+    id: int
+    course_id: int
+    status: str
+    total_eligible: Optional[int] = None
+    issued: int
+    failed: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -516,6 +602,7 @@ class InstructorDashboardStats(BaseModel):
     total_revenue: float
     avg_course_rating: float
     recent_enrollments: int
+    monthly_revenue: List[dict] = []
 
 class AdminDashboardStats(BaseModel):
     total_users: int
@@ -525,6 +612,50 @@ class AdminDashboardStats(BaseModel):
     monthly_revenue: List[dict]
     top_courses: List[dict]
 
+# Event Analytics Schemas
+class EventCountResponse(BaseModel):
+    event_type: Optional[str] = None
+    start: datetime
+    end: datetime
+    count: int
+
+class EventHistogramBucket(BaseModel):
+    start: datetime
+    count: int
+
+class EventHistogramResponse(BaseModel):
+    event_type: Optional[str] = None
+    bucket: str
+    buckets: List[EventHistogramBucket]
+
+class LessonFunnelStep(BaseModel):
+    lesson_id: int
+    title: str
+    position: int
+    started: int
+    completed: int
+    reached: int
+    stopped_after: int
+    drop_off_rate: float
+
+class CourseFunnelResponse(BaseModel):
+    course_id: int
+    enrolled: int
+    not_started: int
+    lessons: List[LessonFunnelStep]
+    generated_at: datetime
+
+class CohortRetentionRow(BaseModel):
+    week_start: date
+    size: int
+    retention: List[Optional[float]]
+
+class CourseRetentionResponse(BaseModel):
+    course_id: int
+    weeks: int
+    cohorts: List[CohortRetentionRow]
+    generated_at: datetime
+
 # Enrollment Schemas
 class EnrollmentRequest(BaseModel):
     course_id: int
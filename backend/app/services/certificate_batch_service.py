@@ -0,0 +1,183 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional
+from sqlalchemy import and_, exists, func, insert, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Certificate, CertificateBatchJob, Course, User, course_enrollment
+from app.services.certificate_service import CertificateGenerator, CertificateIssuer
+from app.services.dashboard_cache import DashboardCacheService
+from app.services.event_log import event_log
+from app.services.stats_service import StudentStatsService
+
+
+def _render_to_storage(payload: dict) -> tuple:
+    """Render one certificate and write it to storage (runs in a pool process)"""
+    try:
+        pdf_content = CertificateGenerator.generate_certificate(
+            student_name=payload["student_name"],
+            course_name=payload["course_name"],
+            certificate_number=payload["certificate_number"],
+            instructor_name=payload["instructor_name"],
+            issue_date=payload["issue_date"]
+        )
+        path, content_hash = CertificateIssuer.store_pdf(payload["certificate_number"], pdf_content)
+        return payload["user_id"], (path, content_hash), None
+    except Exception as e:
+        return payload["user_id"], None, str(e)
+
+
+class CertificateBatchService:
+    """Issues certificates to every eligible student of a course in resumable chunks"""
+
+    @staticmethod
+    def eligible_students(course_id: int, after_user_id: int = 0, limit: Optional[int] = None):
+        """Students who completed the course and have no certificate for it, in user_id order"""
+        query = select(User.id, User.full_name).join(
+            course_enrollment, course_enrollment.c.user_id == User.id
+        ).where(
+            course_enrollment.c.course_id == course_id,
+            course_enrollment.c.completed_at.isnot(None),
+            User.id > after_user_id,
+            ~exists().where(and_(Certificate.user_id == User.id, Certificate.course_id == course_id))
+        ).order_by(User.id)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def certificate_number(job_id: int, course_id: int, user_id: int) -> str:
+        """Deterministic per job and student, so a resumed chunk overwrites rather than orphans PDFs"""
+        # Keyed so numbers cannot be enumerated from the (small, sequential) ids
+        digest = hmac.new(settings.SECRET_KEY.encode(), f"{job_id}:{course_id}:{user_id}".encode(), hashlib.sha256).hexdigest()[:8].upper()
+        return f"CERT-{course_id}-{user_id}-{digest}"
+
+    @staticmethod
+    def _executor(workers: int):
+        # Daemonic processes (e.g. Celery prefork children) cannot start a process pool
+        if multiprocessing.current_process().daemon or workers <= 1:
+            return None
+        return ProcessPoolExecutor(max_workers=workers)
+
+    @staticmethod
+    def run(db: Session, job_id: int, chunk_size: int = None, workers: int = None, on_chunk: Callable[[List[int]], None] = None) -> Optional[CertificateBatchJob]:
+        """
+        Process a batch job from its cursor: render each chunk across the pool, insert the
+        certificate rows and advance the cursor in one transaction, then hand the chunk's
+        certificate ids to on_chunk (used to enqueue emails).
+        """
+        job = db.query(CertificateBatchJob).filter(CertificateBatchJob.id == job_id).first()
+        if not job or job.status == "completed":
+            return job
+
+        chunk_size = chunk_size or settings.CERTIFICATE_BATCH_CHUNK_SIZE
+        workers = workers or settings.CERTIFICATE_BATCH_WORKERS or os.cpu_count() or 1
+
+        course = db.query(Course).filter(Course.id == job.course_id).first()
+        instructor = db.query(User).filter(User.id == course.instructor_id).first() if course else None
+        instructor_name = instructor.full_name if instructor else "Course Instructor"
+
+        job.status = "running"
+        job.error = None
+        job.heartbeat_at = datetime.utcnow()
+        if job.total_eligible is None:
+            job.total_eligible = db.execute(
+                select(func.count()).select_from(
+                    CertificateBatchService.eligible_students(job.course_id).subquery()
+                )
+            ).scalar()
+        db.commit()
+
+        executor = CertificateBatchService._executor(workers)
+        try:
+            while True:
+                students = db.execute(
+                    CertificateBatchService.eligible_students(job.course_id, job.last_user_id, chunk_size)
+                ).all()
+                if not students:
+                    break
+
+                issue_date = datetime.utcnow()
+                payloads = [
+                    {
+                        "user_id": user_id,
+                        "student_name": full_name,
+                        "course_name": course.title,
+                        "certificate_number": CertificateBatchService.certificate_number(job.id, job.course_id, user_id),
+                        "instructor_name": instructor_name,
+                        "issue_date": issue_date,
+                    }
+                    for user_id, full_name in students
+                ]
+                if executor:
+                    results = list(executor.map(_render_to_storage, payloads, chunksize=max(1, len(payloads) // (workers * 4))))
+                else:
+                    results = [_render_to_storage(payload) for payload in payloads]
+
+                numbers = {payload["user_id"]: payload["certificate_number"] for payload in payloads}
+                rendered = [(user_id, stored) for user_id, stored, error in results if not error]
+                errors = [error for _, _, error in results if error]
+
+                if rendered:
+                    certificate_ids = db.execute(
+                        insert(Certificate).returning(Certificate.id, sort_by_parameter_order=True),
+                        [
+                            {
+                                "user_id": user_id,
+                                "course_id": job.course_id,
+                                "certificate_number": numbers[user_id],
+                                "issue_date": issue_date,
+                                "status": "ready",
+                                "pdf_url": f"/api/v1/certificates/download/{numbers[user_id]}",
+                                "pdf_path": stored[0],
+                                "content_hash": stored[1],
+                                "rendered_at": issue_date,
+                                "created_at": issue_date,
+                            }
+                            for user_id, stored in rendered
+                        ]
+                    ).scalars().all()
+                    StudentStatsService.adjust_many(db, {user_id: {"certificates": 1} for user_id, _ in rendered})
+                    for (user_id, _), certificate_id in zip(rendered, certificate_ids):
+                        event_log.record_after_commit(db, "certificate", user_id, job.course_id, subject_id=certificate_id)
+                        DashboardCacheService.certificate_issued(db, user_id)
+                else:
+                    certificate_ids = []
+
+                job.issued += len(rendered)
+                job.failed += len(errors)
+                if errors:
+                    job.error = errors[-1][:2000]
+                job.last_user_id = students[-1][0]
+                job.heartbeat_at = datetime.utcnow()
+                db.commit()
+
+                if on_chunk and certificate_ids:
+                    on_chunk(certificate_ids)
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)[:2000]
+            db.commit()
+            raise
+        finally:
+            if executor:
+                executor.shutdown()
+
+        job.status = "completed"
+        job.completed_at = datetime.utcnow()
+        db.commit()
+        return job
+
+    @staticmethod
+    def is_stale(job: CertificateBatchJob) -> bool:
+        """A pending or running job whose worker stopped reporting progress"""
+        if job.status not in ("pending", "running"):
+            return False
+        if not job.heartbeat_at:
+            return True
+        return (datetime.utcnow() - job.heartbeat_at).total_seconds() > settings.CERTIFICATE_BATCH_STALE_SECONDS
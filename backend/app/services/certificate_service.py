@@ -4,14 +4,142 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.lib import colors
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
 from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Certificate, Course, User
+import hashlib
 import io
+import os
 from pathlib import Path
 
+class CompiledCertificateTemplate:
+    """
+    Certificate layout resolved once: fonts, colours, positions and the wrapped fixed
+    text are computed up front. Each PDF draws the static layer into a page form and
+    only the student name, course, number, date and instructor are laid out per certificate.
+    ReportLab forms belong to one document, so the form is re-emitted (not re-laid-out) per PDF.
+    """
+    
+    PRIMARY = colors.HexColor('#1a5490')
+    HEADING = colors.HexColor('#333333')
+    BODY = colors.HexColor('#555555')
+    ACCENT = colors.HexColor('#c9a227')
+    
+    def __init__(self, pagesize=A4):
+        self.pagesize = pagesize
+        self.width, self.height = pagesize
+        self.margin = 0.5 * inch
+        self.text_width = self.width - 2 * self.margin - 0.5 * inch
+        self.center = self.width / 2
+        
+        # Fixed text is wrapped once
+        self.title_lines = simpleSplit("CERTIFICATE OF COMPLETION", "Helvetica-Bold", 40, self.text_width)
+        title_top = self.height - 2.1 * inch
+        self.title_positions = [title_top - i * 48 for i in range(len(self.title_lines))]
+        below_title = self.title_positions[-1]
+        
+        self.rule_y = below_title - 0.45 * inch
+        self.certify_y = self.rule_y - 0.6 * inch
+        self.name_y = self.certify_y - 0.65 * inch
+        self.completed_y = self.name_y - 0.55 * inch
+        self.course_y = self.completed_y - 0.35 * inch
+        self.details_y = 3.3 * inch
+        self.signature_y = 2.0 * inch
+        self.signature_width = 3 * inch
+        
+        self._static_ops = [
+            ("setStrokeColor", (self.PRIMARY,)),
+            ("setLineWidth", (4,)),
+            ("rect", (self.margin, self.margin, self.width - 2 * self.margin, self.height - 2 * self.margin)),
+            ("setStrokeColor", (self.ACCENT,)),
+            ("setLineWidth", (1,)),
+            ("rect", (self.margin + 8, self.margin + 8, self.width - 2 * self.margin - 16, self.height - 2 * self.margin - 16)),
+            ("setFillColor", (self.PRIMARY,)),
+            ("setFont", ("Helvetica-Bold", 40)),
+        ]
+        self._static_ops += [("drawCentredString", (self.center, y, line)) for line, y in zip(self.title_lines, self.title_positions)]
+        self._static_ops += [
+            ("setStrokeColor", (self.HEADING,)),
+            ("line", (self.center - 2.5 * inch, self.rule_y, self.center + 2.5 * inch, self.rule_y)),
+            ("setFillColor", (self.BODY,)),
+            ("setFont", ("Helvetica", 12)),
+            ("drawCentredString", (self.center, self.certify_y, "This is to certify that")),
+            ("drawCentredString", (self.center, self.completed_y, "has successfully completed the course")),
+            ("setStrokeColor", (self.BODY,)),
+            ("line", (self.center - self.signature_width / 2, self.signature_y, self.center + self.signature_width / 2, self.signature_y)),
+            ("setFont", ("Helvetica", 10)),
+            ("drawCentredString", (self.center, self.signature_y - 30, "Instructor")),
+        ]
+    
+    def _fit_font_size(self, text: str, font: str, size: float, minimum: float) -> float:
+        """Shrink a single-line field until it fits the text width"""
+        width = stringWidth(text, font, size)
+        if width <= self.text_width:
+            return size
+        return max(minimum, size * self.text_width / width)
+    
+    def render(self, student_name: str, course_name: str, certificate_number: str, instructor_name: str, issue_date: datetime = None) -> bytes:
+        pdf_buffer = io.BytesIO()
+        pdf = canvas.Canvas(pdf_buffer, pagesize=self.pagesize, pageCompression=1)
+        pdf.setTitle(f"Certificate {certificate_number}")
+        
+        pdf.beginForm("certificate_static")
+        for op, args in self._static_ops:
+            getattr(pdf, op)(*args)
+        pdf.endForm()
+        pdf.doForm("certificate_static")
+        
+        # Per-certificate fields
+        pdf.setFillColor(self.PRIMARY)
+        name_size = self._fit_font_size(student_name, "Helvetica-Bold", 24, 12)
+        pdf.setFont("Helvetica-Bold", name_size)
+        pdf.drawCentredString(self.center, self.name_y, student_name)
+        
+        pdf.setFillColor(self.HEADING)
+        pdf.setFont("Helvetica-Bold", 14)
+        for i, line in enumerate(simpleSplit(course_name, "Helvetica-Bold", 14, self.text_width)[:3]):
+            pdf.drawCentredString(self.center, self.course_y - i * 18, line)
+        
+        date_str = (issue_date or datetime.now()).strftime("%B %d, %Y")
+        pdf.setFillColor(self.BODY)
+        pdf.setFont("Helvetica", 12)
+        pdf.drawCentredString(self.center, self.details_y, f"Certificate Number: {certificate_number}")
+        pdf.drawCentredString(self.center, self.details_y - 18, f"Date: {date_str}")
+        
+        pdf.setFont("Helvetica", 10)
+        pdf.drawCentredString(self.center, self.signature_y - 16, instructor_name)
+        
+        pdf.showPage()
+        pdf.save()
+        return pdf_buffer.getvalue()
+
+
+_compiled_template = None
+
+def get_compiled_template() -> CompiledCertificateTemplate:
+    """The process-wide compiled certificate template, built on first use"""
+    global _compiled_template
+    if _compiled_template is None:
+        _compiled_template = CompiledCertificateTemplate()
+    return _compiled_template
+
+
 class CertificateGenerator:
     @staticmethod
-    def generate_certificate(student_name: str, course_name: str, certificate_number: str, instructor_name: str) -> bytes:
-        """Generate PDF certificate"""
+    def generate_certificate(student_name: str, course_name: str, certificate_number: str, instructor_name: str, issue_date: datetime = None) -> bytes:
+        """Generate PDF certificate with the configured renderer (compiled or platypus)"""
+        if settings.CERTIFICATE_RENDERER == "compiled":
+            return get_compiled_template().render(student_name, course_name, certificate_number, instructor_name, issue_date)
+        return CertificateGenerator.generate_certificate_platypus(student_name, course_name, certificate_number, instructor_name, issue_date)
+    
+    @staticmethod
+    def generate_certificate_platypus(student_name: str, course_name: str, certificate_number: str, instructor_name: str, issue_date: datetime = None) -> bytes:
+        """Generate PDF certificate by building a platypus story"""
         # Create a BytesIO object to store the PDF in memory
         pdf_buffer = io.BytesIO()
         
@@ -84,7 +212,7 @@ class CertificateGenerator:
         elements.append(Spacer(1, 0.3*inch))
         
         # Certificate details
-        date_str = datetime.now().strftime("%B %d, %Y")
+        date_str = (issue_date or datetime.now()).strftime("%B %d, %Y")
         details_text = f"Certificate Number: {certificate_number}<br/>Date: {date_str}"
         elements.append(Paragraph(details_text, body_style))
         
@@ -109,3 +237,64 @@ class CertificateGenerator:
         # Get PDF bytes
         pdf_buffer.seek(0)
         return pdf_buffer.getvalue()
+
+
+class CertificateIssuer:
+    """Renders pending certificates and stores their PDFs"""
+    
+    @staticmethod
+    def store_pdf(certificate_number: str, pdf_content: bytes) -> tuple:
+        """Write a certificate PDF to storage atomically and return (path, sha256 hex)"""
+        os.makedirs(settings.CERTIFICATE_DIR, exist_ok=True)
+        path = os.path.join(settings.CERTIFICATE_DIR, f"{certificate_number}.pdf")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_content)
+        os.replace(tmp_path, path)
+        return path, hashlib.sha256(pdf_content).hexdigest()
+    
+    @staticmethod
+    def file_hash(path: str, chunk_size: int = 65536) -> str:
+        """SHA-256 of a stored PDF, for certificates stored before hashes were recorded"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def render(db: Session, certificate_id: int) -> Optional[tuple]:
+        """
+        Render and store a pending certificate, marking it ready.
+        Returns (certificate, pdf_content), or None if it no longer needs rendering.
+        """
+        certificate = db.query(Certificate).filter(Certificate.id == certificate_id).first()
+        if not certificate or certificate.status == "ready":
+            return None
+        
+        user = db.query(User).filter(User.id == certificate.user_id).first()
+        course = db.query(Course).filter(Course.id == certificate.course_id).first()
+        instructor = db.query(User).filter(User.id == course.instructor_id).first() if course else None
+        
+        try:
+            pdf_content = CertificateGenerator.generate_certificate(
+                student_name=user.full_name,
+                course_name=course.title,
+                certificate_number=certificate.certificate_number,
+                instructor_name=instructor.full_name if instructor else "Course Instructor",
+                issue_date=certificate.issue_date
+            )
+            certificate.pdf_path, certificate.content_hash = CertificateIssuer.store_pdf(certificate.certificate_number, pdf_content)
+        except Exception as e:
+            certificate.status = "failed"
+            certificate.error = str(e)[:2000]
+            db.commit()
+            raise
+        
+        certificate.status = "ready"
+        certificate.error = None
+        certificate.pdf_url = f"/api/v1/certificates/download/{certificate.certificate_number}"
+        certificate.rendered_at = datetime.utcnow()
+        db.commit()
+        
+        return certificate, pdf_content
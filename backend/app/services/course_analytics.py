@@ -0,0 +1,204 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.cache import StaleWhileRevalidateCache, invalidate_after_commit
+from app.core.config import settings
+from app.models.models import Lesson, LessonProgress, course_enrollment
+
+analytics_cache = StaleWhileRevalidateCache(
+    fresh_for={"funnel": settings.ANALYTICS_CACHE_FRESH_SECONDS, "retention": settings.ANALYTICS_CACHE_FRESH_SECONDS},
+    max_stale=settings.ANALYTICS_CACHE_MAX_STALE_SECONDS,
+    max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES
+)
+
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+_WEEK_SHIFT_DAYS = 3
+
+
+def _load_columns(db: Session, stmt, dtypes: Dict[str, str], chunk_size: int) -> Dict[str, np.ndarray]:
+    """Stream a query into one NumPy array per column, chunk by chunk"""
+    chunks = {name: [] for name in dtypes}
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        for (name, dtype), values in zip(dtypes.items(), zip(*partition)):
+            chunks[name].append(np.array(values, dtype=dtype))
+    return {
+        name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+        for name, dtype in dtypes.items()
+    }
+
+
+def _week_index(days: np.ndarray) -> np.ndarray:
+    """Monday-based week number for day numbers since the epoch"""
+    return (days + _WEEK_SHIFT_DAYS) // 7
+
+
+def _week_start(week: int) -> date:
+    return date(1970, 1, 1) + timedelta(days=int(week) * 7 - _WEEK_SHIFT_DAYS)
+
+
+class CourseAnalyticsService:
+    """Lesson drop-off funnels and weekly cohort retention for a course"""
+
+    @staticmethod
+    def lesson_funnel(db: Session, course_id: int, chunk_size: int = None) -> dict:
+        """
+        Per-lesson funnel over enrolled students, in lesson order: how many started and
+        completed each lesson, and how many stopped after it (furthest lesson completed).
+        """
+        chunk_size = chunk_size or settings.ANALYTICS_CHUNK_SIZE
+        lessons = db.query(Lesson.id, Lesson.title).filter(
+            Lesson.course_id == course_id
+        ).order_by(Lesson.order, Lesson.id).all()
+
+        enrolled = _load_columns(
+            db,
+            select(course_enrollment.c.user_id).where(course_enrollment.c.course_id == course_id).order_by(course_enrollment.c.user_id),
+            {"user_id": "int64"},
+            chunk_size
+        )["user_id"]
+
+        progress = _load_columns(
+            db,
+            select(
+                LessonProgress.user_id, LessonProgress.lesson_id,
+                LessonProgress.completed, LessonProgress.progress_percent
+            ).join(Lesson, Lesson.id == LessonProgress.lesson_id).join(
+                course_enrollment,
+                (course_enrollment.c.user_id == LessonProgress.user_id) & (course_enrollment.c.course_id == Lesson.course_id)
+            ).where(Lesson.course_id == course_id),
+            {"user_id": "int64", "lesson_id": "int64", "completed": "bool", "progress": "float64"},
+            chunk_size
+        )
+
+        lesson_count = len(lessons)
+        lesson_ids = np.array([lesson_id for lesson_id, _ in lessons], dtype="int64")
+        order = np.argsort(lesson_ids)
+        # Map each progress row to its lesson's position in the course and its student's index
+        position = order[np.searchsorted(lesson_ids, progress["lesson_id"], sorter=order)] if lesson_count else np.empty(0, dtype="int64")
+        student = np.searchsorted(enrolled, progress["user_id"])
+
+        touched = progress["completed"] | (progress["progress"] > 0)
+        started = np.bincount(position[touched], minlength=lesson_count)
+        completed = np.bincount(position[progress["completed"]], minlength=lesson_count)
+
+        furthest = np.full(len(enrolled), -1, dtype="int64")
+        np.maximum.at(furthest, student[progress["completed"]], position[progress["completed"]])
+        # stopped[k + 1] = students whose furthest completed lesson is k; stopped[0] = none completed
+        stopped = np.bincount(furthest + 1, minlength=lesson_count + 1)
+        reached = stopped[::-1].cumsum()[::-1][1:]  # students who completed lesson k or a later one
+        previous = np.concatenate(([len(enrolled)], reached[:-1]))
+
+        steps = []
+        for k, (lesson_id, title) in enumerate(lessons):
+            steps.append({
+                "lesson_id": lesson_id,
+                "title": title,
+                "position": k + 1,
+                "started": int(started[k]),
+                "completed": int(completed[k]),
+                "reached": int(reached[k]),
+                "stopped_after": int(stopped[k + 1]) if k < lesson_count - 1 else 0,
+                "drop_off_rate": round(1 - reached[k] / previous[k], 4) if previous[k] else 0.0,
+            })
+
+        return {
+            "course_id": course_id,
+            "enrolled": int(len(enrolled)),
+            "not_started": int(stopped[0]),
+            "lessons": steps,
+            "generated_at": datetime.utcnow(),
+        }
+
+    @staticmethod
+    def cohort_retention(db: Session, course_id: int, weeks: int = None, chunk_size: int = None) -> dict:
+        """
+        Weekly cohorts by enrollment date. Cell [c][w] is the share of cohort c still active
+        w or more weeks after enrolling, using each student's latest lesson activity.
+        Cells the cohort has not lived long enough to observe are None.
+        """
+        weeks = weeks or settings.ANALYTICS_RETENTION_WEEKS
+        chunk_size = chunk_size or settings.ANALYTICS_CHUNK_SIZE
+
+        enrollments = _load_columns(
+            db,
+            select(course_enrollment.c.user_id, course_enrollment.c.enrolled_at).where(
+                course_enrollment.c.course_id == course_id
+            ).order_by(course_enrollment.c.user_id),
+            {"user_id": "int64", "enrolled_at": "datetime64[s]"},
+            chunk_size
+        )
+        activity = _load_columns(
+            db,
+            select(LessonProgress.user_id, LessonProgress.last_accessed).join(
+                Lesson, Lesson.id == LessonProgress.lesson_id
+            ).join(
+                course_enrollment,
+                (course_enrollment.c.user_id == LessonProgress.user_id) & (course_enrollment.c.course_id == Lesson.course_id)
+            ).where(Lesson.course_id == course_id),
+            {"user_id": "int64", "last_accessed": "datetime64[s]"},
+            chunk_size
+        )
+
+        current_week = int(_week_index(np.datetime64(datetime.utcnow(), "D").astype("int64")))
+        first_week = current_week - weeks + 1
+
+        enrolled_at = enrollments["enrolled_at"]
+        valid = ~np.isnat(enrolled_at)
+        enrolled_days = enrolled_at.astype("datetime64[D]").astype("int64")
+        cohort = _week_index(enrolled_days) - first_week
+
+        # Latest activity per student, as whole weeks since they enrolled (-1 = never active)
+        student = np.searchsorted(enrollments["user_id"], activity["user_id"])
+        active = ~np.isnat(activity["last_accessed"])
+        last_day = np.full(len(enrolled_days), -1, dtype="int64")
+        np.maximum.at(last_day, student[active], activity["last_accessed"][active].astype("datetime64[D]").astype("int64"))
+        offset = np.where(last_day < 0, -1, np.clip((last_day - enrolled_days) // 7, 0, weeks - 1))
+
+        in_window = valid & (cohort >= 0) & (cohort < weeks)
+        # counts[c, o + 1] = students in cohort c whose latest activity is o weeks after enrolling
+        counts = np.zeros((weeks, weeks + 1), dtype="int64")
+        np.add.at(counts, (cohort[in_window], offset[in_window] + 1), 1)
+        sizes = counts.sum(axis=1)
+        retained = counts[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+
+        cohorts = []
+        for c in range(weeks):
+            if not sizes[c]:
+                continue
+            age = weeks - 1 - c
+            cohorts.append({
+                "week_start": _week_start(first_week + c),
+                "size": int(sizes[c]),
+                "retention": [round(retained[c, w] / sizes[c], 4) if w <= age else None for w in range(weeks)],
+            })
+
+        return {
+            "course_id": course_id,
+            "weeks": weeks,
+            "cohorts": cohorts,
+            "generated_at": datetime.utcnow(),
+        }
+
+    @staticmethod
+    def narrow_retention(retention: dict, weeks: int) -> dict:
+        """Restrict a retention matrix to its most recent `weeks` cohorts and weeks"""
+        if weeks >= retention["weeks"]:
+            return retention
+        today = datetime.utcnow().date()
+        first_week_start = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+        cohorts = [
+            {**cohort, "retention": cohort["retention"][:weeks]}
+            for cohort in retention["cohorts"]
+            if cohort["week_start"] >= first_week_start
+        ]
+        return {**retention, "weeks": weeks, "cohorts": cohorts}
+
+    @staticmethod
+    def progress_changed(db: Session, course_ids: Iterable[int]) -> None:
+        """Invalidate cached analytics for courses whose progress or enrollments changed"""
+        for course_id in set(course_ids):
+            invalidate_after_commit(db, analytics_cache, "funnel", course_id)
+            invalidate_after_commit(db, analytics_cache, "retention", course_id)
@@ -0,0 +1,29 @@
+from sqlalchemy.orm import Session
+from app.core.cache import SharedGenerations, StaleWhileRevalidateCache, invalidate_after_commit
+from app.core.config import settings
+from app.models.models import Course, Payment
+
+dashboard_cache = StaleWhileRevalidateCache(
+    fresh_for=settings.DASHBOARD_CACHE_FRESH_SECONDS,
+    max_stale=settings.DASHBOARD_CACHE_MAX_STALE_SECONDS,
+    max_entries=settings.DASHBOARD_CACHE_MAX_ENTRIES,
+    # API and Celery workers each hold a copy; invalidations must reach all of them
+    generations=SharedGenerations(settings.REDIS_URL, prefix="dashboard_cache")
+)
+
+
+class DashboardCacheService:
+    """Invalidation hooks for cached dashboards, applied when the session commits"""
+
+    @staticmethod
+    def payment_completed(db: Session, payment: Payment) -> None:
+        """A completed payment changes the student's, the instructor's and the admin dashboards"""
+        instructor_id = db.query(Course.instructor_id).filter(Course.id == payment.course_id).scalar()
+        invalidate_after_commit(db, dashboard_cache, "student", payment.user_id)
+        invalidate_after_commit(db, dashboard_cache, "instructor", instructor_id)
+        invalidate_after_commit(db, dashboard_cache, "admin")
+
+    @staticmethod
+    def certificate_issued(db: Session, user_id: int) -> None:
+        """An issued certificate changes the student's dashboard"""
+        invalidate_after_commit(db, dashboard_cache, "student", user_id)
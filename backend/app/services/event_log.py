@@ -0,0 +1,270 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+EVENT_TYPES = {
+    "enrollment": 1,
+    "lesson_progress": 2,
+    "quiz_attempt": 3,
+    "payment": 4,
+    "certificate": 5,
+}
+
+# Column name -> dtype; every segment stores one .npy file per column, sorted by ts
+COLUMNS = {
+    "ts": np.int64,          # epoch milliseconds (UTC)
+    "event_type": np.uint8,
+    "user_id": np.int64,
+    "course_id": np.int64,
+    "subject_id": np.int64,  # lesson, quiz, payment or certificate id
+    "value": np.float64,     # progress percent, score or amount
+}
+
+_PENDING_KEY = "event_log_pending"
+
+# Written into a compacted segment: the names of the segments it replaces, which
+# readers skip until compaction has deleted them
+REPLACES_FILE = "replaces.txt"
+
+
+def to_millis(value: datetime) -> int:
+    """Epoch milliseconds for a naive UTC (or aware) datetime"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class EventLog:
+    """
+    Append-only learning event log stored outside the main database.
+    Events are buffered in memory and flushed into immutable columnar segments
+    (one NumPy array per column) partitioned by UTC day. Reads memory-map the
+    segments that overlap the requested time range.
+    """
+
+    def __init__(self, directory: str = None, flush_interval: float = None, max_pending: int = None):
+        self.directory = directory or settings.EVENT_LOG_DIR
+        self.flush_interval = flush_interval or settings.EVENT_LOG_FLUSH_INTERVAL_SECONDS
+        self.max_pending = max_pending or settings.EVENT_LOG_MAX_PENDING
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Writing
+
+    def record(self, event_type: str, user_id: int, course_id: int, subject_id: int = 0, value: float = 0.0, ts: datetime = None) -> None:
+        """Buffer one event"""
+        millis = to_millis(ts) if ts else int(time.time() * 1000)
+        row = (millis, EVENT_TYPES[event_type], user_id or 0, course_id or 0, subject_id or 0, float(value or 0.0))
+        with self._lock:
+            self._pending.append(row)
+            pending = len(self._pending)
+
+        if pending >= self.max_pending:
+            self.flush()
+
+    def record_after_commit(self, db: Session, event_type: str, user_id: int, course_id: int, subject_id: int = 0, value: float = 0.0) -> None:
+        """Buffer an event once the session commits; dropped if it rolls back"""
+        ts = datetime.utcnow()
+        db.info.setdefault(_PENDING_KEY, []).append((event_type, user_id, course_id, subject_id, value, ts))
+
+    def flush(self) -> int:
+        """Write buffered events as one segment per day partition"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+
+        if not rows:
+            return 0
+
+        with self._write_lock:
+            data = np.array(rows, dtype=[(name, dtype) for name, dtype in COLUMNS.items()])
+            data.sort(order="ts")
+            days = data["ts"] // 86400000
+            for day in np.unique(days):
+                self._write_segment(self._partition_dir(int(day)), data[days == day])
+
+        return len(rows)
+
+    def _partition_dir(self, epoch_day: int) -> str:
+        day = datetime(1970, 1, 1) + timedelta(days=epoch_day)
+        return os.path.join(self.directory, day.strftime("%Y-%m-%d"))
+
+    def _write_segment(self, partition: str, data: np.ndarray, replaces: List[str] = ()) -> str:
+        os.makedirs(partition, exist_ok=True)
+        # Segment names carry their time range so readers can skip them without opening
+        name = f"{int(data['ts'][0])}-{int(data['ts'][-1])}-{uuid.uuid4().hex[:12]}"
+        tmp_path = os.path.join(partition, f".tmp-{name}")
+        os.makedirs(tmp_path)
+        for column in COLUMNS:
+            np.save(os.path.join(tmp_path, f"{column}.npy"), np.ascontiguousarray(data[column]))
+        if replaces:
+            with open(os.path.join(tmp_path, REPLACES_FILE), "w") as f:
+                f.write("\n".join(replaces))
+        path = os.path.join(partition, name)
+        os.rename(tmp_path, path)
+        return path
+
+    def compact_partition(self, day: datetime) -> dict:
+        """
+        Merge a closed day's segments into a single segment. The merged segment is
+        published in the live partition, hiding the segments it lists as replaced, and
+        only those are deleted; segments flushed meanwhile are left alone.
+        """
+        partition = os.path.join(self.directory, day.strftime("%Y-%m-%d"))
+        segments, replaced = self._listing(partition)
+        # Left behind by a compaction that stopped before deleting them
+        for path in replaced:
+            shutil.rmtree(path, ignore_errors=True)
+        if len(segments) <= 1:
+            return {"partition": os.path.basename(partition), "segments": len(segments)}
+
+        merged = np.concatenate([self._load(path, mmap=False) for path, _, _ in segments])
+        merged.sort(order="ts", kind="stable")
+
+        self._write_segment(partition, merged, replaces=[os.path.basename(path) for path, _, _ in segments])
+        for path, _, _ in segments:
+            shutil.rmtree(path, ignore_errors=True)
+        return {"partition": os.path.basename(partition), "segments": len(segments), "rows": int(len(merged))}
+
+    # Reading
+
+    @staticmethod
+    def _listing(partition: str) -> tuple:
+        """(live segments as (path, first ts, last ts), paths of replaced segments not yet deleted)"""
+        if not os.path.isdir(partition):
+            return [], []
+        names = [name for name in os.listdir(partition) if not name.startswith(".")]
+        replaced = set()
+        for name in names:
+            manifest = os.path.join(partition, name, REPLACES_FILE)
+            if os.path.exists(manifest):
+                with open(manifest) as f:
+                    replaced.update(f.read().split())
+
+        segments = []
+        for name in names:
+            if name in replaced:
+                continue
+            first, last, _ = name.split("-", 2)
+            segments.append((os.path.join(partition, name), int(first), int(last)))
+        return segments, [os.path.join(partition, name) for name in names if name in replaced]
+
+    @staticmethod
+    def _segments(partition: str) -> List[tuple]:
+        return EventLog._listing(partition)[0]
+
+    @staticmethod
+    def _load(path: str, mmap: bool = True) -> np.ndarray:
+        columns = {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r" if mmap else None) for column in COLUMNS}
+        data = np.empty(len(columns["ts"]), dtype=[(name, dtype) for name, dtype in COLUMNS.items()])
+        for column, values in columns.items():
+            data[column] = values
+        return data
+
+    def _scan(self, start_ms: int, end_ms: int, filters: Dict[str, int]):
+        """Yield the ts column of matching events per segment, including unflushed events"""
+        day = start_ms // 86400000
+        while day * 86400000 < end_ms:
+            for path, first, last in self._segments(self._partition_dir(day)):
+                if last < start_ms or first >= end_ms:
+                    continue
+                ts = np.load(os.path.join(path, "ts.npy"), mmap_mode="r")
+                lo, hi = np.searchsorted(ts, [start_ms, end_ms])
+                if lo == hi:
+                    continue
+                mask = np.ones(hi - lo, dtype=bool)
+                for column, wanted in filters.items():
+                    values = np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                    mask &= values[lo:hi] == wanted
+                yield np.asarray(ts[lo:hi])[mask]
+            day += 1
+
+        with self._lock:
+            pending = list(self._pending)
+        if pending:
+            data = np.array(pending, dtype=[(name, dtype) for name, dtype in COLUMNS.items()])
+            mask = (data["ts"] >= start_ms) & (data["ts"] < end_ms)
+            for column, wanted in filters.items():
+                mask &= data[column] == wanted
+            yield data["ts"][mask]
+
+    @staticmethod
+    def _filters(event_type: Optional[str], course_id: Optional[int], user_id: Optional[int]) -> Dict[str, int]:
+        filters = {}
+        if event_type is not None:
+            filters["event_type"] = EVENT_TYPES[event_type]
+        if course_id is not None:
+            filters["course_id"] = course_id
+        if user_id is not None:
+            filters["user_id"] = user_id
+        return filters
+
+    def count(self, start: datetime, end: datetime, event_type: str = None, course_id: int = None, user_id: int = None) -> int:
+        """Number of events in [start, end)"""
+        filters = self._filters(event_type, course_id, user_id)
+        return int(sum(len(ts) for ts in self._scan(to_millis(start), to_millis(end), filters)))
+
+    def histogram(self, start: datetime, end: datetime, bucket_seconds: int = 3600, event_type: str = None, course_id: int = None, user_id: int = None) -> List[dict]:
+        """Event counts per fixed-width bucket in [start, end)"""
+        start_ms, end_ms = to_millis(start), to_millis(end)
+        bucket_ms = bucket_seconds * 1000
+        buckets = max(0, -(-(end_ms - start_ms) // bucket_ms))
+        counts = np.zeros(buckets, dtype=np.int64)
+
+        filters = self._filters(event_type, course_id, user_id)
+        for ts in self._scan(start_ms, end_ms, filters):
+            counts += np.bincount((ts - start_ms) // bucket_ms, minlength=buckets)[:buckets]
+
+        return [
+            {"start": start + timedelta(seconds=i * bucket_seconds), "count": int(count)}
+            for i, count in enumerate(counts)
+        ]
+
+    # Lifecycle
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing event log: {e}")
+
+    def start(self) -> None:
+        """Start the background flusher"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-log-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background flusher and write whatever is still buffered"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+
+event_log = EventLog()
+
+
+@event.listens_for(Session, "after_commit")
+def _record_committed_events(session: Session) -> None:
+    for event_type, user_id, course_id, subject_id, value, ts in session.info.pop(_PENDING_KEY, ()):
+        event_log.record(event_type, user_id, course_id, subject_id, value, ts=ts)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
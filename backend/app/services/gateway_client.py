@@ -0,0 +1,216 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+import httpx
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError, DeadlineExceeded, CLOSED, HALF_OPEN, OPEN
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+metrics.counter("gateway_requests_total", "Payment gateway requests by gateway and outcome")
+metrics.counter("gateway_connections_total", "Payment gateway requests by whether a pooled connection was reused")
+metrics.counter("gateway_rejections_total", "Payment gateway calls not made because the circuit was open or the deadline had passed")
+metrics.histogram("gateway_request_seconds", "Payment gateway request latency")
+
+
+class GatewayClient:
+    """
+    Long-lived, connection-pooled HTTP clients for one payment gateway. The sync client
+    is shared by threads in a process; the async client is bound to the event loop that
+    first used it. Both are recreated after a fork so pooled sockets are never shared.
+    """
+
+    def __init__(self, name: str, base_url: str, secret_key: str):
+        self.name = name
+        self.base_url = base_url
+        self.secret_key = secret_key
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_pid = None
+        self._async_client = None
+        self._async_loop = None
+        self.breaker = CircuitBreaker(
+            name,
+            window_seconds=settings.GATEWAY_BREAKER_WINDOW_SECONDS,
+            min_calls=settings.GATEWAY_BREAKER_MIN_CALLS,
+            failure_ratio=settings.GATEWAY_BREAKER_FAILURE_RATIO,
+            slow_call_seconds=settings.GATEWAY_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_ratio=settings.GATEWAY_BREAKER_SLOW_CALL_RATIO,
+            open_seconds=settings.GATEWAY_BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.GATEWAY_BREAKER_HALF_OPEN_CALLS
+        )
+
+    def _options(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "headers": {"Authorization": f"Bearer {self.secret_key}"},
+            "timeout": httpx.Timeout(
+                settings.GATEWAY_READ_TIMEOUT_SECONDS,
+                connect=settings.GATEWAY_CONNECT_TIMEOUT_SECONDS,
+                pool=settings.GATEWAY_POOL_TIMEOUT_SECONDS
+            ),
+            "limits": httpx.Limits(
+                max_connections=settings.GATEWAY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GATEWAY_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GATEWAY_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            "http2": HTTP2_AVAILABLE,
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        pid = os.getpid()
+        if self._client is None or self._client_pid != pid:
+            with self._lock:
+                if self._client is None or self._client_pid != pid:
+                    self._client = httpx.Client(**self._options())
+                    self._client_pid = pid
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(**self._options())
+            self._async_loop = loop
+        return self._async_client
+
+    def _record(self, started: float, outcome: str, new_connection: bool) -> None:
+        duration = time.perf_counter() - started
+        labels = {"gateway": self.name}
+        metrics.observe("gateway_request_seconds", duration, labels)
+        metrics.inc("gateway_requests_total", {**labels, "outcome": outcome})
+        metrics.inc("gateway_connections_total", {**labels, "reused": "false" if new_connection else "true"})
+        # Rate limiting and server errors count against the gateway; other 4xx do not
+        self.breaker.record(outcome not in ("timeout", "error", "5xx", "429"), duration)
+
+    @staticmethod
+    def _outcome(response: httpx.Response) -> str:
+        if response.status_code == 429:
+            return "429"
+        return f"{response.status_code // 100}xx"
+
+    def _admit(self, deadline: float = None) -> tuple:
+        """
+        Check the caller's deadline (a time.monotonic() value; defaults to the request
+        budget from now) and the breaker. Returns the seconds left and timeouts capped to them.
+        """
+        remaining = (deadline - time.monotonic()) if deadline is not None else settings.GATEWAY_REQUEST_BUDGET_SECONDS
+        if remaining <= 0:
+            metrics.inc("gateway_rejections_total", {"gateway": self.name, "reason": "deadline"})
+            raise DeadlineExceeded(f"No time left to call {self.name}")
+        if not self.breaker.allow():
+            metrics.inc("gateway_rejections_total", {"gateway": self.name, "reason": "circuit_open"})
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        return remaining, httpx.Timeout(
+            min(settings.GATEWAY_READ_TIMEOUT_SECONDS, remaining),
+            connect=min(settings.GATEWAY_CONNECT_TIMEOUT_SECONDS, remaining),
+            pool=min(settings.GATEWAY_POOL_TIMEOUT_SECONDS, remaining)
+        )
+
+    def get(self, path: str, deadline: float = None) -> httpx.Response:
+        remaining, timeout = self._admit(deadline)
+        deadline = time.monotonic() + remaining
+        new_connection = False
+
+        def trace(event_name, info):
+            nonlocal new_connection
+            if event_name.startswith("connection.connect_tcp.started"):
+                new_connection = True
+
+        started = time.perf_counter()
+        try:
+            # httpx timeouts apply per operation, so a trickling body is checked against the budget as it arrives
+            with self.client.stream("GET", path, timeout=timeout, extensions={"trace": trace}) as streamed:
+                body = bytearray()
+                for chunk in streamed.iter_raw():
+                    body.extend(chunk)
+                    if time.monotonic() > deadline:
+                        raise httpx.ReadTimeout(f"{self.name} response exceeded the request budget", request=streamed.request)
+            response = httpx.Response(streamed.status_code, headers=streamed.headers, content=bytes(body), request=streamed.request)
+        except httpx.TimeoutException:
+            self._record(started, "timeout", new_connection)
+            raise
+        except Exception:
+            self._record(started, "error", new_connection)
+            raise
+        self._record(started, self._outcome(response), new_connection)
+        return response
+
+    async def aget(self, path: str, deadline: float = None) -> httpx.Response:
+        remaining, timeout = self._admit(deadline)
+        new_connection = False
+
+        async def trace(event_name, info):
+            nonlocal new_connection
+            if event_name.startswith("connection.connect_tcp.started"):
+                new_connection = True
+
+        started = time.perf_counter()
+        try:
+            # httpx timeouts apply per operation; wait_for bounds the whole call to the budget
+            response = await asyncio.wait_for(
+                self.async_client.get(path, timeout=timeout, extensions={"trace": trace}),
+                timeout=remaining
+            )
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            self._record(started, "timeout", new_connection)
+            raise
+        except asyncio.CancelledError:
+            # Cancelled by the caller: says nothing about the gateway
+            self.breaker.release()
+            raise
+        except Exception:
+            self._record(started, "error", new_connection)
+            raise
+        self._record(started, self._outcome(response), new_connection)
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None and self._client_pid == os.getpid():
+                self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+
+paystack_client = GatewayClient("paystack", settings.PAYSTACK_BASE_URL, settings.PAYSTACK_SECRET_KEY)
+flutterwave_client = GatewayClient("flutterwave", settings.FLUTTERWAVE_BASE_URL, settings.FLUTTERWAVE_SECRET_KEY)
+
+gateway_clients = {client.name: client for client in (paystack_client, flutterwave_client)}
+
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _circuit_samples():
+    return [
+        ({"gateway": name}, CIRCUIT_STATE_VALUES[client.breaker.state])
+        for name, client in gateway_clients.items()
+    ]
+
+
+def _window_samples():
+    samples = []
+    for name, client in gateway_clients.items():
+        snapshot = client.breaker.snapshot()
+        for kind in ("calls", "failures", "slow_calls"):
+            samples.append(({"gateway": name, "kind": kind}, snapshot[kind]))
+    return samples
+
+
+metrics.gauge("gateway_circuit_state", "Payment gateway circuit state (0 closed, 1 half-open, 2 open)", _circuit_samples)
+metrics.gauge("gateway_circuit_window", "Calls, failures and slow calls in the breaker's rolling window", _window_samples)
+
+
+def close_gateway_clients() -> None:
+    paystack_client.close()
+    flutterwave_client.close()
@@ -1,48 +1,163 @@
 import hashlib
 import uuid
 from datetime import datetime
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.circuit_breaker import CircuitOpenError
 from app.core.config import settings
-import httpx
+from app.core.metrics import metrics
+from app.core.singleflight import SingleFlight, AsyncSingleFlight
+from app.models.models import Payment, PaymentStatusEnum
+from app.services.quiz_service import EnrollmentService
+from app.services.dashboard_cache import DashboardCacheService
+from app.services.event_log import event_log
+from app.services.gateway_client import paystack_client, flutterwave_client
+from app.services.rollup_service import RevenueRollupService, PlatformRollupService
+
+# Gateway statuses that will not change any more, so their verification can be reused
+TERMINAL_STATUSES = {
+    "paystack": {"success", "failed", "abandoned", "reversed"},
+    "flutterwave": {"successful", "failed"},
+}
+
+# How each gateway's verify API says it has no such transaction (checkout never started)
+NOT_FOUND_MESSAGES = {
+    "paystack": "transaction reference not found",
+    "flutterwave": "no transaction was found",
+}
+# Status reported in place of the gateway's for that answer
+TRANSACTION_NOT_FOUND = "not_found"
+
+verification_cache = TTLCache(
+    ttl=settings.PAYMENT_VERIFY_CACHE_TTL_SECONDS,
+    negative_ttl=0,
+    max_entries=settings.PAYMENT_VERIFY_CACHE_MAX_ENTRIES
+)
+verify_flight = SingleFlight()
+averify_flight = AsyncSingleFlight()
+
+metrics.counter("payment_verifications_total", "Payment verifications by how they were answered (gateway, shared, cache)")
 
 class PaymentService:
     @staticmethod
-    def verify_paystack_payment(reference: str) -> dict:
-        """Verify Paystack payment"""
-        headers = {
-            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"
-        }
+    def transaction_not_found(gateway: str, response) -> bool:
+        """
+        True only for the gateway's explicit "no such transaction" answer. Other 4xx
+        (validation errors, a bad secret, a changed path) say nothing about the payment.
+        """
+        if response.status_code not in (400, 404):
+            return False
+        try:
+            message = str(response.json().get("message") or "").lower()
+        except ValueError:
+            return False
+        return NOT_FOUND_MESSAGES[gateway] in message
+    
+    @staticmethod
+    def _verified(gateway: str, key: tuple, response) -> dict:
+        """Parse a verify response and cache it if the payment has reached a final status"""
+        if response.status_code != 200:
+            if PaymentService.transaction_not_found(gateway, response):
+                return {"status": False, "data": {"status": TRANSACTION_NOT_FOUND}}
+            return None
+        verified_data = response.json()
+        if (verified_data.get("data") or {}).get("status") in TERMINAL_STATUSES[gateway]:
+            verification_cache.set(key, verified_data)
+        return verified_data
+    
+    @staticmethod
+    def _verify(gateway: str, client, identifier: str, path: str, deadline: float = None) -> dict:
+        # Concurrent checks of one payment share a single gateway call; settled ones reuse its answer
+        key = (gateway, str(identifier))
+        cached = verification_cache.get(key)
+        if cached is not TTLCache.MISSING:
+            metrics.inc("payment_verifications_total", {"gateway": gateway, "source": "cache"})
+            return cached
         
-        url = f"{settings.PAYSTACK_BASE_URL}/transaction/verify/{reference}"
+        verified_data, shared = verify_flight.do(key, lambda: PaymentService._verified(gateway, key, client.get(path, deadline=deadline)))
+        metrics.inc("payment_verifications_total", {"gateway": gateway, "source": "shared" if shared else "gateway"})
+        return verified_data
+    
+    @staticmethod
+    async def _averify(gateway: str, client, identifier: str, path: str, deadline: float = None) -> dict:
+        key = (gateway, str(identifier))
+        cached = verification_cache.get(key)
+        if cached is not TTLCache.MISSING:
+            metrics.inc("payment_verifications_total", {"gateway": gateway, "source": "cache"})
+            return cached
         
+        async def fetch():
+            return PaymentService._verified(gateway, key, await client.aget(path, deadline=deadline))
+        
+        verified_data, shared = await averify_flight.do(key, fetch)
+        metrics.inc("payment_verifications_total", {"gateway": gateway, "source": "shared" if shared else "gateway"})
+        return verified_data
+    
+    @staticmethod
+    def verify_paystack_payment(reference: str, deadline: float = None) -> dict:
+        """Verify Paystack payment"""
         try:
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers)
-                if response.status_code == 200:
-                    return response.json()
+            return PaymentService._verify("paystack", paystack_client, reference, f"/transaction/verify/{reference}", deadline)
+        except CircuitOpenError:
             return None
         except Exception as e:
             print(f"Error verifying Paystack payment: {e}")
             return None
     
     @staticmethod
-    def verify_flutterwave_payment(transaction_id: str) -> dict:
+    async def averify_paystack_payment(reference: str, deadline: float = None) -> dict:
+        """Verify Paystack payment (async)"""
+        try:
+            return await PaymentService._averify("paystack", paystack_client, reference, f"/transaction/verify/{reference}", deadline)
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            print(f"Error verifying Paystack payment: {e}")
+            return None
+    
+    @staticmethod
+    def verify_flutterwave_payment(transaction_id: str, deadline: float = None) -> dict:
         """Verify Flutterwave payment"""
-        headers = {
-            "Authorization": f"Bearer {settings.FLUTTERWAVE_SECRET_KEY}"
-        }
-        
-        url = f"{settings.FLUTTERWAVE_BASE_URL}/transactions/{transaction_id}/verify"
-        
         try:
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers)
-                if response.status_code == 200:
-                    return response.json()
+            return PaymentService._verify("flutterwave", flutterwave_client, transaction_id, f"/transactions/{transaction_id}/verify", deadline)
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            print(f"Error verifying Flutterwave payment: {e}")
+            return None
+    
+    @staticmethod
+    async def averify_flutterwave_payment(transaction_id: str, deadline: float = None) -> dict:
+        """Verify Flutterwave payment (async)"""
+        try:
+            return await PaymentService._averify("flutterwave", flutterwave_client, transaction_id, f"/transactions/{transaction_id}/verify", deadline)
+        except CircuitOpenError:
             return None
         except Exception as e:
             print(f"Error verifying Flutterwave payment: {e}")
             return None
     
+    @staticmethod
+    def complete_payment(db: Session, payment: Payment) -> bool:
+        """
+        Mark a verified payment completed, enroll the student and update the revenue rollups.
+        Returns False if the payment was already completed. The payment row is locked and
+        re-read first, so concurrent callers cannot both complete it. The caller commits.
+        """
+        db.query(Payment).filter(Payment.id == payment.id).with_for_update().populate_existing().first()
+        if payment.status == PaymentStatusEnum.COMPLETED:
+            return False
+        
+        payment.status = PaymentStatusEnum.COMPLETED
+        payment.updated_at = datetime.utcnow()
+        
+        EnrollmentService.enroll_student(db, payment.user_id, payment.course_id, commit=False)
+        RevenueRollupService.record_payment(db, payment)
+        PlatformRollupService.record(db, revenue=payment.amount or 0.0, payments=1)
+        DashboardCacheService.payment_completed(db, payment)
+        event_log.record_after_commit(db, "payment", payment.user_id, payment.course_id, subject_id=payment.id, value=payment.amount)
+        return True
+    
     @staticmethod
     def create_payment_reference() -> str:
         """Generate unique payment reference"""
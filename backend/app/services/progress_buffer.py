@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.quiz_service import ProgressService
+
+
+class ProgressWriteBuffer:
+    """
+    Write-behind buffer for lesson progress reports.
+    Reports are coalesced per (user, lesson) in memory, keeping the highest progress and
+    any completion, and written with batched upserts on an interval or at shutdown.
+    Completions are written before record() returns.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = None, max_pending: int = None):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval or settings.PROGRESS_FLUSH_INTERVAL_SECONDS
+        self.max_pending = max_pending or settings.PROGRESS_BUFFER_MAX_PENDING
+        self._pending: Dict[Tuple[int, int], dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _merge(self, user_id: int, lesson_id: int, progress: float, completed: bool) -> None:
+        key = (user_id, lesson_id)
+        entry = self._pending.get(key)
+        if entry:
+            entry["progress_percent"] = max(entry["progress_percent"], progress)
+            entry["completed"] = entry["completed"] or completed
+        else:
+            self._pending[key] = {
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "progress_percent": progress,
+                "completed": completed,
+            }
+
+    def record(self, user_id: int, lesson_id: int, progress: float, completed: bool = False) -> bool:
+        """Buffer a progress report; returns True if it was written immediately"""
+        with self._lock:
+            self._merge(user_id, lesson_id, progress, completed)
+            pending = len(self._pending)
+
+        if completed:
+            self.flush(keys=[(user_id, lesson_id)])
+            return True
+        if pending >= self.max_pending:
+            self.flush()
+        return False
+
+    def peek(self, user_id: int, lesson_id: int) -> Optional[dict]:
+        """Return the buffered (not yet written) state for a lesson, if any"""
+        with self._lock:
+            entry = self._pending.get((user_id, lesson_id))
+            return dict(entry) if entry else None
+
+    def flush(self, keys: Optional[Iterable[Tuple[int, int]]] = None) -> int:
+        """Write buffered reports (all, or only the given keys) in one transaction"""
+        with self._lock:
+            if keys is None:
+                rows = list(self._pending.values())
+                self._pending = {}
+            else:
+                rows = [self._pending.pop(key) for key in keys if key in self._pending]
+
+        if not rows:
+            return 0
+
+        db = self.session_factory()
+        try:
+            ProgressService.bulk_upsert_lesson_progress(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the reports back so the next flush retries them
+            with self._lock:
+                for row in rows:
+                    self._merge(row["user_id"], row["lesson_id"], row["progress_percent"], row["completed"])
+            raise
+        finally:
+            db.close()
+
+        return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing lesson progress buffer: {e}")
+
+    def start(self) -> None:
+        """Start the background flusher"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="progress-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background flusher and write whatever is still buffered"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+
+progress_buffer = ProgressWriteBuffer()
@@ -0,0 +1,501 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from itertools import islice
+from typing import Iterator, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Question, Answer, QuizImportJob, QuestionTypeEnum
+
+GIFT_EXTENSIONS = {".gift", ".txt"}
+QTI_EXTENSIONS = {".xml", ".qti"}
+
+_GIFT_ESCAPES = {":": ":", "~": "~", "=": "=", "#": "#", "{": "{", "}": "}", "n": "\n", "\\": "\\"}
+_GIFT_WEIGHT = re.compile(r"^%(-?\d+(?:\.\d+)?)%")
+_GIFT_TITLE = re.compile(r"^::(.*?)::", re.S)
+_GIFT_MARKUP = re.compile(r"^\[(html|moodle|markdown|plain)\]", re.I)
+
+
+def _local(tag: str) -> str:
+    """Strip the XML namespace from a tag"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _text(elem) -> str:
+    return " ".join("".join(elem.itertext()).split()) if elem is not None else ""
+
+
+def _unescape_gift(value: str) -> str:
+    out = []
+    i = 0
+    while i < len(value):
+        if value[i] == "\\" and i + 1 < len(value):
+            out.append(_GIFT_ESCAPES.get(value[i + 1], value[i + 1]))
+            i += 2
+            continue
+        out.append(value[i])
+        i += 1
+    return "".join(out).strip()
+
+
+def _find_unescaped(value: str, char: str, start: int = 0) -> int:
+    i = start
+    while i < len(value):
+        if value[i] == "\\":
+            i += 2
+            continue
+        if value[i] == char:
+            return i
+        i += 1
+    return -1
+
+
+def _split_gift_answers(body: str) -> List[tuple]:
+    """Split a GIFT answer block into (marker, text) tokens"""
+    tokens = []
+    marker = None
+    current = []
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == "\\" and i + 1 < len(body):
+            current.append(body[i:i + 2])
+            i += 2
+            continue
+        if char in "=~":
+            if marker is not None:
+                tokens.append((marker, "".join(current)))
+            marker = char
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    if marker is not None:
+        tokens.append((marker, "".join(current)))
+    return tokens
+
+
+class GiftParser:
+    """Incremental parser for Moodle GIFT question banks"""
+
+    @staticmethod
+    def iter_blocks(lines: Iterator[str]) -> Iterator[str]:
+        """Yield one raw question block at a time"""
+        block = []
+        depth = 0
+        for line in lines:
+            stripped = line.strip()
+            if depth == 0 and (stripped.startswith("//") or stripped.startswith("$CATEGORY:")):
+                continue
+            if not stripped and depth == 0:
+                if block:
+                    yield "\n".join(block)
+                    block = []
+                continue
+            block.append(line.rstrip("\n"))
+
+            # Track braces so blank lines inside an answer block don't split it
+            i = 0
+            while i < len(line):
+                if line[i] == "\\":
+                    i += 2
+                    continue
+                if line[i] == "{":
+                    depth += 1
+                elif line[i] == "}":
+                    depth = max(depth - 1, 0)
+                i += 1
+        if block:
+            yield "\n".join(block)
+
+    @staticmethod
+    def parse_block(block: str) -> Optional[dict]:
+        """Convert a GIFT block into a question dict, or None if unsupported"""
+        block = block.strip()
+        block = _GIFT_TITLE.sub("", block, count=1).strip()
+        block = _GIFT_MARKUP.sub("", block, count=1).strip()
+
+        open_at = _find_unescaped(block, "{")
+        if open_at == -1:
+            # Plain descriptions carry no question
+            return None
+        close_at = _find_unescaped(block, "}", open_at)
+        if close_at == -1:
+            return None
+
+        before = block[:open_at].strip()
+        after = block[close_at + 1:].strip()
+        body = block[open_at + 1:close_at].strip()
+        question_text = _unescape_gift(f"{before} _____ {after}" if after else before)
+
+        # General feedback is introduced with ####
+        explanation = None
+        general_at = body.find("####")
+        if general_at != -1:
+            explanation = _unescape_gift(body[general_at + 4:]) or None
+            body = body[:general_at].strip()
+
+        if not body:
+            return {
+                "question_text": question_text,
+                "question_type": QuestionTypeEnum.ESSAY,
+                "correct_answer": "",
+                "explanation": explanation,
+                "answers": [],
+            }
+
+        if "->" in body:
+            # Matching questions have no equivalent question type
+            return None
+
+        if body.startswith("#"):
+            # Numeric answers are graded as short answers on their exact value
+            numeric = body[1:].strip()
+            tokens = _split_gift_answers(numeric) if numeric.startswith("=") else [("=", numeric)]
+            values = []
+            for _, raw in tokens:
+                raw = raw.split("#", 1)[0].strip()
+                raw = _GIFT_WEIGHT.sub("", raw).split(":", 1)[0].strip()
+                if raw:
+                    values.append(_unescape_gift(raw))
+            return {
+                "question_text": question_text,
+                "question_type": QuestionTypeEnum.SHORT_ANSWER,
+                "correct_answer": values[0] if values else "",
+                "explanation": explanation,
+                "answers": [{"answer_text": v, "is_correct": True, "order": order} for order, v in enumerate(values)],
+            }
+
+        first_word = body.split("#", 1)[0].strip().upper()
+        if first_word in ("T", "TRUE", "F", "FALSE"):
+            correct = "true" if first_word.startswith("T") else "false"
+            return {
+                "question_text": question_text,
+                "question_type": QuestionTypeEnum.TRUE_FALSE,
+                "correct_answer": correct,
+                "explanation": explanation,
+                "answers": [
+                    {"answer_text": "true", "is_correct": correct == "true", "order": 0},
+                    {"answer_text": "false", "is_correct": correct == "false", "order": 1},
+                ],
+            }
+
+        tokens = _split_gift_answers(body)
+        answers = []
+        for order, (marker, raw) in enumerate(tokens):
+            feedback_at = _find_unescaped(raw, "#")
+            if feedback_at != -1:
+                raw = raw[:feedback_at]
+            raw = raw.strip()
+            weight = _GIFT_WEIGHT.match(raw)
+            is_correct = marker == "="
+            if weight:
+                is_correct = float(weight.group(1)) > 0
+                raw = raw[weight.end():]
+            answers.append({"answer_text": _unescape_gift(raw), "is_correct": is_correct, "order": order})
+
+        if not answers:
+            return None
+
+        correct_answers = [a["answer_text"] for a in answers if a["is_correct"]]
+        is_choice = any(marker == "~" for marker, _ in tokens)
+        return {
+            "question_text": question_text,
+            "question_type": QuestionTypeEnum.MULTIPLE_CHOICE if is_choice else QuestionTypeEnum.SHORT_ANSWER,
+            "correct_answer": correct_answers[0] if correct_answers else "",
+            "explanation": explanation,
+            "answers": answers,
+        }
+
+    @staticmethod
+    def iter_questions(path: str) -> Iterator[Optional[dict]]:
+        """Yield parsed questions (None for skipped blocks) without loading the file"""
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for block in GiftParser.iter_blocks(f):
+                yield GiftParser.parse_block(block)
+
+
+class QtiParser:
+    """Streaming parser for QTI 1.2 items and QTI 2.x assessment items"""
+
+    QTI1_TYPES = {
+        "multiple_choice_question": QuestionTypeEnum.MULTIPLE_CHOICE,
+        "multiple_answers_question": QuestionTypeEnum.MULTIPLE_CHOICE,
+        "true_false_question": QuestionTypeEnum.TRUE_FALSE,
+        "short_answer_question": QuestionTypeEnum.SHORT_ANSWER,
+        "fill_in_the_blank_question": QuestionTypeEnum.SHORT_ANSWER,
+        "numerical_question": QuestionTypeEnum.SHORT_ANSWER,
+        "essay_question": QuestionTypeEnum.ESSAY,
+    }
+
+    @staticmethod
+    def parse_qti1_item(item) -> Optional[dict]:
+        question_type = None
+        for field in item.iter():
+            if _local(field.tag) != "qtimetadatafield":
+                continue
+            label = value = None
+            for child in field:
+                if _local(child.tag) == "fieldlabel":
+                    label = _text(child)
+                elif _local(child.tag) == "fieldentry":
+                    value = _text(child)
+            if label in ("question_type", "cc_profile") and value in QtiParser.QTI1_TYPES:
+                question_type = QtiParser.QTI1_TYPES[value]
+
+        presentation = next((e for e in item.iter() if _local(e.tag) == "presentation"), None)
+        if presentation is None:
+            return None
+
+        question_text = ""
+        labels = []
+        has_text_response = False
+        for elem in presentation.iter():
+            name = _local(elem.tag)
+            if name == "mattext" and not question_text:
+                question_text = _text(elem)
+            elif name == "response_label":
+                mattext = next((e for e in elem.iter() if _local(e.tag) == "mattext"), None)
+                labels.append((elem.get("ident"), _text(mattext)))
+            elif name in ("response_str", "response_num"):
+                has_text_response = True
+
+        # Idents referenced by conditions that award points are correct
+        correct_idents = []
+        for condition in item.iter():
+            if _local(condition.tag) != "respcondition":
+                continue
+            awards = False
+            for setvar in condition.iter():
+                if _local(setvar.tag) == "setvar":
+                    try:
+                        awards = awards or float(_text(setvar) or 0) > 0
+                    except ValueError:
+                        continue
+            if not awards:
+                continue
+            for varequal in condition.iter():
+                if _local(varequal.tag) == "varequal":
+                    correct_idents.append(_text(varequal))
+
+        explanation = None
+        for feedback in item.iter():
+            if _local(feedback.tag) == "itemfeedback" and feedback.get("ident") in ("general_fb", "correct_fb"):
+                explanation = _text(feedback) or None
+                break
+
+        if labels:
+            answers = [
+                {"answer_text": text, "is_correct": ident in correct_idents, "order": order}
+                for order, (ident, text) in enumerate(labels)
+            ]
+            if question_type is None:
+                texts = {a["answer_text"].lower() for a in answers}
+                question_type = QuestionTypeEnum.TRUE_FALSE if texts == {"true", "false"} else QuestionTypeEnum.MULTIPLE_CHOICE
+            correct = [a["answer_text"] for a in answers if a["is_correct"]]
+            correct_answer = correct[0] if correct else ""
+            if question_type == QuestionTypeEnum.TRUE_FALSE:
+                correct_answer = correct_answer.lower()
+        elif has_text_response:
+            answers = [
+                {"answer_text": text, "is_correct": True, "order": order}
+                for order, text in enumerate(correct_idents)
+            ]
+            if question_type is None:
+                question_type = QuestionTypeEnum.SHORT_ANSWER if answers else QuestionTypeEnum.ESSAY
+            correct_answer = answers[0]["answer_text"] if answers else ""
+        else:
+            return None
+
+        return {
+            "question_text": question_text,
+            "question_type": question_type,
+            "correct_answer": correct_answer,
+            "explanation": explanation,
+            "answers": answers,
+        }
+
+    @staticmethod
+    def parse_qti2_item(item) -> Optional[dict]:
+        correct_values = []
+        for declaration in item:
+            if _local(declaration.tag) != "responseDeclaration":
+                continue
+            for value in declaration.iter():
+                if _local(value.tag) == "value":
+                    correct_values.append(_text(value))
+
+        body = next((e for e in item if _local(e.tag) == "itemBody"), None)
+        if body is None:
+            return None
+
+        interaction = None
+        prompt = ""
+        text_parts = []
+        for child in body:
+            name = _local(child.tag)
+            if name.endswith("Interaction"):
+                interaction = child
+            else:
+                text_parts.append(_text(child))
+        if interaction is None:
+            interaction = next((e for e in body.iter() if _local(e.tag).endswith("Interaction")), None)
+        if interaction is None:
+            return None
+        for child in interaction:
+            if _local(child.tag) == "prompt":
+                prompt = _text(child)
+        question_text = " ".join(p for p in text_parts + [prompt] if p)
+
+        kind = _local(interaction.tag)
+        if kind == "choiceInteraction":
+            answers = [
+                {"answer_text": _text(choice), "is_correct": choice.get("identifier") in correct_values, "order": order}
+                for order, choice in enumerate(e for e in interaction if _local(e.tag) == "simpleChoice")
+            ]
+            texts = {a["answer_text"].lower() for a in answers}
+            question_type = QuestionTypeEnum.TRUE_FALSE if texts == {"true", "false"} else QuestionTypeEnum.MULTIPLE_CHOICE
+            correct = [a["answer_text"] for a in answers if a["is_correct"]]
+            correct_answer = correct[0] if correct else ""
+            if question_type == QuestionTypeEnum.TRUE_FALSE:
+                correct_answer = correct_answer.lower()
+        elif kind == "textEntryInteraction":
+            answers = [{"answer_text": v, "is_correct": True, "order": order} for order, v in enumerate(correct_values)]
+            question_type = QuestionTypeEnum.SHORT_ANSWER
+            correct_answer = correct_values[0] if correct_values else ""
+        elif kind == "extendedTextInteraction":
+            answers = []
+            question_type = QuestionTypeEnum.ESSAY
+            correct_answer = ""
+        else:
+            return None
+
+        return {
+            "question_text": question_text,
+            "question_type": question_type,
+            "correct_answer": correct_answer,
+            "explanation": None,
+            "answers": answers,
+        }
+
+    @staticmethod
+    def iter_questions(path: str) -> Iterator[Optional[dict]]:
+        """Yield parsed questions, detaching each item from the tree once handled"""
+        stack = []
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            name = _local(elem.tag)
+            if name == "item":
+                yield QtiParser.parse_qti1_item(elem)
+            elif name == "assessmentItem":
+                yield QtiParser.parse_qti2_item(elem)
+            else:
+                continue
+
+            # Drop the handled item so memory stays bounded by one item
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+class QuizImportService:
+    PARSERS = {"gift": GiftParser, "qti": QtiParser}
+
+    @staticmethod
+    def detect_format(filename: str) -> Optional[str]:
+        """Guess the question bank format from a file name"""
+        extension = os.path.splitext(filename or "")[1].lower()
+        if extension in GIFT_EXTENSIONS:
+            return "gift"
+        if extension in QTI_EXTENSIONS:
+            return "qti"
+        return None
+
+    @staticmethod
+    def _insert_batch(db: Session, quiz_id: int, batch: List[dict], start_order: int) -> int:
+        """Insert a batch of questions and their answers, returning the answer count"""
+        now = datetime.utcnow()
+        question_rows = [
+            {
+                "quiz_id": quiz_id,
+                "question_text": q["question_text"],
+                "question_type": q["question_type"],
+                "correct_answer": q["correct_answer"],
+                "explanation": q["explanation"],
+                "order": start_order + offset,
+                "created_at": now,
+            }
+            for offset, q in enumerate(batch)
+        ]
+        question_ids = db.execute(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True),
+            question_rows
+        ).scalars().all()
+
+        answer_rows = [
+            {"question_id": question_id, **answer}
+            for question_id, q in zip(question_ids, batch)
+            for answer in q["answers"]
+        ]
+        if answer_rows:
+            db.execute(insert(Answer), answer_rows)
+        return len(answer_rows)
+
+    @staticmethod
+    def run_import(db: Session, job_id: int) -> Optional[QuizImportJob]:
+        """
+        Stream a question bank file into its quiz in batches. Each batch commits with the
+        job's cursor, so a retried or redelivered job resumes after the last committed batch.
+        """
+        job = db.query(QuizImportJob).filter(QuizImportJob.id == job_id).first()
+        if not job or job.status in ("completed", "failed"):
+            return job
+
+        job.status = "running"
+        db.commit()
+
+        batch_size = settings.QUIZ_IMPORT_BATCH_SIZE
+        order = db.query(Question).filter(Question.quiz_id == job.quiz_id).count()
+        try:
+            parser = QuizImportService.PARSERS[job.format]
+            batch = []
+            items = islice(parser.iter_questions(job.source_path), job.processed_items or 0, None)
+            for question in items:
+                if question is None or not question["question_text"]:
+                    job.skipped_questions += 1
+                    job.processed_items += 1
+                    continue
+                batch.append(question)
+                if len(batch) >= batch_size:
+                    job.imported_answers += QuizImportService._insert_batch(db, job.quiz_id, batch, order)
+                    job.imported_questions += len(batch)
+                    job.processed_items += len(batch)
+                    order += len(batch)
+                    batch = []
+                    # Commit per batch so progress is visible and the session stays small
+                    db.commit()
+                    db.expire_all()
+            if batch:
+                job.imported_answers += QuizImportService._insert_batch(db, job.quiz_id, batch, order)
+                job.imported_questions += len(batch)
+                job.processed_items += len(batch)
+
+            job.status = "completed"
+            job.completed_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)[:2000]
+            job.completed_at = datetime.utcnow()
+            db.commit()
+
+        if job.source_path and os.path.exists(job.source_path):
+            os.remove(job.source_path)
+
+        return job
@@ -1,6 +1,13 @@
+from sqlalchemy import case, func, or_, select, tuple_, update
 from sqlalchemy.orm import Session
-from app.models.models import User, Course, Lesson, Quiz, Question, Answer, LessonProgress, QuizAttempt, QuestionResponse
+from datetime import datetime
+from app.core.database import dialect_insert
+from app.models.models import User, Course, Lesson, Quiz, Question, Answer, LessonProgress, QuizAttempt, QuestionResponse, course_enrollment
 from app.schemas.schemas import QuestionResponseSubmit
+from app.services.stats_service import StudentStatsService
+from app.services.event_log import event_log
+from app.services.course_analytics import CourseAnalyticsService
+from app.services.rollup_service import PlatformRollupService
 from typing import List, Optional
 
 class QuizService:
@@ -53,6 +60,13 @@ class QuizService:
         attempt.passed = passed
         
         db.add(attempt)
+        db.flush()
+        
+        StudentStatsService.adjust(db, user_id, quiz_attempts=1, quiz_score_total=score or 0.0)
+        event_log.record_after_commit(db, "quiz_attempt", user_id, quiz.course_id, subject_id=quiz_id, value=score)
+        if passed:
+            CompletionTracker.refresh_quiz_counters(db, pairs=[(user_id, quiz.course_id)])
+        
         db.commit()
         db.refresh(attempt)
         
@@ -60,7 +74,7 @@ class QuizService:
 
 class EnrollmentService:
     @staticmethod
-    def enroll_student(db: Session, user_id: int, course_id: int) -> bool:
+    def enroll_student(db: Session, user_id: int, course_id: int, commit: bool = True) -> bool:
         """Enroll a student in a course"""
         user = db.query(User).filter(User.id == user_id).first()
         course = db.query(Course).filter(Course.id == course_id).first()
@@ -73,7 +87,17 @@ class EnrollmentService:
             return False
         
         user.courses_enrolled.append(course)
-        db.commit()
+        db.flush()
+        
+        StudentStatsService.adjust(db, user_id, enrolled_courses=1)
+        PlatformRollupService.record(db, enrollments=1)
+        event_log.record_after_commit(db, "enrollment", user_id, course_id)
+        CourseAnalyticsService.progress_changed(db, [course_id])
+        # Pick up any progress made before enrolling
+        CompletionTracker.refresh_enrollment(db, pairs=[(user_id, course_id)])
+        
+        if commit:
+            db.commit()
         return True
 
 class ProgressService:
@@ -97,56 +121,435 @@ class ProgressService:
             lesson_progress.completed = completed
             lesson_progress.progress_percent = progress
         
+        db.flush()
+        course_id = db.query(Lesson.course_id).filter(Lesson.id == lesson_id).scalar()
+        if course_id is not None:
+            ProgressService.refresh_enrollment_progress(db, pairs=[(user_id, course_id)])
+            event_log.record_after_commit(db, "lesson_progress", user_id, course_id, subject_id=lesson_id, value=progress)
+            CourseAnalyticsService.progress_changed(db, [course_id])
+        
         db.commit()
         return True
     
+    @staticmethod
+    def bulk_upsert_lesson_progress(db: Session, rows: List[dict], batch_size: int = 500) -> int:
+        """
+        Upsert many lesson progress rows, keeping the highest progress and a sticky completed flag.
+        Each row needs user_id, lesson_id, progress_percent and completed. The caller commits.
+        """
+        table = LessonProgress.__table__
+        now = datetime.utcnow()
+        
+        # A statement may touch each (user, lesson) only once, so merge duplicates first
+        merged = {}
+        for row in rows:
+            key = (row["user_id"], row["lesson_id"])
+            current = merged.get(key)
+            if current:
+                current["progress_percent"] = max(current["progress_percent"], row["progress_percent"])
+                current["completed"] = current["completed"] or row["completed"]
+            else:
+                merged[key] = {
+                    "user_id": row["user_id"],
+                    "lesson_id": row["lesson_id"],
+                    "progress_percent": row["progress_percent"],
+                    "completed": bool(row["completed"]),
+                    "last_accessed": now,
+                    "created_at": now,
+                }
+        unique_rows = list(merged.values())
+        
+        for start in range(0, len(unique_rows), batch_size):
+            values = unique_rows[start:start + batch_size]
+            stmt = dialect_insert(table).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.lesson_id],
+                set_={
+                    "progress_percent": case(
+                        (stmt.excluded.progress_percent > table.c.progress_percent, stmt.excluded.progress_percent),
+                        else_=table.c.progress_percent
+                    ),
+                    "completed": or_(table.c.completed, stmt.excluded.completed),
+                    "last_accessed": stmt.excluded.last_accessed,
+                }
+            )
+            db.execute(stmt)
+        
+        # Keep the materialized course progress of the touched enrollments current
+        lesson_ids = {row["lesson_id"] for row in unique_rows}
+        lesson_courses = dict(db.query(Lesson.id, Lesson.course_id).filter(Lesson.id.in_(lesson_ids)).all()) if lesson_ids else {}
+        pairs = {(row["user_id"], lesson_courses[row["lesson_id"]]) for row in unique_rows if row["lesson_id"] in lesson_courses}
+        ProgressService.refresh_enrollment_progress(db, pairs=list(pairs))
+        CourseAnalyticsService.progress_changed(db, lesson_courses.values())
+        
+        for row in unique_rows:
+            if row["lesson_id"] in lesson_courses:
+                event_log.record_after_commit(
+                    db, "lesson_progress", row["user_id"], lesson_courses[row["lesson_id"]],
+                    subject_id=row["lesson_id"], value=row["progress_percent"]
+                )
+        
+        return len(unique_rows)
+    
+    @staticmethod
+    def sync_offline_events(db: Session, user_id: int, events: list, since: Optional[datetime] = None) -> dict:
+        """
+        Apply a batch of offline progress events with max-progress / last-writer semantics
+        through one bulk upsert. Returns per-event results, changes since the previous
+        watermark and the new watermark: the newest last_accessed among the returned rows,
+        so rows written concurrently with this sync are still picked up next time.
+        """
+        lesson_ids = {event.lesson_id for event in events}
+        
+        # Lessons the user may report on: those in their enrolled courses
+        allowed = set()
+        stored = {}
+        if lesson_ids:
+            allowed = {
+                lesson_id for (lesson_id,) in db.query(Lesson.id).join(
+                    course_enrollment,
+                    (course_enrollment.c.course_id == Lesson.course_id) & (course_enrollment.c.user_id == user_id)
+                ).filter(Lesson.id.in_(lesson_ids)).all()
+            }
+            stored = {
+                row.lesson_id: row for row in db.query(
+                    LessonProgress.lesson_id, LessonProgress.progress_percent, LessonProgress.completed
+                ).filter(
+                    LessonProgress.user_id == user_id,
+                    LessonProgress.lesson_id.in_(allowed)
+                ).all()
+            } if allowed else {}
+        
+        # Pick the winning event per lesson: highest progress, newest client timestamp on ties
+        winners = {}
+        completions = set()
+        for index, event in enumerate(events):
+            if event.lesson_id not in allowed:
+                continue
+            if event.completed:
+                completions.add(event.lesson_id)
+            best = winners.get(event.lesson_id)
+            if best is None or (event.progress, event.client_timestamp) > (events[best].progress, events[best].client_timestamp):
+                winners[event.lesson_id] = index
+        
+        results = []
+        rows = []
+        for lesson_id, index in winners.items():
+            current = stored.get(lesson_id)
+            if current is not None and events[index].progress <= (current.progress_percent or 0.0) and (current.completed or lesson_id not in completions):
+                # Nothing newer than what the server already has
+                continue
+            rows.append({
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "progress_percent": events[index].progress,
+                "completed": lesson_id in completions,
+            })
+        
+        for index, event in enumerate(events):
+            if event.lesson_id not in allowed:
+                results.append({"index": index, "lesson_id": event.lesson_id, "status": "rejected", "detail": "Lesson not found in your enrolled courses"})
+                continue
+            current = stored.get(event.lesson_id)
+            raises_progress = current is None or event.progress > (current.progress_percent or 0.0)
+            completes = event.completed and not (current is not None and current.completed)
+            if (winners[event.lesson_id] == index and raises_progress) or completes:
+                results.append({"index": index, "lesson_id": event.lesson_id, "status": "applied", "detail": None})
+            else:
+                results.append({"index": index, "lesson_id": event.lesson_id, "status": "superseded", "detail": None})
+        
+        if rows:
+            ProgressService.bulk_upsert_lesson_progress(db, rows)
+            db.commit()
+        
+        changes = db.query(LessonProgress).filter(LessonProgress.user_id == user_id)
+        if since is not None:
+            # Inclusive: rows sharing the watermark's timestamp may have committed after it was read
+            changes = changes.filter(LessonProgress.last_accessed >= since)
+        changes = changes.all()
+        watermark = max((row.last_accessed for row in changes if row.last_accessed), default=since or datetime.min)
+        
+        return {
+            "results": results,
+            "watermark": watermark,
+            "changes": changes,
+        }
+    
+    @staticmethod
+    def course_progress_expression(user_id_col, course_id_col):
+        """SQL expression for the average lesson progress of a user in a course"""
+        lesson_count = select(func.count(Lesson.id)).where(
+            Lesson.course_id == course_id_col
+        ).scalar_subquery()
+        progress_sum = select(func.coalesce(func.sum(LessonProgress.progress_percent), 0.0)).select_from(
+            LessonProgress
+        ).join(Lesson, Lesson.id == LessonProgress.lesson_id).where(
+            Lesson.course_id == course_id_col,
+            LessonProgress.user_id == user_id_col
+        ).scalar_subquery()
+        return case((lesson_count > 0, progress_sum * 1.0 / lesson_count), else_=0.0)
+    
+    @staticmethod
+    def refresh_enrollment_progress(db: Session, pairs: Optional[List[tuple]] = None, course_id: Optional[int] = None) -> None:
+        """
+        Recompute course_enrollment.progress and the completed-lesson counter for the given
+        (user_id, course_id) pairs, or for every enrollment in a course, with one set-based
+        UPDATE, then sync completion state. The caller commits.
+        """
+        if not pairs and course_id is None:
+            return
+        
+        db.execute(
+            update(course_enrollment).where(
+                CompletionTracker.enrollment_filter(pairs, course_id)
+            ).values(
+                progress=ProgressService.course_progress_expression(course_enrollment.c.user_id, course_enrollment.c.course_id),
+                completed_lessons=CompletionTracker.completed_lessons_expression(course_enrollment.c.user_id, course_enrollment.c.course_id)
+            )
+        )
+        CompletionTracker.sync_completion(db, pairs=pairs, course_id=course_id)
+    
     @staticmethod
     def get_course_progress(db: Session, user_id: int, course_id: int) -> float:
-        """Calculate overall course progress"""
-        lessons = db.query(Lesson).filter(Lesson.course_id == course_id).all()
-        if not lessons:
-            return 0.0
-        
-        total_progress = 0.0
-        for lesson in lessons:
-            progress = db.query(LessonProgress).filter(
-                LessonProgress.user_id == user_id,
-                LessonProgress.lesson_id == lesson.id
-            ).first()
-            
-            if progress:
-                total_progress += progress.progress_percent
+        """Get overall course progress from the enrollment row"""
+        progress = db.query(course_enrollment.c.progress).filter(
+            course_enrollment.c.user_id == user_id,
+            course_enrollment.c.course_id == course_id
+        ).first()
+        
+        if progress is not None:
+            return progress[0] or 0.0
         
-        return (total_progress / len(lessons)) if lessons else 0.0
+        # Not enrolled: fall back to a single aggregate query
+        return db.execute(
+            select(ProgressService.course_progress_expression(user_id, course_id))
+        ).scalar() or 0.0
 
 class CertificateService:
     @staticmethod
     def check_completion(db: Session, user_id: int, course_id: int) -> bool:
         """Check if student has completed all course requirements"""
-        # Check if all lessons completed
-        lessons = db.query(Lesson).filter(Lesson.course_id == course_id).all()
-        
-        for lesson in lessons:
-            progress = db.query(LessonProgress).filter(
-                LessonProgress.user_id == user_id,
-                LessonProgress.lesson_id == lesson.id,
-                LessonProgress.completed == True
-            ).first()
-            
-            if not progress:
-                return False
-        
-        # Check if all quizzes passed
-        quizzes = db.query(Quiz).filter(Quiz.course_id == course_id).all()
-        
-        for quiz in quizzes:
-            attempt = db.query(QuizAttempt).filter(
-                QuizAttempt.quiz_id == quiz.id,
-                QuizAttempt.user_id == user_id,
-                QuizAttempt.passed == True
-            ).first()
-            
-            if not attempt:
-                return False
+        return CompletionTracker.is_complete(db, user_id, course_id)
+
+class CompletionTracker:
+    """
+    Maintains per-enrollment counters (completed lessons, passed quizzes) and per-course
+    totals (lessons, quizzes) so completion is a single row comparison.
+    Counters are recomputed for the touched enrollments whenever progress is written,
+    an attempt passes, or a course's lessons or quizzes change.
+    """
+    
+    @staticmethod
+    def enrollment_filter(pairs: Optional[List[tuple]] = None, course_id: Optional[int] = None):
+        """WHERE clause selecting enrollments by (user_id, course_id) pairs or by course"""
+        if course_id is not None:
+            return course_enrollment.c.course_id == course_id
+        return tuple_(course_enrollment.c.user_id, course_enrollment.c.course_id).in_(pairs)
+    
+    @staticmethod
+    def completed_lessons_expression(user_id_col, course_id_col):
+        return select(func.count(LessonProgress.id)).select_from(LessonProgress).join(
+            Lesson, Lesson.id == LessonProgress.lesson_id
+        ).where(
+            Lesson.course_id == course_id_col,
+            LessonProgress.user_id == user_id_col,
+            LessonProgress.completed == True
+        ).scalar_subquery()
+    
+    @staticmethod
+    def passed_quizzes_expression(user_id_col, course_id_col):
+        return select(func.count(func.distinct(QuizAttempt.quiz_id))).select_from(QuizAttempt).join(
+            Quiz, Quiz.id == QuizAttempt.quiz_id
+        ).where(
+            Quiz.course_id == course_id_col,
+            QuizAttempt.user_id == user_id_col,
+            QuizAttempt.passed == True
+        ).scalar_subquery()
+    
+    @staticmethod
+    def refresh_quiz_counters(db: Session, pairs: Optional[List[tuple]] = None, course_id: Optional[int] = None) -> None:
+        """Recompute the passed-quiz counter for the given enrollments. The caller commits."""
+        if not pairs and course_id is None:
+            return
         
-        return True
+        db.execute(
+            update(course_enrollment).where(
+                CompletionTracker.enrollment_filter(pairs, course_id)
+            ).values(
+                passed_quizzes=CompletionTracker.passed_quizzes_expression(course_enrollment.c.user_id, course_enrollment.c.course_id)
+            )
+        )
+        CompletionTracker.sync_completion(db, pairs=pairs, course_id=course_id)
+    
+    @staticmethod
+    def refresh_enrollment(db: Session, pairs: Optional[List[tuple]] = None, course_id: Optional[int] = None) -> None:
+        """Recompute progress and both counters for the given enrollments. The caller commits."""
+        if not pairs and course_id is None:
+            return
+        
+        db.execute(
+            update(course_enrollment).where(
+                CompletionTracker.enrollment_filter(pairs, course_id)
+            ).values(
+                progress=ProgressService.course_progress_expression(course_enrollment.c.user_id, course_enrollment.c.course_id),
+                completed_lessons=CompletionTracker.completed_lessons_expression(course_enrollment.c.user_id, course_enrollment.c.course_id),
+                passed_quizzes=CompletionTracker.passed_quizzes_expression(course_enrollment.c.user_id, course_enrollment.c.course_id)
+            )
+        )
+        CompletionTracker.sync_completion(db, pairs=pairs, course_id=course_id)
+    
+    @staticmethod
+    def course_structure_changed(db: Session, course_id: int) -> None:
+        """Refresh course totals and every enrollment after lessons or quizzes are added or removed"""
+        db.execute(
+            update(Course).where(Course.id == course_id).values(
+                lesson_count=select(func.count(Lesson.id)).where(Lesson.course_id == course_id).scalar_subquery(),
+                quiz_count=select(func.count(Quiz.id)).where(Quiz.course_id == course_id).scalar_subquery()
+            ).execution_options(synchronize_session="fetch")
+        )
+        CompletionTracker.refresh_enrollment(db, course_id=course_id)
+    
+    @staticmethod
+    def sync_completion(db: Session, pairs: Optional[List[tuple]] = None, course_id: Optional[int] = None) -> tuple:
+        """
+        Stamp or clear course_enrollment.completed_at where completion changed.
+        Returns (newly_completed, reopened) lists of (user_id, course_id) pairs.
+        """
+        if not pairs and course_id is None:
+            return [], []
+        
+        rows = db.query(
+            course_enrollment.c.user_id,
+            course_enrollment.c.course_id,
+            course_enrollment.c.completed_at,
+            course_enrollment.c.completed_lessons,
+            course_enrollment.c.passed_quizzes,
+            Course.lesson_count,
+            Course.quiz_count
+        ).join(Course, Course.id == course_enrollment.c.course_id).filter(
+            CompletionTracker.enrollment_filter(pairs, course_id)
+        ).all()
+        
+        newly_completed = []
+        reopened = []
+        for row in rows:
+            complete = (row.completed_lessons or 0) >= (row.lesson_count or 0) and (row.passed_quizzes or 0) >= (row.quiz_count or 0)
+            if complete and row.completed_at is None:
+                newly_completed.append((row.user_id, row.course_id))
+            elif not complete and row.completed_at is not None:
+                reopened.append((row.user_id, row.course_id))
+        
+        if newly_completed:
+            db.execute(
+                update(course_enrollment).where(
+                    CompletionTracker.enrollment_filter(newly_completed)
+                ).values(completed_at=datetime.utcnow())
+            )
+        if reopened:
+            db.execute(
+                update(course_enrollment).where(
+                    CompletionTracker.enrollment_filter(reopened)
+                ).values(completed_at=None)
+            )
+        
+        StudentStatsService.completion_changed(db, newly_completed, reopened)
+        if newly_completed or reopened:
+            PlatformRollupService.record(db, completions=len(newly_completed) - len(reopened))
+        
+        return newly_completed, reopened
+    
+    @staticmethod
+    def is_complete(db: Session, user_id: int, course_id: int) -> bool:
+        """O(1) completion check against the maintained counters"""
+        row = db.query(
+            course_enrollment.c.completed_lessons,
+            course_enrollment.c.passed_quizzes,
+            Course.lesson_count,
+            Course.quiz_count
+        ).join(Course, Course.id == course_enrollment.c.course_id).filter(
+            course_enrollment.c.user_id == user_id,
+            course_enrollment.c.course_id == course_id
+        ).first()
+        
+        if not row:
+            return False
+        
+        return (row.completed_lessons or 0) >= (row.lesson_count or 0) and (row.passed_quizzes or 0) >= (row.quiz_count or 0)
+    
+    @staticmethod
+    def verify(db: Session, course_id: Optional[int] = None, repair: bool = False) -> List[dict]:
+        """
+        Compare the stored counters and course totals with values recomputed from
+        lesson_progress, quiz_attempt, lesson and quiz. Optionally repair mismatches.
+        """
+        mismatches = []
+        
+        lesson_totals = db.query(Lesson.course_id, func.count(Lesson.id)).group_by(Lesson.course_id)
+        quiz_totals = db.query(Quiz.course_id, func.count(Quiz.id)).group_by(Quiz.course_id)
+        courses = db.query(Course.id, Course.lesson_count, Course.quiz_count)
+        if course_id is not None:
+            lesson_totals = lesson_totals.filter(Lesson.course_id == course_id)
+            quiz_totals = quiz_totals.filter(Quiz.course_id == course_id)
+            courses = courses.filter(Course.id == course_id)
+        lesson_totals = dict(lesson_totals.all())
+        quiz_totals = dict(quiz_totals.all())
+        
+        bad_courses = []
+        for course in courses.all():
+            expected = (lesson_totals.get(course.id, 0), quiz_totals.get(course.id, 0))
+            if ((course.lesson_count or 0), (course.quiz_count or 0)) != expected:
+                bad_courses.append(course.id)
+                mismatches.append({
+                    "course_id": course.id,
+                    "lesson_count": course.lesson_count,
+                    "quiz_count": course.quiz_count,
+                    "expected_lesson_count": expected[0],
+                    "expected_quiz_count": expected[1],
+                })
+        
+        completed_lessons = db.query(
+            LessonProgress.user_id, Lesson.course_id, func.count(LessonProgress.id)
+        ).join(Lesson, Lesson.id == LessonProgress.lesson_id).filter(
+            LessonProgress.completed == True
+        ).group_by(LessonProgress.user_id, Lesson.course_id)
+        passed_quizzes = db.query(
+            QuizAttempt.user_id, Quiz.course_id, func.count(func.distinct(QuizAttempt.quiz_id))
+        ).join(Quiz, Quiz.id == QuizAttempt.quiz_id).filter(
+            QuizAttempt.passed == True
+        ).group_by(QuizAttempt.user_id, Quiz.course_id)
+        enrollments = db.query(
+            course_enrollment.c.user_id,
+            course_enrollment.c.course_id,
+            course_enrollment.c.completed_lessons,
+            course_enrollment.c.passed_quizzes
+        )
+        if course_id is not None:
+            completed_lessons = completed_lessons.filter(Lesson.course_id == course_id)
+            passed_quizzes = passed_quizzes.filter(Quiz.course_id == course_id)
+            enrollments = enrollments.filter(course_enrollment.c.course_id == course_id)
+        completed_lessons = {(u, c): n for u, c, n in completed_lessons.all()}
+        passed_quizzes = {(u, c): n for u, c, n in passed_quizzes.all()}
+        
+        bad_pairs = []
+        for row in enrollments.yield_per(1000):
+            key = (row.user_id, row.course_id)
+            expected = (completed_lessons.get(key, 0), passed_quizzes.get(key, 0))
+            if ((row.completed_lessons or 0), (row.passed_quizzes or 0)) != expected:
+                bad_pairs.append(key)
+                mismatches.append({
+                    "user_id": row.user_id,
+                    "course_id": row.course_id,
+                    "completed_lessons": row.completed_lessons,
+                    "passed_quizzes": row.passed_quizzes,
+                    "expected_completed_lessons": expected[0],
+                    "expected_passed_quizzes": expected[1],
+                })
+        
+        if repair and (bad_courses or bad_pairs):
+            for bad_course_id in bad_courses:
+                CompletionTracker.course_structure_changed(db, bad_course_id)
+            if bad_pairs:
+                CompletionTracker.refresh_enrollment(db, pairs=bad_pairs)
+            db.commit()
+        
+        return mismatches
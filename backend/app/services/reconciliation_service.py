@@ -0,0 +1,146 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Payment, PaymentStatusEnum
+from app.services.gateway_client import paystack_client, flutterwave_client
+from app.services.payment_service import PaymentService, TRANSACTION_NOT_FOUND
+
+# Gateway transaction statuses that settle a pending payment either way
+SETTLED_STATUSES = {
+    "paystack": {"success": PaymentStatusEnum.COMPLETED, "failed": PaymentStatusEnum.FAILED, "abandoned": PaymentStatusEnum.FAILED, "reversed": PaymentStatusEnum.FAILED},
+    "flutterwave": {"successful": PaymentStatusEnum.COMPLETED, "failed": PaymentStatusEnum.FAILED},
+}
+
+
+class ReconciliationService:
+    """
+    Re-checks payments left pending (e.g. lost webhooks) against the gateways. Pages of
+    pending payments are verified concurrently, and each page's outcomes are applied in
+    one transaction.
+    """
+
+    @staticmethod
+    def pending_page(db: Session, cutoff: datetime, after_id: int, limit: int) -> List[Payment]:
+        """Pending payments created before the cutoff, in id order after the keyset cursor"""
+        return db.query(Payment).filter(
+            Payment.status == PaymentStatusEnum.PENDING,
+            Payment.created_at < cutoff,
+            Payment.id > after_id
+        ).order_by(Payment.id).limit(limit).all()
+
+    @staticmethod
+    async def verify(payment_method: str, reference: str, transaction_id: str, deadline: float = None) -> Optional[PaymentStatusEnum]:
+        """
+        The gateway's view of a payment: COMPLETED or FAILED if settled, PENDING if it is
+        unsettled or unknown to the gateway, None if the gateway could not be asked.
+        Shares in-flight checks and settled answers with the webhook path.
+        """
+        if payment_method == "paystack":
+            verified_data = await PaymentService.averify_paystack_payment(reference, deadline=deadline)
+        elif payment_method == "flutterwave":
+            verified_data = await PaymentService.averify_flutterwave_payment(transaction_id, deadline=deadline)
+        else:
+            return None
+        if not verified_data:
+            return None
+
+        gateway_status = (verified_data.get("data") or {}).get("status")
+        # Checkout never started at the gateway: eligible to expire like an unsettled payment
+        if gateway_status == TRANSACTION_NOT_FOUND:
+            return PaymentStatusEnum.PENDING
+        return SETTLED_STATUSES[payment_method].get(gateway_status, PaymentStatusEnum.PENDING)
+
+    @staticmethod
+    async def verify_page(payments: List[Payment], semaphore: asyncio.Semaphore) -> Dict[int, Optional[PaymentStatusEnum]]:
+        async def verify_one(payment: Payment):
+            async with semaphore:
+                # The budget starts once a slot is free, not while queued behind the semaphore
+                deadline = time.monotonic() + settings.GATEWAY_REQUEST_BUDGET_SECONDS
+                return payment.id, await ReconciliationService.verify(
+                    payment.payment_method, payment.reference, payment.transaction_id, deadline
+                )
+
+        return dict(await asyncio.gather(*(verify_one(payment) for payment in payments)))
+
+    @staticmethod
+    def apply(db: Session, verdicts: Dict[int, Optional[PaymentStatusEnum]], expire_before: datetime) -> Dict[str, List[int]]:
+        """Apply one page of outcomes in a single transaction; returns payment ids by outcome"""
+        outcome = {"completed": [], "failed": [], "expired": []}
+        # Re-read under lock: a webhook may have settled some of these meanwhile
+        payments = db.query(Payment).filter(
+            Payment.id.in_(list(verdicts)),
+            Payment.status == PaymentStatusEnum.PENDING
+        ).with_for_update().all()
+
+        for payment in payments:
+            verdict = verdicts[payment.id]
+            if verdict == PaymentStatusEnum.COMPLETED:
+                if PaymentService.complete_payment(db, payment):
+                    outcome["completed"].append(payment.id)
+            elif verdict == PaymentStatusEnum.FAILED:
+                payment.status = PaymentStatusEnum.FAILED
+                outcome["failed"].append(payment.id)
+            elif verdict == PaymentStatusEnum.PENDING and payment.created_at < expire_before:
+                payment.status = PaymentStatusEnum.EXPIRED
+                outcome["expired"].append(payment.id)
+
+        db.commit()
+        return outcome
+
+    @staticmethod
+    async def _run(db: Session, cutoff: datetime, expire_before: datetime, page_size: int, concurrency: int, on_completed) -> dict:
+        semaphore = asyncio.Semaphore(concurrency)
+        stats = {"checked": 0, "completed": 0, "failed": 0, "expired": 0, "unresolved": 0}
+        after_id = 0
+        try:
+            while True:
+                payments = ReconciliationService.pending_page(db, cutoff, after_id, page_size)
+                if not payments:
+                    break
+                after_id = payments[-1].id
+
+                verdicts = await ReconciliationService.verify_page(payments, semaphore)
+                outcome = ReconciliationService.apply(db, verdicts, expire_before)
+
+                stats["checked"] += len(payments)
+                for key, payment_ids in outcome.items():
+                    stats[key] += len(payment_ids)
+                stats["unresolved"] += len(payments) - sum(len(payment_ids) for payment_ids in outcome.values())
+                if on_completed and outcome["completed"]:
+                    on_completed(outcome["completed"])
+        finally:
+            # The async clients are bound to this event loop, which ends with the run
+            await paystack_client.aclose()
+            await flutterwave_client.aclose()
+        return stats
+
+    @staticmethod
+    def run(db: Session, older_than_minutes: int = None, expire_after_hours: int = None, page_size: int = None, concurrency: int = None, on_completed=None) -> dict:
+        """
+        Reconcile pending payments older than older_than_minutes. Payments the gateway
+        reports as unsettled (or unknown) after expire_after_hours are marked expired;
+        payments whose gateway cannot be reached are left pending. on_completed
+        receives each page's newly completed payment ids (used to send notifications).
+        """
+        if older_than_minutes is None:
+            older_than_minutes = settings.PAYMENT_RECONCILE_AFTER_MINUTES
+        if expire_after_hours is None:
+            expire_after_hours = settings.PAYMENT_EXPIRE_AFTER_HOURS
+        now = datetime.utcnow()
+        cutoff = now - timedelta(minutes=older_than_minutes)
+        expire_before = now - timedelta(hours=expire_after_hours)
+
+        started = time.perf_counter()
+        stats = asyncio.run(ReconciliationService._run(
+            db,
+            cutoff,
+            expire_before,
+            page_size or settings.PAYMENT_RECONCILE_PAGE_SIZE,
+            concurrency or settings.PAYMENT_RECONCILE_CONCURRENCY,
+            on_completed
+        ))
+        stats["duration_ms"] = int((time.perf_counter() - started) * 1000)
+        return stats
@@ -0,0 +1,152 @@
+import csv
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.models import Payment, PaymentStatusEnum, ReportRun, course_enrollment
+
+CSV_COLUMNS = ["record_type", "id", "user_id", "course_id", "amount", "currency", "payment_method", "occurred_at"]
+
+
+class ReportService:
+    @staticmethod
+    def month_bounds(month: int, year: int) -> tuple:
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        return start, end
+
+    @staticmethod
+    def _iter_records(db: Session, start: datetime, end: datetime):
+        """Yield (record_type, row dict) for the month using server-side cursors"""
+        fetch_size = settings.REPORT_FETCH_SIZE
+
+        payments = db.query(
+            Payment.id, Payment.user_id, Payment.course_id, Payment.amount,
+            Payment.currency, Payment.payment_method, Payment.updated_at
+        ).filter(
+            Payment.status == PaymentStatusEnum.COMPLETED,
+            Payment.updated_at >= start,
+            Payment.updated_at < end
+        ).order_by(Payment.id).yield_per(fetch_size)
+        for row in payments:
+            yield "payment", {
+                "id": row.id,
+                "user_id": row.user_id,
+                "course_id": row.course_id,
+                "amount": row.amount,
+                "currency": row.currency,
+                "payment_method": row.payment_method,
+                "occurred_at": row.updated_at,
+            }
+
+        enrollments = db.query(
+            course_enrollment.c.user_id, course_enrollment.c.course_id, course_enrollment.c.enrolled_at
+        ).filter(
+            course_enrollment.c.enrolled_at >= start,
+            course_enrollment.c.enrolled_at < end
+        ).yield_per(fetch_size)
+        for row in enrollments:
+            yield "enrollment", {"user_id": row.user_id, "course_id": row.course_id, "occurred_at": row.enrolled_at}
+
+        completions = db.query(
+            course_enrollment.c.user_id, course_enrollment.c.course_id, course_enrollment.c.completed_at
+        ).filter(
+            course_enrollment.c.completed_at >= start,
+            course_enrollment.c.completed_at < end
+        ).yield_per(fetch_size)
+        for row in completions:
+            yield "completion", {"user_id": row.user_id, "course_id": row.course_id, "occurred_at": row.completed_at}
+
+    @staticmethod
+    def generate_monthly_report(db: Session, month: int, year: int) -> ReportRun:
+        """
+        Stream the month's payments, enrollments and completions into a CSV file and a
+        gzipped JSON document, aggregating per course in the same pass.
+        """
+        period = f"{year}-{month:02d}"
+        run = ReportRun(report_type="monthly", period=period, status="running")
+        db.add(run)
+        db.commit()
+
+        started = time.perf_counter()
+        report_dir = os.path.join(settings.REPORT_DIR, period)
+        os.makedirs(report_dir, exist_ok=True)
+        csv_path = os.path.join(report_dir, f"monthly-{period}.csv")
+        json_path = os.path.join(report_dir, f"monthly-{period}.json.gz")
+        # Per run, so concurrent runs for the same period don't write into each other's files
+        csv_tmp_path = f"{csv_path}.{run.id}.tmp"
+        json_tmp_path = f"{json_path}.{run.id}.tmp"
+
+        counts = {"payment": 0, "enrollment": 0, "completion": 0}
+        by_course = defaultdict(lambda: {"revenue": defaultdict(float), "payments": 0, "enrollments": 0, "completions": 0})
+        revenue_by_currency = defaultdict(float)
+
+        try:
+            start, end = ReportService.month_bounds(month, year)
+            with open(csv_tmp_path, "w", newline="") as csv_file, \
+                    gzip.open(json_tmp_path, "wt", encoding="utf-8") as json_file:
+                writer = csv.DictWriter(csv_file, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+                writer.writeheader()
+                json_file.write(json.dumps({"period": period, "generated_at": datetime.utcnow().isoformat()})[:-1])
+                json_file.write(', "records": [')
+
+                for record_type, row in ReportService._iter_records(db, start, end):
+                    occurred_at = row["occurred_at"].isoformat() if row["occurred_at"] else None
+                    writer.writerow({**row, "record_type": record_type, "occurred_at": occurred_at})
+                    if sum(counts.values()):
+                        json_file.write(",")
+                    json_file.write(json.dumps({**row, "record_type": record_type, "occurred_at": occurred_at}))
+
+                    counts[record_type] += 1
+                    course = by_course[row["course_id"]]
+                    if record_type == "payment":
+                        course["revenue"][row["currency"] or ""] += row["amount"] or 0.0
+                        course["payments"] += 1
+                        revenue_by_currency[row["currency"] or ""] += row["amount"] or 0.0
+                    elif record_type == "enrollment":
+                        course["enrollments"] += 1
+                    else:
+                        course["completions"] += 1
+
+                summary = {
+                    "payments": counts["payment"],
+                    "enrollments": counts["enrollment"],
+                    "completions": counts["completion"],
+                    "revenue_by_currency": {k: round(v, 2) for k, v in revenue_by_currency.items()},
+                    "by_course": {
+                        str(k): {**v, "revenue": {currency: round(amount, 2) for currency, amount in v["revenue"].items()}}
+                        for k, v in by_course.items()
+                    },
+                }
+                json_file.write('], "summary": ')
+                json_file.write(json.dumps(summary))
+                json_file.write("}")
+
+            # Publish both artifacts only once they are complete
+            os.replace(csv_tmp_path, csv_path)
+            os.replace(json_tmp_path, json_path)
+
+            run.status = "completed"
+            run.csv_path = csv_path
+            run.json_path = json_path
+        except Exception as e:
+            db.rollback()
+            for path in (csv_tmp_path, json_tmp_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            run.status = "failed"
+            run.error = str(e)[:2000]
+
+        run.payment_rows = counts["payment"]
+        run.enrollment_rows = counts["enrollment"]
+        run.completion_rows = counts["completion"]
+        run.revenue_by_currency = json.dumps({k: round(v, 2) for k, v in revenue_by_currency.items()})
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        run.finished_at = datetime.utcnow()
+        db.commit()
+
+        return run
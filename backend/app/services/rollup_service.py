@@ -0,0 +1,254 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.models import Course, Payment, PaymentStatusEnum, PlatformRollup, Revenue, User, course_enrollment
+
+PLATFORM_METRICS = ("revenue", "payments", "enrollments", "signups", "completions")
+
+
+class RevenueRollupService:
+    """Monthly revenue rollup per course and instructor"""
+
+    @staticmethod
+    def record_payment(db: Session, payment: Payment) -> None:
+        """Add a completed payment to its course's monthly bucket. The caller commits."""
+        instructor_id = db.query(Course.instructor_id).filter(Course.id == payment.course_id).scalar()
+        completed_at = payment.updated_at or datetime.utcnow()
+        now = datetime.utcnow()
+
+        table = Revenue.__table__
+        stmt = dialect_insert(table).values(
+            course_id=payment.course_id,
+            instructor_id=instructor_id,
+            year=completed_at.year,
+            month=completed_at.month,
+            total_revenue=payment.amount or 0.0,
+            total_enrollments=1,
+            created_at=now,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.course_id, table.c.year, table.c.month],
+            set_={
+                "total_revenue": table.c.total_revenue + stmt.excluded.total_revenue,
+                "total_enrollments": table.c.total_enrollments + stmt.excluded.total_enrollments,
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        db.execute(stmt)
+
+    @staticmethod
+    def monthly_series(db: Session, instructor_id: int) -> list:
+        """Revenue and paid enrollments per month for an instructor, oldest first"""
+        rows = db.query(
+            Revenue.year,
+            Revenue.month,
+            func.sum(Revenue.total_revenue),
+            func.sum(Revenue.total_enrollments)
+        ).filter(
+            Revenue.instructor_id == instructor_id
+        ).group_by(Revenue.year, Revenue.month).order_by(Revenue.year, Revenue.month).all()
+
+        return [
+            {"year": year, "month": month, "revenue": round(revenue or 0.0, 2), "enrollments": enrollments or 0}
+            for year, month, revenue, enrollments in rows
+        ]
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """Recompute the rollup from completed payments"""
+        year = func.extract("year", Payment.updated_at)
+        month = func.extract("month", Payment.updated_at)
+        rows = db.query(
+            Payment.course_id,
+            Course.instructor_id,
+            year,
+            month,
+            func.coalesce(func.sum(Payment.amount), 0.0),
+            func.count(Payment.id)
+        ).join(Course, Course.id == Payment.course_id).filter(
+            Payment.status == PaymentStatusEnum.COMPLETED
+        ).group_by(Payment.course_id, Course.instructor_id, year, month).all()
+
+        now = datetime.utcnow()
+        db.query(Revenue).delete()
+        if rows:
+            db.execute(Revenue.__table__.insert(), [
+                {
+                    "course_id": course_id,
+                    "instructor_id": instructor_id,
+                    "year": int(row_year),
+                    "month": int(row_month),
+                    "total_revenue": revenue,
+                    "total_enrollments": count,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for course_id, instructor_id, row_year, row_month, revenue, count in rows
+            ])
+        db.commit()
+        return len(rows)
+
+
+class PlatformRollupService:
+    """
+    Platform-wide daily and monthly rollups for the admin dashboard.
+    Events increment one of today's daily shards, so concurrent transactions don't all
+    wait on the same row lock; a scheduled compaction folds closed days into their
+    month and prunes daily rows past the retention window. Readers sum over shards.
+    """
+
+    @staticmethod
+    def _upsert(db: Session, granularity: str, buckets: dict, shard: int = 0) -> None:
+        """Add metric deltas to the given buckets of one shard with one upsert"""
+        if not buckets:
+            return
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "granularity": granularity,
+                "bucket": bucket,
+                "shard": shard,
+                **{metric: deltas.get(metric, 0) for metric in PLATFORM_METRICS},
+                "compacted": False,
+                "updated_at": now,
+            }
+            for bucket, deltas in buckets.items()
+        ]
+        table = PlatformRollup.__table__
+        stmt = dialect_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.granularity, table.c.bucket, table.c.shard],
+            set_={
+                **{metric: table.c[metric] + stmt.excluded[metric] for metric in PLATFORM_METRICS},
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        db.execute(stmt)
+
+    @staticmethod
+    def record(db: Session, **deltas) -> None:
+        """Add metric deltas (revenue, payments, enrollments, signups, completions) to today. The caller commits."""
+        shard = random.randrange(settings.PLATFORM_ROLLUP_SHARDS)
+        PlatformRollupService._upsert(db, "day", {datetime.utcnow().date(): deltas}, shard=shard)
+
+    @staticmethod
+    def compact(db: Session, retention_days: int = None) -> dict:
+        """Fold closed daily buckets into monthly buckets and prune old daily rows"""
+        retention_days = retention_days if retention_days is not None else settings.PLATFORM_ROLLUP_DAILY_RETENTION_DAYS
+        today = datetime.utcnow().date()
+
+        days = db.query(PlatformRollup).filter(
+            PlatformRollup.granularity == "day",
+            PlatformRollup.compacted == False,
+            PlatformRollup.bucket < today
+        ).with_for_update().all()
+
+        months = defaultdict(lambda: {metric: 0 for metric in PLATFORM_METRICS})
+        for day in days:
+            month = months[day.bucket.replace(day=1)]
+            for metric in PLATFORM_METRICS:
+                month[metric] += getattr(day, metric) or 0
+            day.compacted = True
+        db.flush()
+        PlatformRollupService._upsert(db, "month", dict(months))
+
+        pruned = db.query(PlatformRollup).filter(
+            PlatformRollup.granularity == "day",
+            PlatformRollup.compacted == True,
+            PlatformRollup.bucket < today - timedelta(days=retention_days)
+        ).delete(synchronize_session=False)
+
+        db.commit()
+        return {"folded_days": len(days), "months": len(months), "pruned_days": pruned}
+
+    @staticmethod
+    def totals(db: Session) -> dict:
+        """All-time totals: monthly buckets plus daily buckets not yet folded in"""
+        sums = [func.coalesce(func.sum(getattr(PlatformRollup, metric)), 0) for metric in PLATFORM_METRICS]
+        monthly = db.query(*sums).filter(PlatformRollup.granularity == "month").one()
+        pending = db.query(*sums).filter(
+            PlatformRollup.granularity == "day",
+            PlatformRollup.compacted == False
+        ).one()
+        return {metric: monthly[i] + pending[i] for i, metric in enumerate(PLATFORM_METRICS)}
+
+    @staticmethod
+    def monthly_series(db: Session, months: int = 12) -> list:
+        """Metrics per month for the last `months` months, oldest first"""
+        today = datetime.utcnow().date()
+        start_year, start_month = divmod(today.year * 12 + today.month - 1 - (months - 1), 12)
+        start = date(start_year, start_month + 1, 1)
+
+        series = defaultdict(lambda: {metric: 0 for metric in PLATFORM_METRICS})
+        rows = db.query(PlatformRollup).filter(
+            PlatformRollup.bucket >= start,
+            (PlatformRollup.granularity == "month") | (PlatformRollup.compacted == False)
+        ).all()
+        for row in rows:
+            bucket = series[row.bucket.replace(day=1)]
+            for metric in PLATFORM_METRICS:
+                bucket[metric] += getattr(row, metric) or 0
+
+        return [
+            {"year": month.year, "month": month.month, **{k: round(v, 2) if k == "revenue" else v for k, v in values.items()}}
+            for month, values in sorted(series.items())
+        ]
+
+    @staticmethod
+    def top_courses(db: Session, limit: int = 5) -> list:
+        """Courses with the most revenue, from the monthly revenue rollup"""
+        rows = db.query(
+            Revenue.course_id,
+            Course.title,
+            func.sum(Revenue.total_revenue).label("revenue"),
+            func.sum(Revenue.total_enrollments).label("enrollments")
+        ).join(Course, Course.id == Revenue.course_id).group_by(
+            Revenue.course_id, Course.title
+        ).order_by(func.sum(Revenue.total_revenue).desc()).limit(limit).all()
+
+        return [
+            {"course_id": course_id, "title": title, "revenue": round(revenue or 0.0, 2), "enrollments": enrollments or 0}
+            for course_id, title, revenue, enrollments in rows
+        ]
+
+    @staticmethod
+    def rebuild(db: Session) -> dict:
+        """Recompute daily buckets from the source tables, then compact them"""
+        days = defaultdict(lambda: {metric: 0 for metric in PLATFORM_METRICS})
+
+        def as_date(value):
+            return date.fromisoformat(value) if isinstance(value, str) else value
+
+        payment_day = func.date(Payment.updated_at)
+        for day, revenue, count in db.query(
+            payment_day, func.coalesce(func.sum(Payment.amount), 0.0), func.count(Payment.id)
+        ).filter(Payment.status == PaymentStatusEnum.COMPLETED).group_by(payment_day).all():
+            days[as_date(day)]["revenue"] += revenue
+            days[as_date(day)]["payments"] += count
+
+        enrolled_day = func.date(course_enrollment.c.enrolled_at)
+        for day, count in db.query(enrolled_day, func.count()).group_by(enrolled_day).all():
+            days[as_date(day)]["enrollments"] += count
+
+        signup_day = func.date(User.created_at)
+        for day, count in db.query(signup_day, func.count(User.id)).group_by(signup_day).all():
+            days[as_date(day)]["signups"] += count
+
+        completed_day = func.date(course_enrollment.c.completed_at)
+        for day, count in db.query(completed_day, func.count()).filter(
+            course_enrollment.c.completed_at.isnot(None)
+        ).group_by(completed_day).all():
+            days[as_date(day)]["completions"] += count
+
+        days.pop(None, None)
+        db.query(PlatformRollup).delete(synchronize_session=False)
+        PlatformRollupService._upsert(db, "day", dict(days))
+        db.commit()
+
+        return PlatformRollupService.compact(db)
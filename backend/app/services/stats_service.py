@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.database import dialect_insert
+from app.models.models import User, Certificate, QuizAttempt, StudentStats, course_enrollment
+
+STUDENT_STATS_COUNTERS = ("enrolled_courses", "completed_courses", "certificates", "quiz_attempts", "quiz_score_total")
+
+
+class StudentStatsService:
+    """Per-student dashboard projection, updated incrementally by learning events"""
+
+    @staticmethod
+    def create(db: Session, user_id: int) -> None:
+        """Start a new user's projection at zero. The caller commits."""
+        table = StudentStats.__table__
+        db.execute(dialect_insert(table).values(
+            user_id=user_id, **{col: 0 for col in STUDENT_STATS_COUNTERS}, updated_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=[table.c.user_id]))
+
+    @staticmethod
+    def adjust_many(db: Session, deltas: Dict[int, dict]) -> None:
+        """
+        Atomically add per-user counter deltas. A user without a row (one created before
+        the projection existed and not yet rebuilt) gets one starting from zero; the
+        rebuild command corrects it from the source tables. The caller commits.
+        """
+        if not deltas:
+            return
+
+        now = datetime.utcnow()
+        rows = [
+            {"user_id": user_id, **{col: delta.get(col, 0) for col in STUDENT_STATS_COUNTERS}, "updated_at": now}
+            for user_id, delta in deltas.items()
+        ]
+        table = StudentStats.__table__
+        stmt = dialect_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={
+                **{col: table.c[col] + stmt.excluded[col] for col in STUDENT_STATS_COUNTERS},
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        db.execute(stmt)
+
+    @staticmethod
+    def adjust(db: Session, user_id: int, **delta) -> None:
+        """Add counter deltas for one user. The caller commits."""
+        StudentStatsService.adjust_many(db, {user_id: delta})
+
+    @staticmethod
+    def completion_changed(db: Session, completed: Iterable[tuple], reopened: Iterable[tuple]) -> None:
+        """Apply course completion flips reported by CompletionTracker"""
+        deltas = defaultdict(lambda: {"completed_courses": 0})
+        for user_id, _ in completed:
+            deltas[user_id]["completed_courses"] += 1
+        for user_id, _ in reopened:
+            deltas[user_id]["completed_courses"] -= 1
+        StudentStatsService.adjust_many(db, dict(deltas))
+
+    @staticmethod
+    def rebuild(db: Session, user_ids: Optional[List[int]] = None, batch_size: int = 1000) -> int:
+        """Recompute the projection from the source tables and overwrite it"""
+        users = db.query(User.id).order_by(User.id)
+        if user_ids is not None:
+            users = users.filter(User.id.in_(user_ids))
+        user_ids = [user_id for (user_id,) in users.all()]
+
+        table = StudentStats.__table__
+        rebuilt = 0
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+
+            enrolled = dict(db.query(
+                course_enrollment.c.user_id, func.count()
+            ).filter(course_enrollment.c.user_id.in_(chunk)).group_by(course_enrollment.c.user_id).all())
+            completed = dict(db.query(
+                course_enrollment.c.user_id, func.count()
+            ).filter(
+                course_enrollment.c.user_id.in_(chunk),
+                course_enrollment.c.completed_at.isnot(None)
+            ).group_by(course_enrollment.c.user_id).all())
+            certificates = dict(db.query(
+                Certificate.user_id, func.count(Certificate.id)
+            ).filter(Certificate.user_id.in_(chunk)).group_by(Certificate.user_id).all())
+            attempts = {
+                user_id: (count, total) for user_id, count, total in db.query(
+                    QuizAttempt.user_id, func.count(QuizAttempt.id), func.coalesce(func.sum(QuizAttempt.score), 0.0)
+                ).filter(QuizAttempt.user_id.in_(chunk)).group_by(QuizAttempt.user_id).all()
+            }
+
+            now = datetime.utcnow()
+            rows = [
+                {
+                    "user_id": user_id,
+                    "enrolled_courses": enrolled.get(user_id, 0),
+                    "completed_courses": completed.get(user_id, 0),
+                    "certificates": certificates.get(user_id, 0),
+                    "quiz_attempts": attempts.get(user_id, (0, 0.0))[0],
+                    "quiz_score_total": attempts.get(user_id, (0, 0.0))[1],
+                    "updated_at": now,
+                }
+                for user_id in chunk
+            ]
+            stmt = dialect_insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={col: stmt.excluded[col] for col in STUDENT_STATS_COUNTERS + ("updated_at",)}
+            )
+            db.execute(stmt)
+            db.commit()
+            rebuilt += len(rows)
+
+        return rebuilt
+
+    @staticmethod
+    def get(db: Session, user_id: int) -> StudentStats:
+        """Primary-key read of a student's stats; zeros when the user has no row yet"""
+        stats = db.get(StudentStats, user_id)
+        if stats is None:
+            stats = StudentStats(user_id=user_id, **{col: 0 for col in STUDENT_STATS_COUNTERS})
+        return stats
@@ -0,0 +1,192 @@
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta
+from typing import List, Mapping, Optional
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.core.circuit_breaker import OPEN
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.models import Payment, WebhookEvent
+from app.services.gateway_client import gateway_clients
+from app.services.payment_service import PaymentService
+
+# Events that complete a payment, and how each gateway identifies the payment and its success
+GATEWAY_EVENTS = {
+    "paystack": {"event": "charge.success", "verified_status": "success"},
+    "flutterwave": {"event": "charge.completed", "verified_status": "successful"},
+}
+
+
+class WebhookVerificationError(Exception):
+    """The gateway could not confirm the payment (unreachable or unexpected response)"""
+
+    def __init__(self, gateway: str, message: str):
+        super().__init__(message)
+        self.gateway = gateway
+
+
+class WebhookService:
+    """
+    Payment webhook inbox. Requests are authenticated and stored once per gateway
+    event id; verification, payment completion and enrollment happen later in a worker.
+    """
+
+    @staticmethod
+    def verify_signature(gateway: str, body: bytes, headers: Mapping[str, str]) -> bool:
+        """Check the gateway's signature header against the raw request body"""
+        if gateway == "paystack":
+            if not settings.PAYSTACK_SECRET_KEY:
+                return False
+            expected = hmac.new(settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+            return hmac.compare_digest(expected, headers.get("x-paystack-signature", ""))
+        if gateway == "flutterwave":
+            if not settings.FLUTTERWAVE_WEBHOOK_HASH:
+                return False
+            return hmac.compare_digest(settings.FLUTTERWAVE_WEBHOOK_HASH, headers.get("verif-hash", ""))
+        return False
+
+    @staticmethod
+    def event_id(payload: dict, body: bytes) -> str:
+        """Identity of a delivery: the event type plus the gateway's transaction id"""
+        data = payload.get("data") or {}
+        transaction = data.get("id") or data.get("reference")
+        if transaction is None:
+            # No stable id in the payload; identical bodies are still deduplicated
+            return f"sha256:{hashlib.sha256(body).hexdigest()}"
+        return f"{payload.get('event')}:{transaction}"
+
+    @staticmethod
+    def record(db: Session, gateway: str, payload: dict, body: bytes) -> Optional[int]:
+        """Insert the event; returns its id, or None if this event was already received"""
+        stmt = dialect_insert(WebhookEvent.__table__).values(
+            gateway=gateway,
+            event_id=WebhookService.event_id(payload, body)[:255],
+            event_type=str(payload.get("event", ""))[:100],
+            payload=body.decode("utf-8"),
+            status="received",
+            attempts=0,
+            received_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=["gateway", "event_id"]).returning(WebhookEvent.__table__.c.id)
+        webhook_event_id = db.execute(stmt).scalar()
+        db.commit()
+        return webhook_event_id
+
+    @staticmethod
+    def _find_payment(db: Session, gateway: str, data: dict, lock: bool = False) -> Optional[Payment]:
+        query = db.query(Payment)
+        if lock:
+            query = query.with_for_update().populate_existing()
+        if gateway == "paystack":
+            return query.filter(Payment.reference == data.get("reference")).first()
+        return query.filter(Payment.transaction_id == str(data.get("id"))).first()
+
+    @staticmethod
+    def _verify(gateway: str, data: dict, deadline: float = None) -> Optional[dict]:
+        if gateway == "paystack":
+            return PaymentService.verify_paystack_payment(data.get("reference"), deadline=deadline)
+        return PaymentService.verify_flutterwave_payment(data.get("id"), deadline=deadline)
+
+    @staticmethod
+    def _lock_event(db: Session, webhook_event_id: int) -> Optional[WebhookEvent]:
+        """The event re-read under lock, or None if it is gone or was settled meanwhile"""
+        event = db.query(WebhookEvent).filter(
+            WebhookEvent.id == webhook_event_id
+        ).with_for_update().populate_existing().first()
+        if not event or event.status in ("processed", "ignored"):
+            db.rollback()
+            return None
+        event.attempts += 1
+        return event
+
+    @staticmethod
+    def process(db: Session, webhook_event_id: int, deadline: float = None) -> Optional[Payment]:
+        """
+        Verify the event with its gateway, then complete the payment and mark the event
+        processed in one transaction. Returns the payment if this call completed it.
+        Raises WebhookVerificationError when the gateway gives no answer, so it can be retried.
+        The gateway is asked before any row is locked; the event and payment are then
+        locked and re-checked, so a concurrent delivery cannot complete the payment twice.
+        deadline (a time.monotonic() value) bounds the gateway call.
+        """
+        event = db.query(WebhookEvent).filter(WebhookEvent.id == webhook_event_id).first()
+        if not event or event.status in ("processed", "ignored"):
+            return None
+
+        gateway, event_id = event.gateway, event.event_id
+        payload = json.loads(event.payload)
+        data = payload.get("data") or {}
+        rules = GATEWAY_EVENTS[gateway]
+
+        if payload.get("event") != rules["event"]:
+            event = WebhookService._lock_event(db, webhook_event_id)
+            if event:
+                WebhookService._finish(db, event, "ignored", "Event type not handled")
+            return None
+
+        if not WebhookService._find_payment(db, gateway, data):
+            event = WebhookService._lock_event(db, webhook_event_id)
+            if event:
+                WebhookService._finish(db, event, "ignored", "Payment not found")
+            return None
+
+        # End the read transaction: nothing is held while the gateway is slow
+        db.rollback()
+        verified_data = WebhookService._verify(gateway, data, deadline)
+
+        event = WebhookService._lock_event(db, webhook_event_id)
+        if not event:
+            return None
+
+        if not verified_data:
+            event.error = "Gateway verification unavailable"
+            db.commit()
+            raise WebhookVerificationError(gateway, f"Could not verify {gateway} event {event_id}")
+
+        if verified_data.get("data", {}).get("status") != rules["verified_status"]:
+            return WebhookService._finish(db, event, "ignored", "Payment not successful at gateway")
+
+        payment = WebhookService._find_payment(db, gateway, data, lock=True)
+        if not payment:
+            return WebhookService._finish(db, event, "ignored", "Payment not found")
+
+        completed = PaymentService.complete_payment(db, payment)
+        WebhookService._finish(db, event, "processed")
+        return payment if completed else None
+
+    @staticmethod
+    def _finish(db: Session, event: WebhookEvent, status: str, error: str = None) -> None:
+        event.status = status
+        event.error = error
+        event.processed_at = datetime.utcnow()
+        db.commit()
+        return None
+
+    @staticmethod
+    def defer(db: Session, webhook_event_id: int, error: str) -> None:
+        """Park an event the gateway could not verify; reconciliation requeues it later"""
+        event = db.query(WebhookEvent).filter(WebhookEvent.id == webhook_event_id).first()
+        if event and event.status in ("received", "deferred"):
+            event.status = "deferred"
+            event.error = error[:2000]
+            db.commit()
+
+    @staticmethod
+    def retry_candidates(db: Session, limit: int = None) -> List[int]:
+        """
+        Deferred events, and received events never processed (e.g. lost on enqueue), for
+        gateways whose circuit is not open
+        """
+        stuck_before = datetime.utcnow() - timedelta(minutes=settings.WEBHOOK_RETRY_AFTER_MINUTES)
+        available = [name for name, client in gateway_clients.items() if client.breaker.state != OPEN]
+        if not available:
+            return []
+        rows = db.query(WebhookEvent.id).filter(
+            WebhookEvent.gateway.in_(available),
+            or_(
+                WebhookEvent.status == "deferred",
+                and_(WebhookEvent.status == "received", WebhookEvent.received_at < stuck_before)
+            )
+        ).order_by(WebhookEvent.id).limit(limit or settings.WEBHOOK_RETRY_BATCH_SIZE).all()
+        return [row[0] for row in rows]
@@ -1,6 +1,11 @@
 from celery import Celery, Task
+from celery.schedules import crontab
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+from celery import states
+from app.core.claim_check import claim_check_store
 from app.core.config import settings
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pathlib import Path
@@ -15,9 +20,75 @@ class CallbackTask(Task):
     autoretry_for = (Exception,)
     retry_kwargs = {'max_retries': 3}
     retry_backoff = True
+    
+    def apply_async(self, args=None, kwargs=None, **options):
+        # Claim check: large arguments go to shared storage, the broker only carries a reference
+        args = [claim_check_store.check_in(arg) for arg in args] if args else args
+        kwargs = {key: claim_check_store.check_in(value) for key, value in kwargs.items()} if kwargs else kwargs
+        return super().apply_async(args, kwargs, **options)
+    
+    def __call__(self, *args, **kwargs):
+        args = [claim_check_store.check_out(arg) for arg in args]
+        kwargs = {key: claim_check_store.check_out(value) for key, value in kwargs.items()}
+        return super().__call__(*args, **kwargs)
+    
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        # Retries re-send the same references, so blobs are only released once the task succeeds
+        if status == states.SUCCESS:
+            for value in list(args or []) + list((kwargs or {}).values()):
+                if claim_check_store.is_reference(value):
+                    claim_check_store.release(value)
 
 celery_app.Task = CallbackTask
 
+# Batch issuance starts its own process pool, which prefork (daemonic) children cannot do,
+# so it runs on a dedicated queue served by a solo/threads worker
+celery_app.conf.task_routes = {
+    "app.tasks.celery_app.issue_certificate_batch": {"queue": "certificate_batches"},
+}
+
+celery_app.conf.beat_schedule = {
+    "compact-platform-rollups": {
+        "task": "app.tasks.celery_app.compact_platform_rollups",
+        "schedule": crontab(hour=0, minute=15),
+    },
+    "compact-event-log": {
+        "task": "app.tasks.celery_app.compact_event_log",
+        "schedule": crontab(hour=0, minute=30),
+    },
+    "reconcile-pending-payments": {
+        "task": "app.tasks.celery_app.reconcile_pending_payments",
+        "schedule": crontab(minute="*/10"),
+    },
+    "collect-claim-checks": {
+        "task": "app.tasks.celery_app.collect_claim_checks",
+        "schedule": crontab(hour=1, minute=0),
+    },
+}
+
+# Pool processes fire the worker_process_* signals; solo and threads pools only fire
+# worker_init/worker_shutdown in the one process that also runs the tasks
+@worker_init.connect
+@worker_process_init.connect
+def start_event_log(**kwargs):
+    """Flush learning events recorded by tasks in the background"""
+    from app.services.event_log import event_log
+    event_log.start()
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def stop_event_log(**kwargs):
+    """Write buffered learning events before the worker process exits"""
+    from app.services.event_log import event_log
+    event_log.stop()
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def close_gateway_connections(**kwargs):
+    """Close pooled payment gateway connections before the worker process exits"""
+    from app.services.gateway_client import close_gateway_clients
+    close_gateway_clients()
+
 @celery_app.task
 def send_email(subject: str, email_to: str, body: str, html: str = None):
     """Send email using SMTP"""
@@ -79,6 +150,102 @@ def send_certificate_email(user_email: str, certificate_number: str, course_name
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@celery_app.task
+def render_certificate(certificate_id: int):
+    """Render and store a pending certificate PDF, then email it to the student"""
+    from app.core.database import SessionLocal
+    from app.models.models import User, Course
+    from app.services.certificate_service import CertificateIssuer
+    
+    db = SessionLocal()
+    try:
+        rendered = CertificateIssuer.render(db, certificate_id)
+        if not rendered:
+            return {"status": "skipped", "message": f"Certificate {certificate_id} needs no rendering"}
+        
+        certificate, pdf_content = rendered
+        user = db.query(User).filter(User.id == certificate.user_id).first()
+        course = db.query(Course).filter(Course.id == certificate.course_id).first()
+        send_certificate_email.delay(
+            user_email=user.email,
+            certificate_number=certificate.certificate_number,
+            course_name=course.title,
+            pdf_content=pdf_content
+        )
+        return {"status": "success", "certificate_number": certificate.certificate_number}
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def issue_certificate_batch(job_id: int):
+    """Issue certificates to a course's graduates, resuming from the job's cursor"""
+    from app.core.database import SessionLocal
+    from app.services.certificate_batch_service import CertificateBatchService
+    
+    def enqueue_emails(certificate_ids):
+        size = settings.CERTIFICATE_BATCH_EMAIL_SIZE
+        for start in range(0, len(certificate_ids), size):
+            send_certificate_email_batch.delay(certificate_ids[start:start + size])
+    
+    db = SessionLocal()
+    try:
+        job = CertificateBatchService.run(db, job_id, on_chunk=enqueue_emails)
+        if not job:
+            return {"status": "error", "message": f"Certificate batch job {job_id} not found"}
+        return {"status": job.status, "issued": job.issued, "failed": job.failed}
+    finally:
+        db.close()
+
+@celery_app.task
+def send_certificate_email_batch(certificate_ids: list):
+    """Email rendered certificates over a single SMTP connection"""
+    from email.mime.base import MIMEBase
+    from email import encoders
+    from app.core.database import SessionLocal
+    from app.models.models import Certificate, Course, User
+    
+    db = SessionLocal()
+    try:
+        rows = db.query(Certificate, User.email, Course.title).join(
+            User, User.id == Certificate.user_id
+        ).join(Course, Course.id == Certificate.course_id).filter(
+            Certificate.id.in_(certificate_ids),
+            Certificate.status == "ready"
+        ).all()
+    finally:
+        db.close()
+    
+    sent = 0
+    try:
+        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+            server.starttls()
+            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+            
+            for certificate, user_email, course_name in rows:
+                msg = MIMEMultipart('alternative')
+                msg['Subject'] = f"Your {course_name} Certificate"
+                msg['From'] = settings.EMAIL_FROM
+                msg['To'] = user_email
+                msg.attach(MIMEText(
+                    f"Congratulations! You have completed {course_name}.\n\n"
+                    f"Your certificate is attached to this email.\n"
+                    f"Certificate Number: {certificate.certificate_number}\n",
+                    'plain'
+                ))
+                
+                attachment = MIMEBase('application', 'octet-stream')
+                attachment.set_payload(Path(certificate.pdf_path).read_bytes())
+                encoders.encode_base64(attachment)
+                attachment.add_header('Content-Disposition', f'attachment; filename= certificate_{certificate.certificate_number}.pdf')
+                msg.attach(attachment)
+                
+                server.send_message(msg)
+                sent += 1
+        
+        return {"status": "success", "sent": sent}
+    except Exception as e:
+        return {"status": "error", "sent": sent, "message": str(e)}
+
 @celery_app.task
 def send_enrollment_notification(user_email: str, course_name: str, access_url: str):
     """Send enrollment confirmation email"""
@@ -123,9 +290,150 @@ def send_quiz_result_notification(user_email: str, quiz_name: str, score: float,
         html=html
     )
 
+@celery_app.task(bind=True, acks_late=True, ignore_result=True)
+def process_webhook_event(self, webhook_event_id: int):
+    """Verify a received payment webhook, complete the payment and notify the student"""
+    from app.core.database import SessionLocal
+    from app.models.models import User, Course
+    from app.core.circuit_breaker import CLOSED
+    from app.services.gateway_client import gateway_clients
+    from app.services.webhook_service import WebhookService, WebhookVerificationError
+    
+    # One budget for the whole task, started before any database work
+    deadline = time.monotonic() + settings.GATEWAY_REQUEST_BUDGET_SECONDS
+    db = SessionLocal()
+    try:
+        try:
+            payment = WebhookService.process(db, webhook_event_id, deadline=deadline)
+        except WebhookVerificationError as e:
+            # Don't hold a worker retrying against a gateway that is known to be failing
+            if self.request.retries >= self.max_retries or gateway_clients[e.gateway].breaker.state != CLOSED:
+                WebhookService.defer(db, webhook_event_id, str(e))
+                return {"status": "deferred", "message": str(e)}
+            raise
+        
+        if not payment:
+            return {"status": "skipped", "webhook_event_id": webhook_event_id}
+        
+        user = db.query(User).filter(User.id == payment.user_id).first()
+        course = db.query(Course).filter(Course.id == payment.course_id).first()
+        send_enrollment_notification.delay(
+            user_email=user.email,
+            course_name=course.title,
+            access_url=f"http://localhost:3000/courses/{course.id}"
+        )
+        return {"status": "success", "payment_id": payment.id}
+    finally:
+        db.close()
+
+@celery_app.task
+def reconcile_pending_payments(older_than_minutes: int = None):
+    """Settle payments still pending at the gateways, expire abandoned ones and requeue deferred webhooks"""
+    from app.core.database import SessionLocal
+    from app.models.models import Payment, User, Course
+    from app.services.reconciliation_service import ReconciliationService
+    from app.services.webhook_service import WebhookService
+    
+    db = SessionLocal()
+    
+    def notify(payment_ids):
+        rows = db.query(User.email, Course.id, Course.title).join(
+            Payment, Payment.user_id == User.id
+        ).join(Course, Course.id == Payment.course_id).filter(Payment.id.in_(payment_ids)).all()
+        for email, course_id, title in rows:
+            send_enrollment_notification.delay(
+                user_email=email,
+                course_name=title,
+                access_url=f"http://localhost:3000/courses/{course_id}"
+            )
+    
+    try:
+        stats = ReconciliationService.run(db, older_than_minutes=older_than_minutes, on_completed=notify)
+        
+        webhook_event_ids = WebhookService.retry_candidates(db)
+        for webhook_event_id in webhook_event_ids:
+            process_webhook_event.delay(webhook_event_id)
+        
+        return {"status": "success", "requeued_webhooks": len(webhook_event_ids), **stats}
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
+def import_question_bank(job_id: int):
+    """Import an uploaded question bank into its quiz"""
+    from app.core.database import SessionLocal
+    from app.services.quiz_import_service import QuizImportService
+    
+    db = SessionLocal()
+    try:
+        job = QuizImportService.run_import(db, job_id)
+        if not job:
+            return {"status": "error", "message": f"Import job {job_id} not found"}
+        return {"status": job.status, "imported_questions": job.imported_questions}
+    finally:
+        db.close()
+
+@celery_app.task
+def verify_completion_counters(course_id: int = None, repair: bool = False):
+    """Check (and optionally repair) the maintained completion counters"""
+    from app.core.database import SessionLocal
+    from app.services.quiz_service import CompletionTracker
+    
+    db = SessionLocal()
+    try:
+        mismatches = CompletionTracker.verify(db, course_id=course_id, repair=repair)
+        return {"status": "success", "mismatches": len(mismatches), "repaired": repair, "details": mismatches[:100]}
+    finally:
+        db.close()
+
+@celery_app.task
+def compact_platform_rollups():
+    """Fold closed days into monthly platform rollups and prune old daily rows"""
+    from app.core.database import SessionLocal
+    from app.services.rollup_service import PlatformRollupService
+    
+    db = SessionLocal()
+    try:
+        result = PlatformRollupService.compact(db)
+        return {"status": "success", **result}
+    finally:
+        db.close()
+
+@celery_app.task
+def compact_event_log(days_ago: int = 2):
+    """Merge the segments of a closed event log partition"""
+    from datetime import datetime, timedelta
+    from app.services.event_log import event_log
+    
+    day = datetime.utcnow() - timedelta(days=days_ago)
+    result = event_log.compact_partition(day)
+    return {"status": "success", **result}
+
+@celery_app.task
+def collect_claim_checks():
+    """Delete claim-check blobs whose tasks never succeeded and are past the TTL"""
+    removed = claim_check_store.collect_garbage()
+    return {"status": "success", "removed": removed}
+
 @celery_app.task
 def generate_monthly_report(month: int, year: int):
     """Generate monthly revenue and enrollment report"""
-    # This would typically connect to database and generate reports
-    # For now, it's a placeholder
-    return {"status": "success", "message": f"Report generated for {month}/{year}"}
+    from app.core.database import SessionLocal
+    from app.services.report_service import ReportService
+    
+    db = SessionLocal()
+    try:
+        run = ReportService.generate_monthly_report(db, month, year)
+        return {
+            "status": "success" if run.status == "completed" else "error",
+            "report_id": run.id,
+            "csv_path": run.csv_path,
+            "json_path": run.json_path,
+            "payments": run.payment_rows,
+            "enrollments": run.enrollment_rows,
+            "completions": run.completion_rows,
+            "duration_ms": run.duration_ms,
+            "message": run.error or f"Report generated for {month}/{year}"
+        }
+    finally:
+        db.close()
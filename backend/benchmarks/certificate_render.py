@@ -0,0 +1,59 @@
+"""
+Compare the platypus and compiled certificate renderers.
+
+    python -m benchmarks.certificate_render [count]
+
+Reports certificates per second and average PDF size for each renderer.
+"""
+import sys
+import time
+from app.services.certificate_service import CertificateGenerator, get_compiled_template
+
+DEFAULT_COUNT = 500
+
+
+def sample(i: int) -> dict:
+    return {
+        "student_name": f"Student Number {i}",
+        "course_name": f"Introduction to Data Analysis, Cohort {i % 12}",
+        "certificate_number": f"CERT-{i % 97}-{i}-{i:08X}",
+        "instructor_name": "Course Instructor",
+    }
+
+
+def run(name: str, render, count: int) -> dict:
+    # Warm up (fonts, compiled layout)
+    render(**sample(0))
+
+    total_bytes = 0
+    started = time.perf_counter()
+    for i in range(count):
+        total_bytes += len(render(**sample(i)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "renderer": name,
+        "certificates": count,
+        "seconds": round(elapsed, 3),
+        "per_second": round(count / elapsed, 1),
+        "avg_bytes": total_bytes // count,
+    }
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    results = [
+        run("platypus", CertificateGenerator.generate_certificate_platypus, count),
+        run("compiled", get_compiled_template().render, count),
+    ]
+
+    for result in results:
+        print(
+            f"{result['renderer']:>9}: {result['per_second']:>8} certs/s "
+            f"({result['seconds']}s for {result['certificates']}), avg {result['avg_bytes']} bytes"
+        )
+    print(f"speedup: {results[1]['per_second'] / results[0]['per_second']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Load-test the payment flow end to end: initiate -> gateway webhook (with replays) -> enrollment.
+
+    python -m devtools.gateway_stub --port 9000 --paystack-secret sk_test --flutterwave-hash hash &
+    PAYSTACK_BASE_URL=http://127.0.0.1:9000 FLUTTERWAVE_BASE_URL=http://127.0.0.1:9000 \
+    PAYSTACK_SECRET_KEY=sk_test FLUTTERWAVE_WEBHOOK_HASH=hash uvicorn main:app &
+    (same environment) celery -A app.tasks.celery_app worker &
+    (same environment) python -m benchmarks.payment_webhooks --rate 20 --duration 30 --replays 2
+
+Flows are started at a fixed rate (open loop), each with a fresh student, so a slow
+backend shows up as latency rather than a lower offered rate. The harness seeds its
+students and course directly in the database the backend uses and mints their tokens
+with the backend's SECRET_KEY; use a scratch database.
+
+Reports throughput, latency percentiles for initiate, webhook acknowledgement and
+payment-to-enrollment, webhook responses by result, and duplicate enrollments: repeat
+completed payments or enrollment counters that exceed the real enrollments.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter
+from typing import List
+import httpx
+from sqlalchemy import func, insert, select
+from app.core.database import SessionLocal, engine
+from app.core.security import create_access_token
+from app.models.models import Base, Course, Payment, PaymentStatusEnum, RoleEnum, StudentStats, User, course_enrollment
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return f"p50 {at(50):.1f}ms  p95 {at(95):.1f}ms  p99 {at(99):.1f}ms  max {ordered[-1]:.1f}ms"
+
+
+def seed(count: int, course_id: int = None) -> tuple:
+    """Create the course (unless given) and one student per flow; returns (course_id, [(user_id, token)])"""
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        if course_id is None:
+            instructor = User(email=f"load-{tag}@example.com", username=f"load-{tag}", hashed_password="x", full_name="Load Instructor", role=RoleEnum.INSTRUCTOR)
+            db.add(instructor)
+            db.flush()
+            course = Course(title=f"Load Course {tag}", description="Payment load test", slug=f"load-course-{tag}", price=5000.0, currency="NGN", instructor_id=instructor.id, is_published=True)
+            db.add(course)
+            db.flush()
+            course_id = course.id
+
+        user_ids = db.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {"email": f"load-{tag}-{i}@example.com", "username": f"load-{tag}-{i}", "hashed_password": "x", "full_name": f"Load Student {i}", "role": RoleEnum.STUDENT, "is_active": True}
+                for i in range(count)
+            ]
+        ).scalars().all()
+        db.commit()
+    finally:
+        db.close()
+    return course_id, [(user_id, create_access_token({"sub": str(user_id)})) for user_id in user_ids]
+
+
+async def flow(client: httpx.AsyncClient, args, course_id: int, token: str, gateway: str, results: dict) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{args.api}/payments/initiate",
+            json={"course_id": course_id, "payment_method": gateway},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        results["initiate_ms"].append((time.perf_counter() - started) * 1000)
+        if response.status_code != 201:
+            results["errors"][f"initiate {response.status_code}"] += 1
+            return
+        payment = response.json()
+
+        response = await client.post(f"{args.simulator}/simulate/charges", json={
+            "gateway": gateway,
+            "reference": payment["reference"],
+            "transaction_id": payment["transaction_id"],
+            "amount": payment["amount"],
+            "webhook_url": f"{args.api}/payments/webhook/{gateway}",
+            "replays": args.replays,
+            "concurrent_replays": not args.sequential_replays,
+        })
+        if response.status_code != 200:
+            results["errors"][f"simulator {response.status_code}"] += 1
+            return
+        for delivery in response.json()["deliveries"]:
+            results["webhook_ms"].append(delivery["ms"])
+            results["webhooks"][f"{delivery['status_code']} {delivery['result']}"] += 1
+        results["references"].append(payment["reference"])
+        results["flow_ms"].append((time.perf_counter() - started) * 1000)
+    except httpx.HTTPError as e:
+        results["errors"][type(e).__name__] += 1
+
+
+async def drive(args, course_id: int, students: list) -> tuple:
+    results = {"initiate_ms": [], "webhook_ms": [], "flow_ms": [], "references": [], "webhooks": Counter(), "errors": Counter()}
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        started = time.perf_counter()
+        tasks = []
+        for i, (_, token) in enumerate(students):
+            # Open loop: start each flow on schedule regardless of how earlier ones are doing
+            await asyncio.sleep(max(0.0, started + i / args.rate - time.perf_counter()))
+            gateway = "paystack" if i % 2 == 0 else "flutterwave"
+            tasks.append(asyncio.ensure_future(flow(client, args, course_id, token, gateway, results)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def settle(references: list, timeout: float) -> list:
+    """Wait for the workers to complete the payments; returns their enrollment latencies (ms)"""
+    deadline = time.monotonic() + timeout
+    db = SessionLocal()
+    try:
+        while True:
+            completed = db.execute(
+                select(Payment.created_at, Payment.updated_at).where(
+                    Payment.reference.in_(references),
+                    Payment.status == PaymentStatusEnum.COMPLETED
+                )
+            ).all()
+            if len(completed) >= len(references) or time.monotonic() > deadline:
+                return [(updated - created).total_seconds() * 1000 for created, updated in completed]
+            db.rollback()
+            time.sleep(0.5)
+    finally:
+        db.close()
+
+
+def duplicates(course_id: int, user_ids: list) -> dict:
+    db = SessionLocal()
+    try:
+        repeat_payments = db.execute(
+            select(func.count()).select_from(
+                select(Payment.user_id).where(
+                    Payment.course_id == course_id,
+                    Payment.user_id.in_(user_ids),
+                    Payment.status == PaymentStatusEnum.COMPLETED
+                ).group_by(Payment.user_id).having(func.count() > 1).subquery()
+            )
+        ).scalar()
+        enrolled = dict(db.execute(
+            select(course_enrollment.c.user_id, func.count()).where(
+                course_enrollment.c.user_id.in_(user_ids)
+            ).group_by(course_enrollment.c.user_id)
+        ).all())
+        counted = dict(db.execute(
+            select(StudentStats.user_id, StudentStats.enrolled_courses).where(StudentStats.user_id.in_(user_ids))
+        ).all())
+        overcounted = sum(max(0, (counted.get(user_id) or 0) - enrolled.get(user_id, 0)) for user_id in user_ids)
+        return {"repeat_completed_payments": repeat_payments, "overcounted_enrollments": overcounted, "enrolled": len(enrolled)}
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Payment initiate -> webhook -> enrollment load test")
+    parser.add_argument("--api", default="http://127.0.0.1:8000/api/v1")
+    parser.add_argument("--simulator", default="http://127.0.0.1:9000")
+    parser.add_argument("--rate", type=float, default=20.0, help="Flows started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep starting flows")
+    parser.add_argument("--replays", type=int, default=2, help="Extra deliveries of each webhook")
+    parser.add_argument("--sequential-replays", action="store_true", help="Deliver replays one after another")
+    parser.add_argument("--course-id", type=int, default=None, help="Existing paid course (default: create one)")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--settle-timeout", type=float, default=120.0, help="Seconds to wait for the workers afterwards")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    count = max(1, int(args.rate * args.duration))
+    course_id, students = seed(count, args.course_id)
+
+    results, elapsed = asyncio.run(drive(args, course_id, students))
+    enrollment_ms = settle(results["references"], args.settle_timeout)
+    found = duplicates(course_id, [user_id for user_id, _ in students])
+
+    print(f"flows: {count} offered at {args.rate}/s, {len(results['references'])} delivered in {elapsed:.1f}s ({len(results['references']) / elapsed:.1f}/s)")
+    print(f"initiate:        {percentiles(results['initiate_ms'])}")
+    print(f"webhook ack:     {percentiles(results['webhook_ms'])}")
+    print(f"flow:            {percentiles(results['flow_ms'])}")
+    print(f"enrollment:      {percentiles(enrollment_ms)}  ({len(enrollment_ms)}/{len(results['references'])} completed)")
+    print(f"webhooks:        {dict(results['webhooks'])}")
+    if results["errors"]:
+        print(f"errors:          {dict(results['errors'])}")
+    print(
+        f"duplicates:      {found['repeat_completed_payments']} repeat completed payments, "
+        f"{found['overcounted_enrollments']} over-counted enrollments ({found['enrolled']} students enrolled)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Load-test pending payment reconciliation against the local gateway stub.
+
+    python -m devtools.gateway_stub --port 9000 &
+    DATABASE_URL=sqlite:///./reconcile_bench.db \
+    PAYSTACK_BASE_URL=http://127.0.0.1:9000 FLUTTERWAVE_BASE_URL=http://127.0.0.1:9000 \
+    python -m benchmarks.reconciliation [count] [concurrency]
+
+Seeds `count` aged pending payments and reports how fast they are reconciled.
+Use a scratch database: the seeded rows are not removed.
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.core.database import SessionLocal, engine
+from app.models.models import Base, Course, Payment, PaymentStatusEnum, User
+from app.services.reconciliation_service import ReconciliationService
+
+DEFAULT_COUNT = 2000
+DEFAULT_CONCURRENCY = 20
+
+
+def seed(db, count: int) -> None:
+    tag = uuid.uuid4().hex[:8]
+    instructor = User(email=f"bench-{tag}@example.com", username=f"bench-{tag}", hashed_password="x", full_name="Bench Instructor")
+    db.add(instructor)
+    db.flush()
+    course = Course(title=f"Bench Course {tag}", description="Reconciliation benchmark", instructor_id=instructor.id, price=10.0)
+    db.add(course)
+    db.flush()
+
+    created_at = datetime.utcnow() - timedelta(hours=1)
+    rows = []
+    for i in range(count):
+        if i % 50 == 0:
+            student = User(email=f"bench-{tag}-{i}@example.com", username=f"bench-{tag}-{i}", hashed_password="x", full_name=f"Student {i}")
+            db.add(student)
+            db.flush()
+        rows.append({
+            "user_id": student.id,
+            "course_id": course.id,
+            "amount": 10.0,
+            "currency": "NGN",
+            "payment_method": "paystack" if i % 2 else "flutterwave",
+            "transaction_id": str(uuid.uuid4()),
+            "reference": str(uuid.uuid4()),
+            "status": PaymentStatusEnum.PENDING,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    db.execute(insert(Payment), rows)
+    db.commit()
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CONCURRENCY
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed(db, count)
+        stats = ReconciliationService.run(db, older_than_minutes=30, concurrency=concurrency)
+    finally:
+        db.close()
+
+    seconds = stats["duration_ms"] / 1000
+    print(
+        f"checked {stats['checked']} in {seconds:.2f}s ({stats['checked'] / max(seconds, 1e-9):.0f}/s, concurrency {concurrency}): "
+        f"completed {stats['completed']}, failed {stats['failed']}, expired {stats['expired']}, unresolved {stats['unresolved']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Local payment gateway simulator: the Paystack and Flutterwave verify APIs used by
+PaymentService, plus signed webhook delivery, for running reconciliation and the
+payment load tests offline.
+
+    python -m devtools.gateway_stub [--port 9000] [--latency-ms 80] [--success-rate 0.7] [--failure-rate 0.1]
+        [--error-rate 0.0] [--slow-rate 0.0] [--slow-ms 15000]
+        [--paystack-secret sk_test] [--flutterwave-hash hash]
+
+then point the backend at it (with the same webhook secrets):
+
+    PAYSTACK_BASE_URL=http://127.0.0.1:9000 FLUTTERWAVE_BASE_URL=http://127.0.0.1:9000
+    PAYSTACK_SECRET_KEY=sk_test FLUTTERWAVE_WEBHOOK_HASH=hash
+
+Verify calls are delayed by a jittered latency; error_rate of them answer 500 and
+slow_rate of them take slow_ms. Charges created through POST /simulate/charges verify
+as successful; any other reference gets a stable outcome derived from its hash
+(success, failed, or still pending). POST /simulate/config changes the settings of a
+running simulator.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import time
+from typing import Dict, Optional
+import httpx
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+config = {
+    "latency_ms": 80.0,
+    "success_rate": 0.7,
+    "failure_rate": 0.1,
+    "error_rate": 0.0,
+    "slow_rate": 0.0,
+    "slow_ms": 15000.0,
+    "paystack_secret": "sk_test",
+    "flutterwave_hash": "hash",
+}
+
+# Charges created through the simulator, by reference / transaction id
+charges: Dict[str, str] = {}
+charge_ids = itertools.count(1)
+
+app = FastAPI(title="Payment gateway simulator")
+
+
+class SimulatorConfig(BaseModel):
+    latency_ms: Optional[float] = None
+    success_rate: Optional[float] = None
+    failure_rate: Optional[float] = None
+    error_rate: Optional[float] = None
+    slow_rate: Optional[float] = None
+    slow_ms: Optional[float] = None
+
+
+class ChargeRequest(BaseModel):
+    gateway: str  # paystack, flutterwave
+    reference: str
+    transaction_id: str
+    amount: float = 0.0
+    webhook_url: str
+    replays: int = 0  # Extra deliveries of the same event
+    concurrent_replays: bool = True  # Deliver replays at once rather than one after another
+
+
+def outcome(reference: str) -> str:
+    if reference in charges:
+        return charges[reference]
+    draw = int(hashlib.sha256(reference.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    if draw < config["success_rate"]:
+        return "success"
+    if draw < config["success_rate"] + config["failure_rate"]:
+        return "failed"
+    return "pending"
+
+
+async def delay() -> None:
+    if random.random() < config["slow_rate"]:
+        await asyncio.sleep(config["slow_ms"] / 1000)
+        return
+    # Jittered latency around the configured mean
+    await asyncio.sleep(random.uniform(0.5, 1.5) * config["latency_ms"] / 1000)
+
+
+def maybe_fail() -> None:
+    if random.random() < config["error_rate"]:
+        raise HTTPException(status_code=500, detail="Simulated gateway error")
+
+
+@app.get("/transaction/verify/{reference}")
+async def paystack_verify(reference: str):
+    await delay()
+    maybe_fail()
+    status = {"success": "success", "failed": "failed", "pending": "ongoing"}[outcome(reference)]
+    return {"status": True, "message": "Verification successful", "data": {"reference": reference, "status": status}}
+
+
+@app.get("/transactions/{transaction_id}/verify")
+async def flutterwave_verify(transaction_id: str):
+    await delay()
+    maybe_fail()
+    status = {"success": "successful", "failed": "failed", "pending": "pending"}[outcome(transaction_id)]
+    return {"status": "success", "message": "Transaction fetched successfully", "data": {"id": transaction_id, "status": status}}
+
+
+def webhook(charge: ChargeRequest) -> tuple:
+    """The event body and headers the gateway would send for a successful charge"""
+    if charge.gateway == "paystack":
+        body = json.dumps({
+            "event": "charge.success",
+            "data": {"id": next(charge_ids), "reference": charge.reference, "status": "success", "amount": int(charge.amount * 100)},
+        }).encode()
+        signature = hmac.new(config["paystack_secret"].encode(), body, hashlib.sha512).hexdigest()
+        return body, {"x-paystack-signature": signature}
+
+    body = json.dumps({
+        "event": "charge.completed",
+        "data": {"id": charge.transaction_id, "tx_ref": charge.reference, "status": "successful", "amount": charge.amount},
+    }).encode()
+    return body, {"verif-hash": config["flutterwave_hash"]}
+
+
+async def deliver(client: httpx.AsyncClient, url: str, body: bytes, headers: dict) -> dict:
+    started = time.perf_counter()
+    try:
+        response = await client.post(url, content=body, headers={**headers, "content-type": "application/json"})
+        status_code = response.status_code
+        result = response.json().get("status") if response.headers.get("content-type", "").startswith("application/json") else None
+    except httpx.HTTPError as e:
+        status_code, result = None, type(e).__name__
+    return {"status_code": status_code, "result": result, "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+@app.post("/simulate/charges")
+async def simulate_charge(charge: ChargeRequest):
+    """Record a successful charge and deliver its webhook (plus replays) to the backend"""
+    if charge.gateway not in ("paystack", "flutterwave"):
+        raise HTTPException(status_code=400, detail="Unknown gateway")
+
+    charges[charge.reference] = "success"
+    charges[charge.transaction_id] = "success"
+    body, headers = webhook(charge)
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        deliveries = [await deliver(client, charge.webhook_url, body, headers)]
+        if charge.concurrent_replays:
+            deliveries += await asyncio.gather(*(deliver(client, charge.webhook_url, body, headers) for _ in range(charge.replays)))
+        else:
+            for _ in range(charge.replays):
+                deliveries.append(await deliver(client, charge.webhook_url, body, headers))
+    return {"deliveries": deliveries}
+
+
+@app.post("/simulate/config")
+async def update_config(update: SimulatorConfig):
+    config.update({key: value for key, value in update.model_dump().items() if value is not None})
+    return {key: value for key, value in config.items() if key not in ("paystack_secret", "flutterwave_hash")}
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--success-rate", type=float, default=config["success_rate"])
+    parser.add_argument("--failure-rate", type=float, default=config["failure_rate"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--slow-rate", type=float, default=config["slow_rate"])
+    parser.add_argument("--slow-ms", type=float, default=config["slow_ms"])
+    parser.add_argument("--paystack-secret", default=config["paystack_secret"])
+    parser.add_argument("--flutterwave-hash", default=config["flutterwave_hash"])
+    args = parser.parse_args()
+
+    config.update(
+        latency_ms=args.latency_ms,
+        success_rate=args.success_rate,
+        failure_rate=args.failure_rate,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        paystack_secret=args.paystack_secret,
+        flutterwave_hash=args.flutterwave_hash
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
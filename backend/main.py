@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -6,6 +7,10 @@ from app.api import api_router
 from app.core.config import settings
 from app.core.database import engine
 from app.models.models import Base
+from app.services.progress_buffer import progress_buffer
+from app.services.event_log import event_log
+from app.services.gateway_client import close_gateway_clients
+from app.core.metrics import metrics
 import os
 
 # Create database tables
@@ -37,6 +42,19 @@ app.add_middleware(GZipMiddleware, minimum_size=1000)
 # Include API routes
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+def start_background_writers():
+    """Start the lesson progress and event log flushers"""
+    progress_buffer.start()
+    event_log.start()
+
+@app.on_event("shutdown")
+def stop_background_writers():
+    """Flush buffered lesson progress and events before exiting"""
+    progress_buffer.stop()
+    event_log.stop()
+    close_gateway_clients()
+
 @app.get("/")
 def read_root():
     """Root endpoint"""
@@ -51,6 +69,11 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Process metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/setup-admin")
 def setup_admin():
     """One-time admin user setup endpoint"""
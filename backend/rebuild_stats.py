@@ -0,0 +1,26 @@
+from app.core.database import SessionLocal, engine
+from app.models.models import Base
+from app.services.stats_service import StudentStatsService
+from app.services.rollup_service import RevenueRollupService, PlatformRollupService
+
+
+def rebuild_stats() -> None:
+    # Create all tables first
+    Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    try:
+        rebuilt = StudentStatsService.rebuild(db)
+        print(f"Rebuilt student stats for {rebuilt} user(s).")
+        
+        rebuilt = RevenueRollupService.rebuild(db)
+        print(f"Rebuilt {rebuilt} monthly revenue bucket(s).")
+        
+        result = PlatformRollupService.rebuild(db)
+        print(f"Rebuilt platform rollups: {result}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_stats()
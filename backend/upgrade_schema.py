@@ -0,0 +1,46 @@
+from app.core.database import SessionLocal, engine
+from app.core.schema_upgrade import upgrade_schema
+from app.models.models import Course
+from app.services.quiz_service import CompletionTracker
+from rebuild_stats import rebuild_stats
+
+# Maintained counters that must be computed for rows that predate them
+COUNTER_COLUMNS = {
+    "course.lesson_count",
+    "course.quiz_count",
+    "course_enrollment.completed_lessons",
+    "course_enrollment.passed_quizzes",
+    "course_enrollment.completed_at",
+}
+
+
+def upgrade() -> None:
+    """
+    Upgrade an existing database in place: run after deploying a release that adds
+    columns or constraints to existing tables. Safe to run more than once.
+    """
+    result = upgrade_schema(engine)
+    print(f"Recreated projection tables: {', '.join(result['recreated_tables']) or 'none'}")
+    print(f"Added enum values: {', '.join(result['enum_values']) or 'none'}")
+    print(f"Added columns: {', '.join(result['columns']) or 'none'}")
+    print(f"Added unique constraints: {', '.join(result['unique_constraints']) or 'none'}")
+    print(f"Added indexes: {', '.join(result['indexes']) or 'none'}")
+    
+    if COUNTER_COLUMNS & set(result["columns"]):
+        db = SessionLocal()
+        try:
+            course_ids = [course_id for (course_id,) in db.query(Course.id).order_by(Course.id).all()]
+            for course_id in course_ids:
+                CompletionTracker.course_structure_changed(db, course_id)
+                db.commit()
+            print(f"Computed completion counters for {len(course_ids)} course(s).")
+        finally:
+            db.close()
+    
+    if result["recreated_tables"] or COUNTER_COLUMNS & set(result["columns"]):
+        # Recreated projections start empty, and completions stamped above are counted in them
+        rebuild_stats()
+
+
+if __name__ == "__main__":
+    upgrade()